@@ -1,6 +1,9 @@
 from fastapi.responses import JSONResponse
 from starlette.concurrency import run_in_threadpool
 
+import tracing
+from profiling import profile_blocking
+
 
 def model_to_dict(payload):
     if hasattr(payload, "model_dump"):
@@ -18,4 +21,5 @@ def error_response(status_code, detail, error_code=None, extra=None):
 
 
 async def run_blocking(func, *args, **kwargs):
-    return await run_in_threadpool(func, *args, **kwargs)
+    with tracing.span("run_blocking", func=getattr(func, "__qualname__", repr(func))):
+        return await run_in_threadpool(profile_blocking(func), *args, **kwargs)
@@ -6,6 +6,11 @@ from services.image_service import ImageService
 from services.lookup_service import LookupService
 from services.user_service import UserService
 from services.report_service import ReportService
+from services.archive_service import ArchiveService
+from services.partition_service import PartitionService
+from services.ingest_service import IngestService
+from profiling import ProfileStore
+from tracing import TraceRecorder
 
 
 def init_app_state(app, config):
@@ -19,3 +24,10 @@ def init_app_state(app, config):
     app.state.report_service = ReportService(qm, eg)
     app.state.user_service = UserService(qm)
     app.state.notification_service = NotificationService()
+    app.state.archive_service = ArchiveService.from_config(qm, config)
+    app.state.partition_service = PartitionService.from_config(qm, config)
+    app.state.ingest_service = IngestService.from_config(
+        qm, app.state.image_service, app.state.notification_service, config
+    )
+    app.state.profile_store = ProfileStore.from_env()
+    app.state.trace_recorder = TraceRecorder.from_env()
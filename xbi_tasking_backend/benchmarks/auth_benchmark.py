@@ -0,0 +1,91 @@
+'''
+Micro-benchmark of the per-request cost of KeycloakAuth.verify_token, which the auth
+middleware awaits on every authenticated request.
+
+Runs against the local Keycloak stand-in, so no real Keycloak is needed:
+
+    python -m benchmarks.auth_benchmark --iterations 2000
+'''
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from main_classes.ConfigClass import ConfigClass
+from main_classes.KeycloakAuth import KeycloakAuth
+from testing.keycloak_standin import KeycloakStandIn
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _summary(label, samples):
+    return (
+        f"{label:<28} p50={_percentile(samples, 50):8.1f}us "
+        f"p95={_percentile(samples, 95):8.1f}us "
+        f"p99={_percentile(samples, 99):8.1f}us "
+        f"mean={statistics.fmean(samples):8.1f}us"
+    )
+
+
+async def _run(auth, tokens, iterations):
+    # Discovery and JWKS load up front so neither scenario pays for the network fetch
+    await auth.start()
+
+    uncached = []
+    for i in range(iterations):
+        auth._token_cache.clear()
+        start = time.perf_counter()
+        await auth.verify_token(tokens[i % len(tokens)])
+        uncached.append((time.perf_counter() - start) * 1e6)
+
+    for token in tokens:
+        await auth.verify_token(token)
+    cached = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        await auth.verify_token(tokens[i % len(tokens)])
+        cached.append((time.perf_counter() - start) * 1e6)
+    await auth.aclose()
+    return uncached, cached
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmarks KeycloakAuth token verification")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50, help="number of distinct tokens in rotation")
+    args = parser.parse_args()
+
+    standin = KeycloakStandIn().start()
+    standin.enable_signing()
+    config_file = tempfile.NamedTemporaryFile("w", suffix=".config", delete=False)
+    config_file.write(
+        "[Keycloak]\n"
+        f"keycloak_url: {standin.url}\n"
+        f"realm: {standin.realm}\n"
+        "client_id: xbi-tasking-backend\n"
+        "client_secret: standin-secret\n"
+        "allowed_client_ids: xbi-tasking-frontend\n"
+    )
+    config_file.close()
+    try:
+        auth = KeycloakAuth(config=ConfigClass(config_file.name))
+        tokens = [standin.issue_token(f"ii{i:05d}", roles=["II"]) for i in range(args.users)]
+        uncached, cached = asyncio.run(_run(auth, tokens, args.iterations))
+    finally:
+        standin.stop()
+        os.remove(config_file.name)
+
+    print(f"verify_token over {args.iterations} requests, {args.users} distinct tokens")
+    print(_summary("signature verified", uncached))
+    print(_summary("token cache hit", cached))
+    print(f"speedup (p50): {_percentile(uncached, 50) / _percentile(cached, 50):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
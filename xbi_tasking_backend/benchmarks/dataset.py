@@ -0,0 +1,283 @@
+'''
+Reproducible high-volume synthetic dataset for the service benchmarks.
+
+Every row is derived from (--seed, row index), so the same arguments always produce the
+same data. The image, image_area and task tables are bulk-loaded with COPY, and rows are
+generated lazily while COPY reads them, so memory stays flat at any scale:
+
+    python -m benchmarks.dataset dev_server.config --images 1000000 --areas-per-image 10 --users 500 --reset
+
+Users get deterministic Keycloak ids (see user_id()) so benchmarks can serve the same
+users from the Keycloak stand-in. --reset truncates task, image_area, image and their archives first;
+it refuses to run against a database whose name does not contain "test" or "bench"
+unless --force is also given.
+'''
+import argparse
+import datetime
+import io
+import random
+import time
+import uuid
+
+from main_classes.ConfigClass import ConfigClass
+from main_classes.Database import Database
+from main_classes.partitions import create_image_partition, months_between
+from main_classes.query_reports import REBUILD_DAILY_ROLLUP, delete_image_with_rollup
+
+
+DEFAULT_END_DATE = "2025-12-31"
+DEFAULT_DAYS = 365
+IMAGE_ID_BASE = 9_000_000_000
+AREA_PREFIX = "BENCH-"
+SENSOR_PREFIX = "BENCH-SENSOR-"
+
+# Report ids from the seeded report table; the last four are the unexploitable remarks
+EXPLOITABLE_REPORTS = (1, 2, 4, 5, 6, 8, 9)
+UNEXPLOITABLE_REPORTS = (3, 7, 10, 11)
+SENSOR_CATEGORIES = (2, 3, 4, 5)
+IMAGE_QUALITIES = ("Good", "Fair", "Poor")
+
+# Images uploaded within this many days of the end date are mostly still open
+OPEN_WINDOW_DAYS = 14
+
+
+def user_id(index):
+    return str(uuid.uuid5(uuid.NAMESPACE_DNS, f"xbi-bench-user-{index}"))
+
+
+def user_roles(index):
+    '''
+    Function:   Role mix of the synthetic users: 5% IA, 15% Senior II, the rest II
+    Input:      user index
+    Output:     list of role names
+    '''
+    slot = index % 20
+    if slot == 0:
+        return ["IA"]
+    if slot <= 3:
+        return ["Senior II"]
+    return ["II"]
+
+
+def username(index):
+    return f"{user_roles(index)[0].lower().replace(' ', '')}{index:05d}"
+
+
+def assignee_indexes(user_count):
+    return [index for index in range(user_count) if user_roles(index) == ["II"]]
+
+
+class _CopyStream(io.RawIOBase):
+    '''
+    File-like object over an iterator of text lines, for cursor.copy_expert. Rows are
+    produced on demand, so COPY streams them without the dataset ever being held in memory.
+    '''
+    def __init__(self, lines):
+        self._lines = lines
+        self._buffer = b""
+        self._offset = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if self._offset >= len(self._buffer):
+            self._buffer = "".join(line for _, line in zip(range(1000), self._lines)).encode("utf-8")
+            self._offset = 0
+        end = len(self._buffer) if size < 0 else self._offset + size
+        data = self._buffer[self._offset:end]
+        self._offset += len(data)
+        return data
+
+
+class DatasetGenerator:
+    '''
+    Generates the synthetic dataset. Per-image values come from a Random seeded with
+    (seed, image index), so the image, image_area and task passes agree without
+    keeping any per-image state between them.
+    '''
+    def __init__(self, images, areas_per_image, users, areas=2000, sensors=40, seed=42,
+                 end_date=DEFAULT_END_DATE, days=DEFAULT_DAYS):
+        self.images = images
+        self.areas_per_image = areas_per_image
+        self.users = users
+        self.areas = areas
+        self.sensors = sensors
+        self.seed = seed
+        self.end = datetime.datetime.fromisoformat(end_date) + datetime.timedelta(days=1)
+        self.days = days
+        self.assignees = [user_id(index) for index in assignee_indexes(users)]
+        self.area_ids = []
+        self.sensor_ids = []
+
+    def _plan(self, index):
+        rng = random.Random(self.seed * 1_000_003 + index)
+        upload_date = self.end - datetime.timedelta(seconds=rng.randrange(self.days * 86400))
+        age_days = (self.end - upload_date).days
+        completed = (age_days > OPEN_WINDOW_DAYS and rng.random() < 0.9) or rng.random() < 0.1
+        area_count = max(1, min(2 * self.areas_per_image - 1, round(rng.gauss(self.areas_per_image, self.areas_per_image / 3))))
+        return rng, upload_date, completed, area_count
+
+    def _image_lines(self):
+        for index in range(self.images):
+            rng, upload_date, completed, _ = self._plan(index)
+            image_datetime = upload_date - datetime.timedelta(minutes=rng.randrange(10, 600))
+            if completed:
+                completed_date = (upload_date + datetime.timedelta(hours=rng.randrange(1, 96))).isoformat(sep=" ")
+                unexploitable = rng.random() < 0.15
+                report_id = rng.choice(UNEXPLOITABLE_REPORTS if unexploitable else EXPLOITABLE_REPORTS)
+                vetter = rng.choice(self.assignees) if self.assignees else "\\N"
+            else:
+                completed_date, report_id, vetter = "\\N", "\\N", "\\N"
+            yield "\t".join((
+                str(index + 1),
+                str(IMAGE_ID_BASE + index),
+                f"bench_{index:08d}.ntf",
+                str(rng.choice(self.sensor_ids)),
+                upload_date.isoformat(sep=" "),
+                image_datetime.isoformat(sep=" "),
+                completed_date,
+                str(rng.randint(1, 3)),
+                str(report_id),
+                str(rng.randint(1, 4)),
+                rng.choice(IMAGE_QUALITIES),
+                str(rng.randint(1, 4)),
+                "t" if rng.random() < 0.2 else "f",
+                vetter,
+            )) + "\n"
+
+    def _image_area_lines(self, with_tasks):
+        image_area_id = 0
+        for index in range(self.images):
+            rng, upload_date, completed, area_count = self._plan(index)
+            for area_id in rng.sample(self.area_ids, min(area_count, len(self.area_ids))):
+                image_area_id += 1
+                if not with_tasks:
+                    yield f"{image_area_id}\t{index + 1}\t{upload_date.isoformat(sep=' ')}\t{area_id}\n"
+                    continue
+                if completed:
+                    status = 4
+                else:
+                    status = rng.choice((1, 1, 2, 3))
+                assignee = rng.choice(self.assignees) if self.assignees else "\\N"
+                yield f"{image_area_id}\t{image_area_id}\t{assignee}\t{status}\t\\N\n"
+
+    def _ensure_lookups(self, db):
+        db.seed_lookup_data()
+        with db._get_cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO sensor (name, category_id) VALUES (%s, %s) ON CONFLICT (name) DO NOTHING",
+                [(f"{SENSOR_PREFIX}{i:03d}", SENSOR_CATEGORIES[i % len(SENSOR_CATEGORIES)]) for i in range(self.sensors)],
+            )
+            cursor.executemany(
+                "INSERT INTO area (area_name, v10, opsv) VALUES (%s, %s, %s) ON CONFLICT (area_name) DO NOTHING",
+                [(f"{AREA_PREFIX}{i:05d}", i % 3 == 0, i % 7 == 0) for i in range(self.areas)],
+            )
+            cursor.executemany(
+                "INSERT INTO user_cache (keycloak_user_id, is_present) VALUES (%s, TRUE) "
+                "ON CONFLICT (keycloak_user_id) DO UPDATE SET is_present = TRUE",
+                [(user_id(index),) for index in range(self.users)],
+            )
+            cursor.execute("SELECT id FROM sensor WHERE name LIKE %s ORDER BY name", (SENSOR_PREFIX + "%",))
+            self.sensor_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute("SELECT scvu_area_id FROM area WHERE area_name LIKE %s ORDER BY area_name", (AREA_PREFIX + "%",))
+            self.area_ids = [row[0] for row in cursor.fetchall()]
+
+    def load(self, db, reset=False, log=print):
+        '''
+        Function:   Loads the dataset; image, image_area and task are COPYed in one transaction
+        Input:      Database, whether to truncate the data tables first, progress callback
+        Output:     dict of table -> rows loaded
+        '''
+        self._ensure_lookups(db)
+        counts = {}
+        with db.transaction() as cursor:
+            if reset:
+                log("truncating task, image_area, image and their archives")
+                cursor.execute(
+                    "TRUNCATE task, image_area, image, image_key, task_archive, image_area_archive, image_archive, archive_state "
+                    "RESTART IDENTITY CASCADE"
+                )
+            else:
+                cursor.execute("SELECT EXISTS (SELECT 1 FROM image)")
+                if cursor.fetchone()[0]:
+                    raise RuntimeError("image table is not empty; rerun with --reset")
+            for month in months_between(self.end - datetime.timedelta(days=self.days), self.end):
+                create_image_partition(cursor, month)
+            copies = (
+                ("image", "scvu_image_id, image_id, image_file_name, sensor_id, upload_date, image_datetime, "
+                          "completed_date, priority_id, report_id, image_category_id, image_quality, "
+                          "cloud_cover_id, target_tracing, vetter_keycloak_id", self._image_lines()),
+                ("image_area", "scvu_image_area_id, scvu_image_id, upload_date, scvu_area_id", self._image_area_lines(False)),
+                ("task", "scvu_task_id, scvu_image_area_id, assignee_keycloak_id, task_status_id, remarks", self._image_area_lines(True)),
+            )
+            for table, columns, lines in copies:
+                started_at = time.perf_counter()
+                cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN", _CopyStream(lines))
+                counts[table] = cursor.rowcount
+                log(f"{table:<11} {counts[table]:>12,} rows in {time.perf_counter() - started_at:8.1f}s")
+            for table, column in (("image", "scvu_image_id"), ("image_area", "scvu_image_area_id"), ("task", "scvu_task_id")):
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), COALESCE(MAX({column}), 0) + 1, false) FROM {table}"
+                )
+            # COPY bypasses the queries that claim image_key and keep the report rollup in step
+            cursor.execute("INSERT INTO image_key (image_id) SELECT image_id FROM image WHERE image_id IS NOT NULL")
+            started_at = time.perf_counter()
+            for statement in REBUILD_DAILY_ROLLUP:
+                cursor.execute(statement)
+            counts["report_daily_rollup"] = cursor.rowcount
+            log(f"{'rollup':<11} {cursor.rowcount:>12,} rows in {time.perf_counter() - started_at:8.1f}s")
+        with db._get_cursor() as cursor:
+            cursor.execute("ANALYZE image, image_area, task, report_daily_rollup")
+        return counts
+
+
+def delete_images_from(db, first_image_id):
+    '''
+    Function:   Deletes images (with their image areas and tasks) whose image_id is at least first_image_id
+    Input:      Database, lowest image_id to delete
+    '''
+    with db.transaction() as cursor:
+        cursor.execute(
+            "DELETE FROM task WHERE scvu_image_area_id IN (SELECT ia.scvu_image_area_id FROM image_area ia "
+            "JOIN image i ON i.scvu_image_id = ia.scvu_image_id WHERE i.image_id >= %s)",
+            (first_image_id,),
+        )
+        cursor.execute(
+            "DELETE FROM image_area WHERE scvu_image_id IN (SELECT scvu_image_id FROM image WHERE image_id >= %s)",
+            (first_image_id,),
+        )
+        cursor.execute(delete_image_with_rollup("image_id >= %s"), (first_image_id,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="loads a synthetic benchmark dataset with COPY")
+    parser.add_argument("config", help="config file with the [Database] to load into")
+    parser.add_argument("--images", type=int, default=100000)
+    parser.add_argument("--areas-per-image", type=int, default=10, help="mean areas (and so tasks) per image")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--areas", type=int, default=2000, help="distinct areas")
+    parser.add_argument("--sensors", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end-date", default=DEFAULT_END_DATE, help="last upload date (YYYY-MM-DD)")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help="upload dates span this many days")
+    parser.add_argument("--reset", action="store_true", help="truncate task, image_area, image and their archives first")
+    parser.add_argument("--force", action="store_true", help="allow --reset on a non test/bench database")
+    args = parser.parse_args()
+
+    config = ConfigClass(args.config)
+    db_name = config.getDatabaseName()
+    if args.reset and not args.force and not any(tag in db_name.lower() for tag in ("test", "bench")):
+        parser.error(f"refusing to --reset database {db_name!r}; pass --force to override")
+
+    generator = DatasetGenerator(
+        args.images, args.areas_per_image, args.users,
+        areas=args.areas, sensors=args.sensors, seed=args.seed, end_date=args.end_date, days=args.days,
+    )
+    started_at = time.perf_counter()
+    counts = generator.load(Database(config=config), reset=args.reset)
+    print(f"loaded {sum(counts.values()):,} rows into {db_name} in {time.perf_counter() - started_at:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
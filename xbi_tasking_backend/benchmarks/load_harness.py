@@ -0,0 +1,320 @@
+'''
+End-to-end HTTP load harness. Drives the real FastAPI app (main.app, with its full
+middleware stack) with a weighted mix of II, Senior II and IA traffic and reports
+throughput and latency percentiles per endpoint.
+
+No real Keycloak is needed: a local stand-in serves discovery, JWKS, token, introspection
+and the admin users/roles endpoints for the synthetic users of benchmarks.dataset, and
+issues their signed access tokens. Load the dataset first, into a test/bench database,
+since the state-transition, assignment and ingest requests write to it:
+
+    python -m benchmarks.dataset bench.config --images 100000 --users 500 --reset
+    python -m benchmarks.load_harness bench.config --users 500 --concurrency 32 --duration 60
+
+--transport asgi (default) calls the app in-process; --transport http serves it with
+uvicorn on a local port so the HTTP stack is included. Images ingested by the run are
+deleted afterwards.
+'''
+import argparse
+import asyncio
+import configparser
+import datetime
+import itertools
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks import results as bench_results
+from benchmarks.dataset import AREA_PREFIX, DEFAULT_END_DATE, IMAGE_ID_BASE, delete_images_from, user_id, user_roles, username
+from benchmarks.service_benchmark import start_standin
+from main_classes.ConfigClass import ConfigClass
+from main_classes.Database import Database
+
+
+# Images inserted by the ingest scenario; removed again after the run
+LOAD_ID_BASE = IMAGE_ID_BASE + 600_000_000
+
+# (scenario, role, weight)
+MIXES = {
+    "default": (
+        ("tasking_summary", "II", 35),
+        ("tasking_summary", "Senior II", 10),
+        ("tasking_manager", "Senior II", 10),
+        ("start_tasks", "II", 8),
+        ("complete_tasks", "II", 8),
+        ("verify_pass", "Senior II", 4),
+        ("assign_task", "IA", 5),
+        ("complete_image_data", "IA", 8),
+        ("xbi_report", "IA", 7),
+        ("insert_dsta", "IA", 5),
+    ),
+    "reads": (
+        ("tasking_summary", "II", 50),
+        ("tasking_summary", "Senior II", 15),
+        ("tasking_manager", "Senior II", 15),
+        ("complete_image_data", "IA", 10),
+        ("xbi_report", "IA", 10),
+    ),
+    "writes": (
+        ("start_tasks", "II", 25),
+        ("complete_tasks", "II", 25),
+        ("verify_pass", "Senior II", 15),
+        ("assign_task", "IA", 20),
+        ("insert_dsta", "IA", 15),
+    ),
+}
+
+
+class LoadHarness:
+    def __init__(self, args, standin, db):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.mix = MIXES[args.mix]
+        self.users_by_role = defaultdict(list)
+        self.headers = {}
+        for index in range(args.users):
+            role = user_roles(index)[0]
+            self.users_by_role[role].append(user_id(index))
+            token = standin.issue_token(username(index), roles=user_roles(index), expires_in=args.duration + 3600)
+            self.headers[user_id(index)] = {"Authorization": f"Bearer {token}"}
+
+        end = datetime.date.fromisoformat(args.end_date)
+        self.window = {
+            "Start Date": (end - datetime.timedelta(days=args.window_days - 1)).isoformat(),
+            "End Date": end.isoformat(),
+        }
+        self.report_window = {
+            "Start Date": (end - datetime.timedelta(days=args.report_days - 1)).isoformat(),
+            "End Date": end.isoformat(),
+        }
+        self._load_targets(db)
+        self._ingest_ids = itertools.count(LOAD_ID_BASE)
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def _load_targets(self, db):
+        '''
+        Samples task and image area ids for the write scenarios, so they touch real rows
+        '''
+        rows = db.executeSelect(
+            "SELECT assignee_keycloak_id, scvu_task_id FROM task WHERE task_status_id IN (1, 2) "
+            "AND assignee_keycloak_id = ANY(%s) LIMIT 20000",
+            (self.users_by_role["II"],),
+        )
+        self.open_tasks = defaultdict(list)
+        for assignee, task_id in rows:
+            self.open_tasks[assignee].append(task_id)
+        self.verifying_tasks = [row[0] for row in db.executeSelect(
+            "SELECT scvu_task_id FROM task WHERE task_status_id = 3 LIMIT 5000"
+        )] or [task_id for tasks in self.open_tasks.values() for task_id in tasks]
+        self.image_area_ids = [row[0] for row in db.executeSelect(
+            "SELECT scvu_image_area_id FROM task WHERE task_status_id = 1 LIMIT 5000"
+        )]
+        self.area_names = [row[0] for row in db.executeSelect(
+            "SELECT area_name FROM area WHERE area_name LIKE %s ORDER BY area_name LIMIT 50", (AREA_PREFIX + "%",)
+        )]
+
+    def _task_ids(self, user):
+        tasks = self.open_tasks.get(user) or self.verifying_tasks
+        return self.rng.sample(tasks, min(3, len(tasks)))
+
+    def build(self, scenario, user):
+        '''
+        Function:   Builds one request for a scenario
+        Input:      scenario name, keycloak id of the acting user
+        Output:     (method, path, request kwargs for httpx)
+        '''
+        if scenario == "tasking_summary":
+            return "POST", "/tasking/getTaskingSummaryData", {"json": self.window}
+        if scenario == "tasking_manager":
+            return "POST", "/tasking/getTaskingManagerData", {"json": self.window}
+        if scenario == "complete_image_data":
+            return "POST", "/tasking/getCompleteImageData", {"json": self.window}
+        if scenario == "xbi_report":
+            return "POST", "/reports/getXBIReportData", {"json": self.report_window}
+        if scenario == "start_tasks":
+            return "POST", "/tasking/startTasks", {"json": {"SCVU Task ID": self._task_ids(user)}}
+        if scenario == "complete_tasks":
+            return "POST", "/tasking/completeTasks", {"json": {"SCVU Task ID": self._task_ids(user)}}
+        if scenario == "verify_pass":
+            return "POST", "/tasking/verifyPass", {"json": {"SCVU Task ID": self.rng.sample(self.verifying_tasks, min(3, len(self.verifying_tasks)))}}
+        if scenario == "assign_task":
+            tasks = [
+                {"SCVU Image Area ID": image_area_id, "Assignee": self.rng.choice(self.users_by_role["II"])}
+                for image_area_id in self.rng.sample(self.image_area_ids, min(5, len(self.image_area_ids)))
+            ]
+            return "POST", "/tasking/assignTask", {"json": {"Tasks": tasks}}
+        if scenario == "insert_dsta":
+            return "POST", "/images/insertDSTAData", {"files": {"file": ("dsta.json", self._dsta_file(), "application/json")}}
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+    def _dsta_file(self):
+        now = datetime.datetime.fromisoformat(self.args.end_date).isoformat()
+        images = []
+        for i in range(self.args.ingest_images):
+            img_id = next(self._ingest_ids)
+            images.append({
+                "imgId": img_id,
+                "imageFileName": f"load_{img_id}.ntf",
+                "sensorName": "BENCH-SENSOR-000",
+                "uploadDate": now,
+                "imageDateTime": now,
+                "areas": [{"areaName": self.rng.choice(self.area_names)} for _ in range(3)],
+            })
+        return json.dumps({"images": images}).encode("utf-8")
+
+    async def _worker(self, client, deadline, budget):
+        names = [(scenario, role) for scenario, role, _ in self.mix]
+        weights = [weight for _, _, weight in self.mix]
+        while time.perf_counter() < deadline and next(budget, None) is not None:
+            scenario, role = self.rng.choices(names, weights)[0]
+            user = self.rng.choice(self.users_by_role[role])
+            method, path, kwargs = self.build(scenario, user)
+            key = f"{method} {path}"
+            started_at = time.perf_counter()
+            try:
+                res = await client.request(method, path, headers=self.headers[user], **kwargs)
+                failed = res.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            self.samples[key].append((time.perf_counter() - started_at) * 1000)
+            if failed:
+                self.errors[key] += 1
+
+    async def run(self, client):
+        deadline = time.perf_counter() + self.args.duration
+        budget = iter(range(self.args.requests)) if self.args.requests else itertools.count()
+        started_at = time.perf_counter()
+        await asyncio.gather(*(self._worker(client, deadline, budget) for _ in range(self.args.concurrency)))
+        return time.perf_counter() - started_at
+
+    def report(self, elapsed):
+        total = sum(len(samples) for samples in self.samples.values())
+        results = {}
+        print(f"{total:,} requests in {elapsed:.1f}s: {total / elapsed:,.1f} req/s at concurrency {self.args.concurrency}")
+        for key in sorted(self.samples):
+            samples = self.samples[key]
+            summary = bench_results.summarize(samples)
+            summary["throughput_rps"] = round(len(samples) / elapsed, 2)
+            summary["errors"] = self.errors[key]
+            results[key] = summary
+            print(f"{bench_results.format_summary(key, summary)} rps={summary['throughput_rps']:8.1f} errors={summary['errors']}")
+        return results
+
+
+def _harness_config(config_path, standin):
+    '''
+    Copies the config with its [Keycloak] section pointed at the stand-in
+    '''
+    parser = configparser.ConfigParser()
+    parser.read(config_path)
+    parser["Keycloak"] = {
+        "keycloak_url": standin.url,
+        "realm": standin.realm,
+        "client_id": "xbi-tasking-backend",
+        "client_secret": "standin-secret",
+        "allowed_client_ids": "xbi-tasking-frontend",
+        "admin_client_id": "xbi-tasking-admin",
+        "admin_client_secret": "standin-secret",
+    }
+    config_file = tempfile.NamedTemporaryFile("w", suffix=".config", delete=False)
+    parser.write(config_file)
+    config_file.close()
+    return config_file.name
+
+
+def _load_app(config_path):
+    # main reads its config path from argv at import time
+    sys.argv = [sys.argv[0], config_path]
+    import main
+    return main.app
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _run_asgi(harness, app):
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://harness", timeout=60) as client:
+            return await harness.run(client)
+
+
+async def _run_http(harness, app):
+    import uvicorn
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        await asyncio.sleep(0.05)
+    limits = httpx.Limits(max_connections=harness.args.concurrency, max_keepalive_connections=harness.args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            return await harness.run(client)
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="drives the API end to end with a synthetic user mix")
+    parser.add_argument("config", help="config file with the [Database] loaded by benchmarks.dataset")
+    parser.add_argument("--users", type=int, default=500, help="must match the --users the dataset was loaded with")
+    parser.add_argument("--end-date", default=DEFAULT_END_DATE, help="must match the dataset --end-date")
+    parser.add_argument("--window-days", type=int, default=30)
+    parser.add_argument("--report-days", type=int, default=365)
+    parser.add_argument("--mix", choices=sorted(MIXES), default="default")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests (0: duration only)")
+    parser.add_argument("--ingest-images", type=int, default=10, help="images per insertDSTAData upload")
+    parser.add_argument("--transport", choices=("asgi", "http"), default="asgi")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write per-endpoint results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a results JSON written by --output")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    standin = start_standin(args.users)
+    standin.enable_signing()
+    config_path = _harness_config(args.config, standin)
+    db = Database(config=ConfigClass(config_path))
+    try:
+        harness = LoadHarness(args, standin, db)
+        app = _load_app(config_path)
+        runner = _run_http if args.transport == "http" else _run_asgi
+        try:
+            elapsed = asyncio.run(runner(harness, app))
+        finally:
+            delete_images_from(db, LOAD_ID_BASE)
+    finally:
+        standin.stop()
+        os.remove(config_path)
+
+    results = harness.report(elapsed)
+    meta = {key: value for key, value in vars(args).items() if key not in ("config", "output", "baseline")}
+    if args.output:
+        bench_results.save_baseline(args.output, results, meta)
+    if args.baseline:
+        regressions = bench_results.compare(results, bench_results.load_baseline(args.baseline), args.tolerance)
+        for name, key, previous, current in regressions:
+            print(f"REGRESSION {name} {key}: {previous:.2f}ms -> {current:.2f}ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
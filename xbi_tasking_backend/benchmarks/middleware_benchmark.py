@@ -0,0 +1,136 @@
+'''
+Compares per-request overhead and throughput of the auth + timing middleware as
+function-style @app.middleware("http") handlers (the previous implementation, kept
+here as the baseline) against the pure ASGI middleware in middleware.py.
+
+Requests are driven in-process through httpx.ASGITransport with a stub token verifier,
+so the numbers isolate middleware cost from Keycloak and the database:
+
+    python -m benchmarks.middleware_benchmark --requests 5000
+'''
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from middleware import AUTH_EXEMPT_PATHS, KeycloakAuthMiddleware, RequestTimingMiddleware
+
+
+class StubKeycloakAuth:
+    async def verify_token(self, token):
+        return {"sub": "1", "preferred_username": "bench", "roles": ["II"]}
+
+
+def _add_routes(app):
+    app.state.keycloak_auth = StubKeycloakAuth()
+
+    @app.get("/")
+    async def index():
+        return "it works"
+
+    @app.get("/tasking/ping")
+    async def ping(request: Request):
+        return {"user": request.state.user["preferred_username"]}
+
+
+def build_function_middleware_app():
+    app = FastAPI()
+    _add_routes(app)
+    logger = logging.getLogger("xbi_tasking_backend.benchmark")
+
+    @app.middleware("http")
+    async def keycloak_auth_middleware(request: Request, call_next):
+        if request.method == "OPTIONS":
+            return await call_next(request)
+        excluded_exact_paths = list(AUTH_EXEMPT_PATHS)
+        excluded_prefix_paths = ["/static"]
+        if request.url.path in excluded_exact_paths or any(request.url.path.startswith(prefix) for prefix in excluded_prefix_paths):
+            return await call_next(request)
+        auth_header = request.headers.get("Authorization")
+        if not auth_header or not auth_header.startswith("Bearer "):
+            return JSONResponse(status_code=401, content={"detail": "Not authenticated."})
+        token_info = await request.app.state.keycloak_auth.verify_token(auth_header.split(" ")[1])
+        if not token_info:
+            return JSONResponse(status_code=401, content={"detail": "Invalid or expired token"})
+        request.state.user = token_info
+        return await call_next(request)
+
+    @app.middleware("http")
+    async def request_timing_middleware(request: Request, call_next):
+        if logger.isEnabledFor(logging.DEBUG):
+            start = time.perf_counter()
+            response = await call_next(request)
+            logger.debug("%s %s completed in %.2fms", request.method, request.url.path, (time.perf_counter() - start) * 1000)
+            return response
+        return await call_next(request)
+
+    return app
+
+
+def build_asgi_middleware_app():
+    app = FastAPI()
+    _add_routes(app)
+    app.add_middleware(KeycloakAuthMiddleware)
+    app.add_middleware(RequestTimingMiddleware)
+    return app
+
+
+async def _measure(app, path, requests, concurrency):
+    headers = {"Authorization": "Bearer bench-token"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(50):
+            await client.get(path, headers=headers)
+
+        latencies = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            latencies.append((time.perf_counter() - start) * 1e6)
+            assert response.status_code == 200, response.text
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                await client.get(path, headers=headers)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        throughput = requests / (time.perf_counter() - start)
+    return latencies, throughput
+
+
+def _p(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmarks auth/timing middleware overhead")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    apps = [
+        ("function middleware", build_function_middleware_app()),
+        ("ASGI middleware", build_asgi_middleware_app()),
+    ]
+
+    print(f"{args.requests} requests per scenario, concurrency {args.concurrency} for throughput")
+    for path in ("/tasking/ping", "/"):
+        for label, app in apps:
+            latencies, throughput = asyncio.run(_measure(app, path, args.requests, args.concurrency))
+            print(
+                f"{label:<20} {path:<14} p50={_p(latencies, 50):7.1f}us p99={_p(latencies, 99):7.1f}us "
+                f"mean={statistics.fmean(latencies):7.1f}us throughput={throughput:8.0f} req/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
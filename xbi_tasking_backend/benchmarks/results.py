@@ -0,0 +1,73 @@
+'''
+Latency summaries and baseline comparison shared by the benchmarks.
+
+A baseline file is the JSON written by save_baseline():
+
+    {"meta": {...run arguments...}, "results": {"<case>": {"p50_ms": ..., "p95_ms": ..., ...}}}
+'''
+import json
+import os
+import statistics
+
+
+COMPARED_PERCENTILES = ("p50_ms", "p95_ms")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples_ms):
+    '''
+    Function:   Summarises latency samples
+    Input:      list of latencies in milliseconds
+    Output:     dict with iterations, p50/p95/p99/mean/max in milliseconds
+    '''
+    return {
+        "iterations": len(samples_ms),
+        "p50_ms": round(percentile(samples_ms, 50), 3),
+        "p95_ms": round(percentile(samples_ms, 95), 3),
+        "p99_ms": round(percentile(samples_ms, 99), 3),
+        "mean_ms": round(statistics.fmean(samples_ms), 3),
+        "max_ms": round(max(samples_ms), 3),
+    }
+
+
+def format_summary(name, summary):
+    return (
+        f"{name:<32} p50={summary['p50_ms']:9.2f}ms p95={summary['p95_ms']:9.2f}ms "
+        f"p99={summary['p99_ms']:9.2f}ms mean={summary['mean_ms']:9.2f}ms n={summary['iterations']}"
+    )
+
+
+def load_baseline(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, results, meta):
+    with open(path, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Function:   Flags cases whose p50 or p95 is slower than the baseline by more than tolerance
+    Input:      results dict, baseline dict (as loaded), tolerance as a fraction (0.2 = 20% slower)
+    Output:     list of (case, percentile, baseline ms, current ms) regressions
+    '''
+    regressions = []
+    baseline_results = (baseline or {}).get("results", {})
+    for name, summary in results.items():
+        previous = baseline_results.get(name)
+        if not previous:
+            continue
+        for key in COMPARED_PERCENTILES:
+            if key in previous and summary[key] > previous[key] * (1 + tolerance):
+                regressions.append((name, key, previous[key], summary[key]))
+    return regressions
@@ -0,0 +1,191 @@
+'''
+Latency benchmarks for the hot service methods, run against a database loaded with
+benchmarks.dataset and a local Keycloak stand-in serving the same synthetic users:
+
+    python -m benchmarks.dataset bench.config --images 1000000 --areas-per-image 10 --users 500 --reset
+    python -m benchmarks.service_benchmark bench.config --users 500 --save-baseline
+    ... change code ...
+    python -m benchmarks.service_benchmark bench.config --users 500
+
+Each case reports p50/p95/p99 latencies. When a baseline file exists, cases whose p50 or
+p95 is more than --tolerance slower are listed and the run exits with status 1.
+'''
+import argparse
+import datetime
+import itertools
+import os
+import sys
+import time
+
+from benchmarks import results as bench_results
+from benchmarks.dataset import (
+    AREA_PREFIX,
+    DEFAULT_END_DATE,
+    IMAGE_ID_BASE,
+    assignee_indexes,
+    delete_images_from,
+    user_id,
+    user_roles,
+    username,
+)
+from main_classes.ConfigClass import ConfigClass
+from main_classes.ExcelGenerator import ExcelGenerator
+from main_classes.QueryManager import QueryManager
+from services.image_service import ImageService
+from services.report_service import ReportService
+from services.tasking_service import TaskingService
+from testing.keycloak_standin import KeycloakStandIn
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+# Images inserted by the insert_dsta_data case; removed again after the run
+INGEST_ID_BASE = IMAGE_ID_BASE + 500_000_000
+
+
+def _user(index):
+    roles = user_roles(index)
+    return {"sub": user_id(index), "preferred_username": username(index), "account_type": roles[0], "roles": roles}
+
+
+class ServiceBenchmark:
+    def __init__(self, qm, args):
+        self.qm = qm
+        self.args = args
+        self.image_service = ImageService(qm)
+        self.tasking_service = TaskingService(qm, image_service=self.image_service)
+        self.report_service = ReportService(qm, ExcelGenerator())
+
+        end = datetime.date.fromisoformat(args.end_date)
+        self.window = {
+            "Start Date": (end - datetime.timedelta(days=args.window_days - 1)).isoformat(),
+            "End Date": end.isoformat(),
+        }
+        self.report_window = (
+            (end - datetime.timedelta(days=args.report_days - 1)).isoformat(),
+            end.isoformat(),
+        )
+        ia = next(index for index in range(args.users) if user_roles(index) == ["IA"])
+        senior = next(index for index in range(args.users) if user_roles(index) == ["Senior II"])
+        self.ia_user = _user(ia)
+        self.senior_user = _user(senior)
+        self.ii_user = _user(assignee_indexes(args.users)[0])
+        self._ingest_ids = itertools.count(INGEST_ID_BASE)
+        self.area_names = [row[0] for row in qm.db.executeSelect(
+            "SELECT area_name FROM area WHERE area_name LIKE %s ORDER BY area_name LIMIT 50", (AREA_PREFIX + "%",)
+        )]
+
+    def cases(self):
+        return {
+            "get_tasking_summary[senior]": lambda: self.tasking_service.get_tasking_summary(self.window, self.senior_user),
+            "get_tasking_summary[ii]": lambda: self.tasking_service.get_tasking_summary(self.window, self.ii_user),
+            "get_tasking_manager": lambda: self.tasking_service.get_tasking_manager(self.window),
+            "get_complete_image_data": lambda: self.image_service.get_complete_image_data(self.window, self.ia_user),
+            "get_xbi_report": lambda: self.report_service.get_xbi_report(*self.report_window),
+            "insert_dsta_data": lambda: self.image_service.insert_dsta_data(self._dsta_payload()),
+        }
+
+    def _dsta_payload(self):
+        now = datetime.datetime.fromisoformat(self.args.end_date).isoformat()
+        images = []
+        for i in range(self.args.ingest_images):
+            img_id = next(self._ingest_ids)
+            images.append({
+                "imgId": img_id,
+                "imageFileName": f"bench_ingest_{img_id}.ntf",
+                "sensorName": "BENCH-SENSOR-000",
+                "uploadDate": now,
+                "imageDateTime": now,
+                "areas": [{"areaName": self.area_names[(i * 3 + j) % len(self.area_names)]} for j in range(3)],
+            })
+        return {"images": images}
+
+    def cleanup(self):
+        delete_images_from(self.qm.db, INGEST_ID_BASE)
+
+    def run(self, func):
+        for _ in range(self.args.warmup):
+            func()
+        samples = []
+        for _ in range(self.args.iterations):
+            started_at = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - started_at) * 1000)
+        return bench_results.summarize(samples)
+
+
+def start_standin(user_count, port=0):
+    '''
+    Function:   Starts a Keycloak stand-in serving the synthetic dataset users with their roles
+    Input:      number of users the dataset was loaded with, port (0 picks a free one)
+    Output:     running KeycloakStandIn
+    '''
+    standin = KeycloakStandIn().start(port)
+    for role_name in ("II", "Senior II", "IA"):
+        standin.role_members.setdefault(role_name, [])
+    for index in range(user_count):
+        standin.add_user(username(index), roles=user_roles(index), user_id=user_id(index))
+    return standin
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmarks the hot service methods against a synthetic dataset")
+    parser.add_argument("config", help="config file with the [Database] loaded by benchmarks.dataset")
+    parser.add_argument("--users", type=int, default=500, help="must match the --users the dataset was loaded with")
+    parser.add_argument("--end-date", default=DEFAULT_END_DATE, help="must match the dataset --end-date")
+    parser.add_argument("--window-days", type=int, default=30, help="date range for tasking/image queries")
+    parser.add_argument("--report-days", type=int, default=365, help="date range for the xbi report")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--ingest-images", type=int, default=20, help="images per insert_dsta_data call")
+    parser.add_argument("--only", nargs="*", help="case names to run (default: all)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before flagging, as a fraction")
+    args = parser.parse_args()
+
+    standin = start_standin(args.users)
+    config = ConfigClass(args.config)
+    config.config.read_dict({"Keycloak": {
+        "keycloak_url": standin.url,
+        "realm": standin.realm,
+        "admin_client_id": "xbi-tasking-admin",
+        "admin_client_secret": "standin-secret",
+    }})
+
+    results = {}
+    try:
+        benchmark = ServiceBenchmark(QueryManager(config=config), args)
+        image_count = benchmark.qm.db.executeSelect("SELECT COUNT(*) FROM image")[0][0]
+        print(f"{image_count:,} images in {config.getDatabaseName()}, {args.iterations} iterations per case")
+        try:
+            for name, func in benchmark.cases().items():
+                if args.only and name not in args.only:
+                    continue
+                results[name] = benchmark.run(func)
+                print(bench_results.format_summary(name, results[name]))
+        finally:
+            benchmark.cleanup()
+    finally:
+        standin.stop()
+
+    meta = {key: value for key, value in vars(args).items() if key not in ("config", "baseline", "save_baseline", "only")}
+    meta["images"] = image_count
+    if args.save_baseline:
+        bench_results.save_baseline(args.baseline, results, meta)
+        print(f"baseline written to {args.baseline}")
+        return
+
+    baseline = bench_results.load_baseline(args.baseline)
+    if baseline is None:
+        print(f"no baseline at {args.baseline}; rerun with --save-baseline to record one")
+        return
+    regressions = bench_results.compare(results, baseline, args.tolerance)
+    for name, key, previous, current in regressions:
+        print(f"REGRESSION {name} {key}: {previous:.2f}ms -> {current:.2f}ms")
+    if regressions:
+        sys.exit(1)
+    print(f"no regressions beyond {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+'''
+Standalone bulk ingest worker for DSTA files.
+
+Watches a drop directory and ingests every DSTA file copied into it through the same pipeline as
+uploads. Each file is recorded as an ingest_job, which the web app polls to notify users once the
+file is done:
+
+    python ingest_worker.py dev_server.config --drop-dir D:/dsta_drop
+
+Run one worker per drop directory. A worker keeps its running job's heartbeat fresh, and on startup
+only fails jobs whose heartbeat has stopped, so starting another worker leaves running ones alone.
+The directory is polled rather than watched through OS events, so it works the same on local disks
+and network shares.
+'''
+import argparse
+import codecs
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from config import load_config
+from main_classes.QueryManager import QueryManager
+from services.image_service import ImageService
+from services.ingest_service import DROP_SOURCE
+
+
+logger = logging.getLogger("xbi_tasking_backend.ingest_worker")
+
+IMAGES_ARRAY = re.compile(rb'"images"\s*:\s*\[')
+# Bytes of the file decoded at a time while parsing
+PARSE_CHUNK = 1 << 20
+# Seconds between heartbeats of the running job; well inside INGEST_JOB_STALE_SECONDS
+HEARTBEAT_SECONDS = 30.0
+
+
+def iter_dsta_images(contents, chunk_size=PARSE_CHUNK):
+    '''
+    Function: Parses the images of a DSTA file one at a time, so the whole file is never held as one document
+    Input: contents is the file as bytes or a memory map, chunk_size is how many bytes are decoded at a time
+    Output: generator of image dicts, in file order
+    Note: raises ValueError (json.JSONDecodeError when the JSON is malformed) if there is no complete 'images' list
+    '''
+    match = IMAGES_ARRAY.search(contents)
+    if match is None:
+        raise ValueError("Invalid DSTA file: expected 'images' list")
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    end = len(contents)
+    offset = match.end()
+    text = ""
+    index = 0
+    while True:
+        if index < len(text) and text[index] in " \t\r\n,":
+            index += 1
+            continue
+        if index < len(text) and text[index] == "]":
+            return
+        if index < len(text):
+            try:
+                image, index = decoder.raw_decode(text, index)
+            except json.JSONDecodeError:
+                # The image may run on into the next chunk; only fail once the file is exhausted
+                if offset >= end:
+                    raise
+            else:
+                yield image
+                continue
+        elif offset >= end:
+            raise ValueError("Invalid DSTA file: 'images' list is not closed")
+        chunk = contents[offset:offset + chunk_size]
+        offset += len(chunk)
+        text = text[index:] + utf8.decode(chunk, final=offset >= end)
+        index = 0
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class DropDirectoryIngester:
+    '''
+    Ingests the DSTA files dropped into a directory. Each file is memory-mapped and parsed one image
+    at a time, and its images are inserted in batches on a bounded pool of threads. Files are then
+    moved to processed_dir, or to failed_dir if they could not be read or parsed.
+    '''
+    def __init__(self, query_manager, image_service, drop_dir, processed_dir=None, failed_dir=None, workers=2, batch_size=500,
+                 heartbeat_seconds=HEARTBEAT_SECONDS):
+        self.qm = query_manager
+        self.image_service = image_service
+        self.drop_dir = drop_dir
+        self.processed_dir = processed_dir or os.path.join(drop_dir, "processed")
+        self.failed_dir = failed_dir or os.path.join(drop_dir, "failed")
+        self.workers = workers
+        self.batch_size = batch_size
+        self.heartbeat_seconds = heartbeat_seconds
+        # (size, mtime) of each file at the previous scan
+        self._seen = {}
+
+    def scan(self, settled=True):
+        '''
+        Function: Lists the DSTA files in the drop directory that are ready to ingest, oldest first
+        Input: settled only returns files whose size and modification time are unchanged since the previous scan
+        Output: list of paths
+        Note: settled leaves files that are still being copied in for a later scan
+        '''
+        seen = {}
+        ready = []
+        with os.scandir(self.drop_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or entry.name.startswith(".") or not entry.name.lower().endswith(".json"):
+                    continue
+                stat = entry.stat()
+                seen[entry.path] = (stat.st_size, stat.st_mtime_ns)
+                if not settled or self._seen.get(entry.path) == seen[entry.path]:
+                    ready.append((stat.st_mtime_ns, entry.path))
+        self._seen = seen
+        return [path for _, path in sorted(ready)]
+
+    def ingest_file(self, path):
+        '''
+        Function: Ingests one DSTA file and moves it out of the drop directory
+        Input: path
+        Output: job id, or None if the same file is still being ingested by another job and was left in place
+        '''
+        file_name = os.path.basename(path)
+        job_id = uuid.uuid4().hex
+        try:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as contents:
+                content_hash = hashlib.sha256(contents).hexdigest()
+                duplicate = self.qm.findIngestJobByHash(content_hash)
+                if duplicate and duplicate[1] != "succeeded":
+                    logger.info("%s is already being ingested by job %s", file_name, duplicate[0])
+                    return None
+                if duplicate:
+                    self.qm.recordDuplicateIngestJob(job_id, DROP_SOURCE, file_name, None, duplicate[0])
+                    destination = self.processed_dir
+                else:
+                    self.qm.createIngestJob(job_id, DROP_SOURCE, file_name, None, 0, content_hash)
+                    destination = self._run_job(job_id, contents)
+        except (OSError, ValueError) as e:
+            # Unreadable or empty files are still recorded, so the failure is notified like any other
+            logger.warning("Could not read %s: %s", file_name, e)
+            self.qm.createIngestJob(job_id, DROP_SOURCE, file_name, None, 0)
+            self.qm.finishIngestJob(job_id, "failed", str(e))
+            destination = self.failed_dir
+        # Moved only once the memory map is closed, since Windows will not move a mapped file
+        self._move(path, destination, job_id)
+        return job_id
+
+    def _run_job(self, job_id, contents):
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, stop), name="ingest-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            self.qm.startIngestJob(job_id)
+            processed, inserted, existing, errors, areas = self._ingest_images(job_id, iter_dsta_images(contents))
+        except Exception as e:
+            logger.exception("Ingest job %s failed", job_id)
+            self.qm.finishIngestJob(job_id, "failed", str(e))
+            return self.failed_dir
+        finally:
+            stop.set()
+            heartbeat.join()
+        message_parts = [f"Successfully inserted {inserted} images and {areas} areas"]
+        if existing:
+            message_parts.append(f"{existing} already existed")
+        if errors:
+            message_parts.append(f"{errors} errors encountered")
+        self.qm.finishIngestJob(job_id, "succeeded", " | ".join(message_parts), total_images=processed)
+        return self.processed_dir
+
+    def _heartbeat(self, job_id, stop):
+        # Progress is only recorded per batch, which can take longer than a job may go without a heartbeat
+        while not stop.wait(self.heartbeat_seconds):
+            try:
+                self.qm.touchIngestJobs([job_id])
+            except Exception as e:
+                logger.warning("Could not refresh ingest job %s: %s", job_id, e)
+
+    def _ingest_images(self, job_id, images):
+        # Counts in updateIngestJobProgress order: processed, inserted, existing, errors, areas
+        totals = [0, 0, 0, 0, 0]
+        lock = threading.Lock()
+        # Parsing stays at most one batch per thread ahead of the inserts
+        in_flight = threading.BoundedSemaphore(self.workers * 2)
+
+        def insert(batch):
+            try:
+                result = self.image_service.insert_dsta_data({'images': batch}, job_id=job_id)
+                inserted = result.get("images_inserted", 0)
+                if result.get("success"):
+                    counts = (len(batch), inserted, result["images_existing"], len(result.get("errors", [])), result["areas_inserted"])
+                else:
+                    logger.warning("Batch of job %s failed: %s", job_id, result.get("error"))
+                    counts = (len(batch), inserted, 0, len(batch) - inserted, result.get("areas_inserted", 0))
+                with lock:
+                    for i, count in enumerate(counts):
+                        totals[i] += count
+                    self.qm.updateIngestJobProgress(job_id, *totals)
+            finally:
+                in_flight.release()
+
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest-worker") as executor:
+            for batch in _batches(images, self.batch_size):
+                in_flight.acquire()
+                futures.append(executor.submit(insert, batch))
+        for future in futures:
+            future.result()
+        return tuple(totals)
+
+    def _move(self, path, directory, job_id):
+        os.makedirs(directory, exist_ok=True)
+        target = os.path.join(directory, os.path.basename(path))
+        if os.path.exists(target):
+            stem, ext = os.path.splitext(os.path.basename(path))
+            target = os.path.join(directory, f"{stem}.{job_id}{ext}")
+        os.replace(path, target)
+
+    def run(self, poll_seconds=5.0, once=False):
+        '''
+        Function: Ingests files from the drop directory until stopped
+        Input: poll_seconds between scans, once ingests what is there now and returns
+        '''
+        # Jobs left by a worker that was stopped; their files are still in the drop directory. Jobs of
+        # workers that are still running keep their heartbeat fresh and are left alone
+        self.qm.failStaleIngestJobs(DROP_SOURCE, "Interrupted; the file will be ingested again")
+        while True:
+            for path in self.scan(settled=not once):
+                try:
+                    self.ingest_file(path)
+                except Exception:
+                    logger.exception("Could not ingest %s; it will be retried", path)
+            if once:
+                return
+            time.sleep(poll_seconds)
+
+
+def main(argv=None):
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO"),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    parser = argparse.ArgumentParser(description="ingests DSTA files dropped into a directory")
+    parser.add_argument(
+        "config_path",
+        nargs="?",
+        default=os.getenv("CONFIG_PATH", "dev_server.config"),
+        help="file path of the config file to be used",
+    )
+    parser.add_argument("--drop-dir", help="directory to watch (default: drop_dir under [Ingest])")
+    parser.add_argument("--processed-dir", help="where ingested files are moved (default: <drop-dir>/processed)")
+    parser.add_argument("--failed-dir", help="where files that could not be parsed are moved (default: <drop-dir>/failed)")
+    parser.add_argument("--workers", type=int, help="batches inserted in parallel; keep below DB_POOL_MAX (default: workers under [Ingest])")
+    parser.add_argument("--batch-size", type=int, help="images per batch (default: batch_size under [Ingest])")
+    parser.add_argument("--poll-seconds", type=float, help="seconds between scans (default: poll_seconds under [Ingest])")
+    parser.add_argument("--once", action="store_true", help="ingest the files already in the directory and exit")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config_path)
+    drop_dir = args.drop_dir or config.getIngestDropDir()
+    if not drop_dir:
+        parser.error("no drop directory: pass --drop-dir or set drop_dir under [Ingest]")
+    qm = QueryManager(config=config)
+    ingester = DropDirectoryIngester(
+        qm,
+        ImageService(qm),
+        drop_dir,
+        processed_dir=args.processed_dir,
+        failed_dir=args.failed_dir,
+        workers=args.workers or config.getIngestWorkers(),
+        batch_size=args.batch_size or config.getIngestBatchSize(),
+    )
+    logger.info("Watching %s for DSTA files", drop_dir)
+    ingester.run(args.poll_seconds or config.getIngestPollSeconds(), once=args.once)
+
+
+if __name__ == '__main__':
+    main()
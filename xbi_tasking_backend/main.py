@@ -1,12 +1,11 @@
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
 from starlette.status import HTTP_422_UNPROCESSABLE_ENTITY
+from contextlib import asynccontextmanager
 import argparse
 import uvicorn
 import logging
-import time
 from fastapi.openapi.docs import (
     get_redoc_html,
     get_swagger_ui_html,
@@ -17,6 +16,7 @@ from config import load_config
 from main_classes.KeycloakAuth import KeycloakAuth
 from app_state import init_app_state
 from api_utils import error_response
+from middleware import KeycloakAuthMiddleware, ProfilingMiddleware, RequestTimingMiddleware, TracingMiddleware
 from security import KEYCLOAK_ENABLED
 import os
 
@@ -36,7 +36,29 @@ parser.add_argument(
 args, _ = parser.parse_known_args()
 
 config = load_config(args.config_path)
-app = FastAPI(docs_url=None, redoc_url=None)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keycloak discovery/JWKS load asynchronously and share one HTTP client for the app's lifetime
+    await app.state.keycloak_auth.start()
+    # Image partitions for the coming months are created ahead of ingest
+    app.state.partition_service.start()
+    # Completed images past the retention window are archived in the background
+    app.state.archive_service.start()
+    # Uploads finished by the standalone ingest worker are notified from the ingest_job table
+    app.state.ingest_service.start()
+    try:
+        yield
+    finally:
+        app.state.archive_service.stop()
+        app.state.partition_service.stop()
+        app.state.ingest_service.shutdown()
+        app.state.qm.close()
+        await app.state.keycloak_auth.aclose()
+
+
+app = FastAPI(docs_url=None, redoc_url=None, lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 app.state.config = config
 skip_keycloak_init = os.getenv("SKIP_KEYCLOAK_INIT", "").lower() == "true"
@@ -53,7 +75,7 @@ else:
         "http://localhost:3000",
         "http://127.0.0.1:3000",
     ]
-from routers import auth, images, lookup, notifications, reports, tasking, users
+from routers import auth, images, lookup, metrics, notifications, profiles, reports, tasking, traces, users
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(_request: Request, exc: RequestValidationError):
@@ -75,96 +97,13 @@ async def unhandled_exception_handler(_request: Request, exc: Exception):
 logger.info("Keycloak authentication: %s", "ENABLED" if KEYCLOAK_ENABLED else "DISABLED")
 
 # IMPORTANT: Auth middleware must be registered BEFORE CORS middleware
-# Middleware to validate tokens for ALL routes (except excluded ones)
-@app.middleware("http")
-async def keycloak_auth_middleware(request: Request, call_next):
-    """
-    Middleware that validates Keycloak tokens for all requests
-    Excludes: /docs, /redoc, /openapi.json, /static, / (health check)
-    """
-    # Handle OPTIONS requests (CORS preflight) - these don't need auth
-    if request.method == "OPTIONS":
-        logger.debug("Middleware OPTIONS request allowed")
-        response = await call_next(request)
-        return response
-    
-    # List of paths that don't require authentication
-    # Use exact match for most paths, but /static should match any path starting with /static
-    excluded_exact_paths = ["/docs", "/redoc", "/openapi.json", "/", "/auth/login", "/auth/callback", "/auth/logout", "/auth/refresh"]
-    excluded_prefix_paths = ["/static"]
-    
-    # Check if path is excluded (exact match or prefix match)
-    if request.url.path in excluded_exact_paths or any(request.url.path.startswith(prefix) for prefix in excluded_prefix_paths):
-        logger.debug("Middleware path excluded: %s", request.url.path)
-        response = await call_next(request)
-        return response
-    
-    # If Keycloak is disabled, allow all requests but set anonymous user
-    if not KEYCLOAK_ENABLED:
-        logger.debug("Keycloak disabled; using anonymous user")
-        request.state.user = {"sub": "anonymous", "preferred_username": "anonymous"}
-        response = await call_next(request)
-        return response
-    
-    # Validate token for all other routes
-    keycloak_auth = request.app.state.keycloak_auth
-    
-    auth_header = request.headers.get("Authorization")
-    
-    if not auth_header or not auth_header.startswith("Bearer "):
-        logger.warning("Missing or invalid Authorization header for %s", request.url.path)
-        from fastapi.responses import JSONResponse
-        return JSONResponse(
-            status_code=401,
-            content={"detail": "Not authenticated. Missing or invalid Authorization header."},
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    token = auth_header.split(" ")[1]
-    if not token:
-        logger.warning("Empty token in Authorization header for %s", request.url.path)
-        from fastapi.responses import JSONResponse
-        return JSONResponse(
-            status_code=401,
-            content={"detail": "Not authenticated. Empty token."},
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    try:
-        token_info = await keycloak_auth.verify_token(token)
-        
-        if not token_info:
-            logger.warning("Token validation failed for %s", request.url.path)
-            from fastapi.responses import JSONResponse
-            return JSONResponse(
-                status_code=401,
-                content={"detail": "Invalid or expired token"},
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        # Attach user info to request state for use in route handlers
-        request.state.user = token_info
-        
-        # Continue with the request
-        response = await call_next(request)
-        return response
-        
-    except HTTPException as e:
-        logger.warning("HTTPException in middleware for %s: %s", request.url.path, e.detail)
-        return JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers=e.headers)
-    except Exception as e:
-        logger.exception("Exception in middleware for %s", request.url.path)
-        raise
-
-@app.middleware("http")
-async def request_timing_middleware(request: Request, call_next):
-    if logger.isEnabledFor(logging.DEBUG):
-        start = time.perf_counter()
-        response = await call_next(request)
-        duration_ms = (time.perf_counter() - start) * 1000
-        logger.debug("%s %s completed in %.2fms", request.method, request.url.path, duration_ms)
-        return response
-    return await call_next(request)
+# so CORS headers are also added to 401 responses.
+# Validates tokens for ALL routes except OPTIONS and the paths in middleware.AUTH_EXEMPT_PATHS/PREFIXES
+# Profiling runs inside auth so it can check the user is an admin
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(KeycloakAuthMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(RequestTimingMiddleware)
 
 app.include_router(auth.router)
 app.include_router(images.router)
@@ -173,6 +112,9 @@ app.include_router(tasking.router)
 app.include_router(lookup.router)
 app.include_router(reports.router)
 app.include_router(notifications.router)
+app.include_router(metrics.router)
+app.include_router(profiles.router)
+app.include_router(traces.router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -0,0 +1,133 @@
+from urllib.parse import urlparse
+import httpx
+
+import metrics
+from config import get_config
+
+ROLE_PAGE_SIZE = 100
+
+
+class AsyncKeycloakClient:
+    '''
+    Async counterpart of KeycloakClient backed by one pooled httpx.AsyncClient.
+    The client is bound to the event loop it is first used on.
+    '''
+    def __init__(self, config=None, http=None):
+        self.config = config or get_config()
+        self.http = http or self._create_http_client()
+
+    def _create_http_client(self):
+        pool_size = self.config.getKeycloakHttpPoolSize()
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        transport = httpx.AsyncHTTPTransport(limits=limits, retries=self.config.getKeycloakHttpRetries())
+        timeout = httpx.Timeout(
+            self.config.getKeycloakHttpReadTimeout(),
+            connect=self.config.getKeycloakHttpConnectTimeout(),
+        )
+        return httpx.AsyncClient(
+            transport=transport,
+            timeout=timeout,
+            event_hooks=metrics.httpx_event_hooks("admin_async"),
+        )
+
+    def _base(self):
+        keycloak_url = self.config.getKeycloakURL()
+        realm = self.config.getKeycloakRealm()
+        return keycloak_url, realm
+
+    async def get_admin_token(self):
+        admin_client_id = self.config.getKeycloakAdminClientID()
+        admin_client_secret = self.config.getKeycloakAdminClientSecret()
+        if not admin_client_secret or admin_client_secret == "your_admin_client_secret":
+            raise ValueError(
+                "Keycloak admin client secret is not configured. Please set admin_client_secret in dev_server.config"
+            )
+
+        keycloak_url, realm = self._base()
+        url = f"{keycloak_url}/realms/{realm}/protocol/openid-connect/token"
+        data = {
+            "grant_type": "client_credentials",
+            "client_id": admin_client_id,
+            "client_secret": admin_client_secret,
+        }
+        response = await self.http.post(url, data=data)
+        if response.status_code == 401:
+            raise ValueError(
+                "Failed to authenticate with Keycloak admin client. "
+                "Please verify admin_client_id and admin_client_secret in dev_server.config."
+            )
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+    async def get_user_by_id(self, token, keycloak_user_id):
+        keycloak_url, realm = self._base()
+        url = f"{keycloak_url}/admin/realms/{realm}/users/{keycloak_user_id}"
+        headers = {"Authorization": f"Bearer {token}"}
+        response = await self.http.get(url, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    async def find_user_id(self, token, username):
+        keycloak_url, realm = self._base()
+        url = f"{keycloak_url}/admin/realms/{realm}/users"
+        headers = {"Authorization": f"Bearer {token}"}
+        params = {"username": username, "exact": "true"}
+        response = await self.http.get(url, headers=headers, params=params)
+        response.raise_for_status()
+        users = response.json()
+        if not users:
+            return None
+        return users[0]["id"]
+
+    async def get_role(self, token, role_name):
+        keycloak_url, realm = self._base()
+        url = f"{keycloak_url}/admin/realms/{realm}/roles/{role_name}"
+        headers = {"Authorization": f"Bearer {token}"}
+        response = await self.http.get(url, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    async def get_users_for_role(self, token, role_name, page_size=ROLE_PAGE_SIZE):
+        keycloak_url, realm = self._base()
+        url = f"{keycloak_url}/admin/realms/{realm}/roles/{role_name}/users"
+        headers = {"Authorization": f"Bearer {token}"}
+        users = []
+        first = 0
+        while True:
+            params = {"first": first, "max": page_size, "briefRepresentation": "true"}
+            response = await self.http.get(url, headers=headers, params=params)
+            response.raise_for_status()
+            page = response.json()
+            users.extend(page)
+            if len(page) < page_size:
+                return users
+            first += page_size
+
+    async def assign_realm_role(self, token, user_id, role_representation):
+        keycloak_url, realm = self._base()
+        url = f"{keycloak_url}/admin/realms/{realm}/users/{user_id}/role-mappings/realm"
+        headers = {"Authorization": f"Bearer {token}"}
+        response = await self.http.post(url, headers=headers, json=[role_representation])
+        response.raise_for_status()
+
+    async def create_user(self, token, username, password):
+        keycloak_url, realm = self._base()
+        url = f"{keycloak_url}/admin/realms/{realm}/users"
+        headers = {"Authorization": f"Bearer {token}"}
+        payload = {
+            "username": username,
+            "enabled": True,
+            "credentials": [
+                {"type": "password", "value": password, "temporary": False},
+            ],
+        }
+        response = await self.http.post(url, headers=headers, json=payload)
+        response.raise_for_status()
+        location = response.headers.get("Location")
+        if not location:
+            return None
+        path = urlparse(location).path or ""
+        return path.rsplit("/", 1)[-1] if "/" in path else None
+
+    async def aclose(self):
+        await self.http.aclose()
@@ -42,9 +42,63 @@ class ConfigClass:
     def getKeycloakAdminClientSecret(self):
         return self.config.get('Keycloak', 'admin_client_secret')
 
+    def getKeycloakHttpPoolSize(self):
+        return self.config.getint('Keycloak', 'http_pool_size', fallback=20)
+
+    def getKeycloakHttpConnectTimeout(self):
+        return self.config.getfloat('Keycloak', 'http_connect_timeout', fallback=3.0)
+
+    def getKeycloakHttpReadTimeout(self):
+        return self.config.getfloat('Keycloak', 'http_read_timeout', fallback=5.0)
+
+    def getKeycloakHttpRetries(self):
+        return self.config.getint('Keycloak', 'http_retries', fallback=3)
+
+    def getKeycloakHttpRetryBackoff(self):
+        return self.config.getfloat('Keycloak', 'http_retry_backoff', fallback=0.2)
+
     def getAutoInitDb(self):
         return self.config.getboolean('Database', 'auto_init_db', fallback=True)
 
+    def getArchiveEnabled(self):
+        return self.config.getboolean('Archive', 'enabled', fallback=False)
+
+    def getArchiveRetentionDays(self):
+        return self.config.getint('Archive', 'retention_days', fallback=180)
+
+    def getArchiveBatchSize(self):
+        return self.config.getint('Archive', 'batch_size', fallback=500)
+
+    def getArchiveIntervalSeconds(self):
+        return self.config.getfloat('Archive', 'interval_seconds', fallback=3600.0)
+
+    def getPartitionMonthsAhead(self):
+        return self.config.getint('Partition', 'months_ahead', fallback=3)
+
+    def getPartitionIntervalSeconds(self):
+        return self.config.getfloat('Partition', 'interval_seconds', fallback=86400.0)
+
+    def getPartitionLockTimeoutMs(self):
+        return self.config.getint('Partition', 'lock_timeout_ms', fallback=5000)
+
+    def getIngestWorkers(self):
+        return self.config.getint('Ingest', 'workers', fallback=2)
+
+    def getIngestMaxPending(self):
+        return self.config.getint('Ingest', 'max_pending', fallback=8)
+
+    def getIngestNotifyIntervalSeconds(self):
+        return self.config.getfloat('Ingest', 'notify_interval_seconds', fallback=10.0)
+
+    def getIngestDropDir(self):
+        return self.config.get('Ingest', 'drop_dir', fallback=None)
+
+    def getIngestBatchSize(self):
+        return self.config.getint('Ingest', 'batch_size', fallback=500)
+
+    def getIngestPollSeconds(self):
+        return self.config.getfloat('Ingest', 'poll_seconds', fallback=5.0)
+
     def getKeycloakAllowedClientIDs(self):
         raw = self.config.get('Keycloak', 'allowed_client_ids', fallback='').strip()
         if not raw:
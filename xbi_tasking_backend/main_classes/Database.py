@@ -1,10 +1,13 @@
 import os
+import time
+import uuid
 import psycopg2
 from contextlib import contextmanager
 from psycopg2 import sql
-from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 
 import logging
+import metrics
 from config import get_config
 from main_classes.DatabaseSchemaManager import DatabaseSchemaManager
 
@@ -18,6 +21,8 @@ class Database():
         self._config = config or get_config()
         db_name = self._config.getDatabaseName()
         self._pool = self._create_pool(db_name)
+        metrics.DB_POOL_IN_USE.set_function(lambda: len(self._pool._used))
+        metrics.DB_POOL_MAX.set_function(lambda: self._pool.maxconn)
         self._schema_manager = DatabaseSchemaManager(self)
         
         # Check if tables exist, if not create them (configurable for prod)
@@ -72,11 +77,16 @@ class Database():
             raise
 
     @contextmanager
-    def _get_cursor(self, *, autocommit: bool = True):
-        conn = self._pool.getconn()
+    def _get_cursor(self, *, autocommit: bool = True, name=None):
+        started_at = time.perf_counter()
+        try:
+            conn = self._pool.getconn()
+        except PoolError:
+            metrics.DB_POOL_EXHAUSTED.inc()
+            raise
         try:
             conn.autocommit = autocommit
-            with conn.cursor() as cursor:
+            with conn.cursor(name=name) as cursor:
                 yield cursor
             if not autocommit:
                 conn.commit()
@@ -86,6 +96,7 @@ class Database():
             raise
         finally:
             self._pool.putconn(conn)
+            metrics.record_db_time(time.perf_counter() - started_at)
 
     @contextmanager
     def transaction(self):
@@ -108,6 +119,20 @@ class Database():
             temp = cursor.fetchall()
         return temp
     
+    def executeSelectStream(self, query, values=None, itersize=2000):
+        '''
+        Function:   Executes a select statement on a server-side cursor
+        Input:      query is a string with the select statement
+        Input:      values is the values to be passed into the query
+        Input:      itersize is the number of rows fetched per round trip
+        Output:     generator of result rows; it holds a pooled connection until exhausted or closed
+        '''
+        # Named cursors only live inside a transaction
+        with self._get_cursor(autocommit=False, name=f"stream_{uuid.uuid4().hex}") as cursor:
+            cursor.itersize = itersize
+            cursor.execute(query, values)
+            yield from cursor
+
     def executeInsert(self, query, values=None):
         '''
         Function:   Executes an insert statement
@@ -202,10 +227,17 @@ class Database():
         if self._config.getDatabaseName() != "XBI_TASKING_3_TEST":
             exit()
         statements = [
+            "DELETE FROM report_daily_rollup",
+            "DELETE FROM ingest_job",
+            "DELETE FROM archive_state",
+            "DELETE FROM task_archive",
+            "DELETE FROM image_area_archive",
+            "DELETE FROM image_archive",
             "DELETE FROM task",
             "DELETE FROM image_area",
             "DELETE FROM area",
             "DELETE FROM image",
+            "DELETE FROM image_key",
             "DELETE FROM cloud_cover",
             "DELETE FROM ew_status",
             "DELETE FROM image_category",
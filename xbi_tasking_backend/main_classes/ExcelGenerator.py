@@ -1,55 +1,61 @@
-import pandas as pd
-import os
-import datetime
-import time
-import json 
-from datetime import date as date
-from datetime import datetime ,timedelta
-from time import strptime
-from calendar import monthrange
-import xlsxwriter
+import io
+
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Sheets with more rows than this are written in xlsxwriter's constant_memory mode
+CONSTANT_MEMORY_ROWS = 1000
+
 
 class ExcelGenerator:
     def __init__(self):
-        #edit excel destination here
-        self.excel_destination = os.curdir
         self.sheet_name = "Report"
 
     def create_excel(self, json):
         '''
-        Function: Writes an Excel File
+        Function: Builds the report workbook in memory
+        Input: dict of column name -> list of cell values, all lists the same length
+        Output: bytes of the xlsx file
         '''
-        excel_destination = os.path.join(self.excel_destination, "report.xlsx")
-        writer = pd.ExcelWriter(excel_destination, engine = 'xlsxwriter') 
-
-        df = self.create_sheet(json)
-        df.style.to_excel(writer,sheet_name = self.sheet_name,index = False)
-        writer = self.organise_column_length(df,writer) 
-        writer.close()
-        return excel_destination
+        row_count = max((len(values) for values in json.values()), default=0)
+        output = io.BytesIO()
+        self.write_workbook(output, list(json.keys()), zip(*json.values()), constant_memory=row_count > CONSTANT_MEMORY_ROWS)
+        return output.getvalue()
 
-    def create_sheet(self, json):
+    def write_workbook(self, output, headers, rows, constant_memory=True):
         '''
-        Function: Function that creates the df sheet
-        Output: returns a DF with required data
+        Function: Writes a single-sheet workbook, sizing the columns from the data in the same pass
+        Input: output is a path or binary file-like object
+        Input: headers is the list of column names
+        Input: rows is an iterable of row sequences; in constant_memory mode it is consumed as it is written
+        Output: number of data rows written
         '''
-        df = pd.DataFrame(json)   
-        return df
+        # Imported on first use so that starting a worker does not pay for it
+        import xlsxwriter
 
-    def organise_column_length(self,df,writer):
-        '''
-        Function: reformats the columns to look nice
-        Input: df with all the columns
-        Input: writer is a writer object in pandas
-        '''
-        workbook = writer.book
-        text_wrap_format = workbook.add_format({'text_wrap':True, 'align':'center', 'valign':'center'})
-        for column in df: 
-            if df.empty:
-                col_idx = df.columns.get_loc(column)
-                writer.sheets[self.sheet_name].set_column(col_idx , col_idx, len(column) + 4, text_wrap_format)
+        options = {"constant_memory": True} if constant_memory else {"in_memory": True}
+        workbook = xlsxwriter.Workbook(output, options)
+        worksheet = workbook.add_worksheet(self.sheet_name)
+        header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+        text_wrap_format = workbook.add_format({'text_wrap': True, 'align': 'center', 'valign': 'center'})
+
+        for col_idx, header in enumerate(headers):
+            worksheet.write(0, col_idx, header, header_format)
+        widths = [0] * len(headers)
+        row_count = 0
+        for row_count, row in enumerate(rows, start=1):
+            for col_idx, value in enumerate(row):
+                if value is None:
+                    continue
+                worksheet.write(row_count, col_idx, value)
+                widths[col_idx] = max(widths[col_idx], len(str(value)))
+
+        # Column settings are kept apart from the row data, so they can be set after streaming the rows
+        for col_idx, header in enumerate(headers):
+            if row_count == 0:
+                width = len(header) + 4
             else:
-                column_width = max(df[column].astype(str).map(len).max(), len(column))
-                col_idx = df.columns.get_loc(column)
-                writer.sheets[self.sheet_name].set_column(col_idx , col_idx, column_width + 8, text_wrap_format)
-        return writer
+                width = max(widths[col_idx], len(header)) + 8
+            worksheet.set_column(col_idx, col_idx, width, text_wrap_format)
+        workbook.close()
+        return row_count
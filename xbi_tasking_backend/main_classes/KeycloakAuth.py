@@ -1,15 +1,33 @@
 """
 Keycloak Authentication Middleware for FastAPI
 """
-from jose import jwt, JWTError
+from jose import jwk, jwt, JWTError
+import asyncio
+import copy
+import hashlib
 import time
 import logging
+from collections import OrderedDict
 from typing import Optional
 import httpx
+import metrics
 from config import get_config
+from tracing import traced_class
 
 logger = logging.getLogger("xbi_tasking_backend.keycloak_auth")
 
+TOKEN_CACHE_SIZE = 2048
+# Minimum gap between JWKS refreshes triggered by an unknown kid
+JWKS_MIN_REFRESH_INTERVAL = 30
+
+# Introspection results are only trusted briefly so revocations still take effect quickly
+INTROSPECTION_CACHE_TTL = 30
+INTROSPECTION_NEGATIVE_TTL = 10
+# Consecutive introspection failures before the circuit opens, and how long it stays open
+INTROSPECTION_BREAKER_THRESHOLD = 5
+INTROSPECTION_BREAKER_COOLDOWN = 30
+
+@traced_class
 class KeycloakAuth:
     """
     Keycloak authentication handler for validating JWT tokens
@@ -30,22 +48,97 @@ class KeycloakAuth:
         self.jwks_cache = None
         self.jwks_fetched_at = 0
         self.jwks_ttl_seconds = 3600
-        
-        if eager:
-            self._load_public_key()
-    
-    def _load_public_key(self):
+        self._jwks_last_attempt = 0
+        self._jwks_refresh_task = None
+        # kid -> (pre-constructed public key, algorithm)
+        self._signing_keys = {}
+
+        # sha256(token) -> (user info, exp); only JWKS-verified tokens are cached
+        self._token_cache = OrderedDict()
+        self.token_cache_size = TOKEN_CACHE_SIZE
+        self.token_cache_hits = 0
+        self.token_cache_misses = 0
+
+        # sha256(token) -> (user info or None for inactive tokens, expires_at)
+        self._introspection_cache = OrderedDict()
+        self.introspection_cache_hits = 0
+        self.introspection_negative_hits = 0
+        self.introspection_requests = 0
+        self.introspection_failures = 0
+        self.introspection_short_circuits = 0
+        self._introspection_consecutive_failures = 0
+        self._breaker_open_until = 0
+        self.breaker_opens = 0
+
+        self.token_url = f"{self.keycloak_url}/realms/{self.realm}/protocol/openid-connect/token"
+        self.introspection_url = f"{self.token_url}/introspect"
+
+        # Discovery and JWKS are loaded asynchronously by start() during the app lifespan
+        self.eager = eager
+        self._http = None
+        self._jwks_refresh_loop_task = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """
+        Pooled AsyncClient shared by JWKS, introspection and the /auth token endpoints.
+        Created on first use so it binds to the serving event loop.
+        """
+        if self._http is None:
+            pool_size = self._config.getKeycloakHttpPoolSize()
+            self._http = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                timeout=httpx.Timeout(
+                    self._config.getKeycloakHttpReadTimeout(),
+                    connect=self._config.getKeycloakHttpConnectTimeout(),
+                ),
+                event_hooks=metrics.httpx_event_hooks("auth"),
+            )
+        return self._http
+
+    async def start(self):
+        """
+        Lifespan startup: discover the realm endpoints, load the JWKS and schedule periodic refreshes
+        """
+        if not self.eager:
+            return
+        await self._discover()
+        await self._refresh_jwks()
+        if self._jwks_refresh_loop_task is None:
+            self._jwks_refresh_loop_task = asyncio.ensure_future(self._jwks_refresh_loop())
+
+    async def aclose(self):
+        """
+        Lifespan shutdown: stop the refresh loop and close the shared client
+        """
+        for task in (self._jwks_refresh_loop_task, self._jwks_refresh_task):
+            if task is not None and not task.done():
+                task.cancel()
+        self._jwks_refresh_loop_task = None
+        self._jwks_refresh_task = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _jwks_refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.jwks_ttl_seconds)
+            await self._refresh_jwks()
+
+    async def _discover(self):
         """
-        Load the JWKS URL from Keycloak's well-known endpoint
+        Load the JWKS, token and introspection URLs from Keycloak's well-known endpoint
         """
         try:
-            # Get the JWKS URL from well-known configuration
-            with httpx.Client() as client:
-                response = client.get(self.well_known_url, timeout=5.0)
-                if response.status_code == 200:
-                    config = response.json()
-                    self.jwks_url = config.get('jwks_uri')
-        except Exception as e:
+            response = await self.http.get(self.well_known_url)
+            if response.status_code == 200:
+                discovery = response.json()
+                self.jwks_url = discovery.get('jwks_uri')
+                self.token_url = discovery.get('token_endpoint') or self.token_url
+                self.introspection_url = discovery.get('introspection_endpoint') or self.introspection_url
+            else:
+                logger.warning("Keycloak discovery failed status=%s", response.status_code)
+        except (httpx.HTTPError, ValueError) as e:
             logger.warning("Could not load Keycloak JWKS URL: %s", e)
             logger.warning("Token validation will use introspection endpoint instead")
 
@@ -78,44 +171,208 @@ class KeycloakAuth:
                 return False
         return True
 
-    async def _get_jwks(self):
-        if self.jwks_cache and (time.time() - self.jwks_fetched_at) < self.jwks_ttl_seconds:
-            return self.jwks_cache
+    async def _fetch_jwks(self):
+        self._jwks_last_attempt = time.time()
         if not self.jwks_url:
-            self._load_public_key()
+            await self._discover()
         if not self.jwks_url:
-            return None
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self.jwks_url, timeout=5.0)
-            if response.status_code == 200:
-                self.jwks_cache = response.json()
-                self.jwks_fetched_at = time.time()
-                return self.jwks_cache
-        return None
+            return self._signing_keys
+        try:
+            response = await self.http.get(self.jwks_url)
+            if response.status_code != 200:
+                logger.warning("Keycloak JWKS fetch failed status=%s", response.status_code)
+                return self._signing_keys
+            jwks = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning("Could not fetch Keycloak JWKS: %s", e)
+            return self._signing_keys
+
+        signing_keys = {}
+        for key_data in jwks.get('keys', []):
+            kid = key_data.get('kid')
+            if not kid or key_data.get('use', 'sig') != 'sig':
+                continue
+            alg = key_data.get('alg', 'RS256')
+            try:
+                signing_keys[kid] = (jwk.construct(key_data, alg), alg)
+            except Exception as e:
+                logger.warning("Skipping unusable JWKS key kid=%s: %s", kid, e)
+        self.jwks_cache = jwks
+        self._signing_keys = signing_keys
+        self.jwks_fetched_at = time.time()
+        return signing_keys
+
+    def _start_jwks_refresh(self):
+        if self._jwks_refresh_task is None or self._jwks_refresh_task.done():
+            self._jwks_refresh_task = asyncio.ensure_future(self._fetch_jwks())
+        return self._jwks_refresh_task
+
+    async def _refresh_jwks(self):
+        """
+        Single-flight JWKS refresh: concurrent callers await the same fetch
+        """
+        return await asyncio.shield(self._start_jwks_refresh())
 
     async def _get_signing_key(self, kid: str):
-        jwks = await self._get_jwks()
-        if not jwks or not jwks.get('keys'):
+        now = time.time()
+        can_refresh = (now - self._jwks_last_attempt) >= JWKS_MIN_REFRESH_INTERVAL
+        if not self._signing_keys:
+            if can_refresh or self._jwks_refresh_task is not None and not self._jwks_refresh_task.done():
+                await self._refresh_jwks()
+        elif (now - self.jwks_fetched_at) >= self.jwks_ttl_seconds and can_refresh:
+            # Keep serving the current keys while the refresh runs in the background
+            self._start_jwks_refresh()
+
+        entry = self._signing_keys.get(kid)
+        if entry is None and can_refresh:
+            await self._refresh_jwks()
+            entry = self._signing_keys.get(kid)
+        return entry
+
+    def _get_cached_token(self, digest):
+        entry = self._token_cache.get(digest)
+        if entry is None:
+            self.token_cache_misses += 1
+            metrics.record_cache_lookup("token", misses=1)
             return None
-        for key in jwks['keys']:
-            if key.get('kid') == kid:
-                return key
-        # Refresh JWKS once if key not found
-        self.jwks_cache = None
-        jwks = await self._get_jwks()
-        if not jwks or not jwks.get('keys'):
+        user_info, expires_at = entry
+        if expires_at <= time.time():
+            del self._token_cache[digest]
+            self.token_cache_misses += 1
+            metrics.record_cache_lookup("token", misses=1)
             return None
-        for key in jwks['keys']:
-            if key.get('kid') == kid:
-                return key
-        return None
+        self._token_cache.move_to_end(digest)
+        self.token_cache_hits += 1
+        metrics.record_cache_lookup("token", hits=1)
+        # Callers may mutate the result; never hand out the cached roles lists
+        return copy.deepcopy(user_info)
+
+    def _cache_token(self, digest, user_info, exp):
+        if not exp:
+            return
+        self._token_cache[digest] = (user_info, exp)
+        self._token_cache.move_to_end(digest)
+        while len(self._token_cache) > self.token_cache_size:
+            self._token_cache.popitem(last=False)
+
+    def _get_cached_introspection(self, digest):
+        """
+        Returns (True, user info or None) for a live introspection cache entry, else (False, None)
+        """
+        entry = self._introspection_cache.get(digest)
+        if entry is None:
+            metrics.record_cache_lookup("introspection", misses=1)
+            return False, None
+        user_info, expires_at = entry
+        if expires_at <= time.time():
+            del self._introspection_cache[digest]
+            metrics.record_cache_lookup("introspection", misses=1)
+            return False, None
+        self._introspection_cache.move_to_end(digest)
+        metrics.record_cache_lookup("introspection", hits=1)
+        if user_info is None:
+            self.introspection_negative_hits += 1
+            return True, None
+        self.introspection_cache_hits += 1
+        return True, copy.deepcopy(user_info)
+
+    def _cache_introspection(self, digest, user_info, exp=None):
+        now = time.time()
+        if user_info is None:
+            expires_at = now + INTROSPECTION_NEGATIVE_TTL
+        else:
+            expires_at = now + INTROSPECTION_CACHE_TTL
+            if exp:
+                expires_at = min(expires_at, exp)
+        self._introspection_cache[digest] = (user_info, expires_at)
+        self._introspection_cache.move_to_end(digest)
+        while len(self._introspection_cache) > self.token_cache_size:
+            self._introspection_cache.popitem(last=False)
+
+    def _breaker_allows_request(self) -> bool:
+        if not self._breaker_open_until:
+            return True
+        now = time.time()
+        if now < self._breaker_open_until:
+            return False
+        # Half-open: let this request probe Keycloak while everyone else keeps short-circuiting
+        self._breaker_open_until = now + INTROSPECTION_BREAKER_COOLDOWN
+        return True
+
+    def _record_introspection_success(self):
+        self._introspection_consecutive_failures = 0
+        self._breaker_open_until = 0
+
+    def _record_introspection_failure(self):
+        self.introspection_failures += 1
+        self._introspection_consecutive_failures += 1
+        if self._introspection_consecutive_failures == INTROSPECTION_BREAKER_THRESHOLD:
+            self.breaker_opens += 1
+            logger.warning(
+                "Keycloak introspection failed %s times in a row; skipping it for %ss",
+                self._introspection_consecutive_failures,
+                INTROSPECTION_BREAKER_COOLDOWN,
+            )
+        if self._introspection_consecutive_failures >= INTROSPECTION_BREAKER_THRESHOLD:
+            self._breaker_open_until = time.time() + INTROSPECTION_BREAKER_COOLDOWN
+
+    def stats(self) -> dict:
+        """
+        Token verification counters for ops
+        """
+        if not self._breaker_open_until:
+            breaker_state = "closed"
+        elif time.time() < self._breaker_open_until:
+            breaker_state = "open"
+        else:
+            breaker_state = "half_open"
+        return {
+            "token_cache_size": len(self._token_cache),
+            "token_cache_hits": self.token_cache_hits,
+            "token_cache_misses": self.token_cache_misses,
+            "introspection_cache_size": len(self._introspection_cache),
+            "introspection_cache_hits": self.introspection_cache_hits,
+            "introspection_negative_hits": self.introspection_negative_hits,
+            "introspection_requests": self.introspection_requests,
+            "introspection_failures": self.introspection_failures,
+            "introspection_short_circuits": self.introspection_short_circuits,
+            "breaker_state": breaker_state,
+            "breaker_opens": self.breaker_opens,
+        }
+
+    def _build_user_info(self, claims: dict) -> dict:
+        realm_access = claims.get('realm_access', {})
+        realm_roles = realm_access.get('roles', [])
+
+        # Determine account type from roles (priority: IA > Senior II > II)
+        account_type = None
+        if 'IA' in realm_roles:
+            account_type = 'IA'
+        elif 'Senior II' in realm_roles:
+            account_type = 'Senior II'
+        elif 'II' in realm_roles:
+            account_type = 'II'
+
+        return {
+            'sub': claims.get('sub'),
+            'preferred_username': claims.get('preferred_username'),
+            'email': claims.get('email'),
+            'realm_access': realm_access,
+            'resource_access': claims.get('resource_access', {}),
+            'account_type': account_type,  # Add account type for backward compatibility
+            'roles': realm_roles
+        }
     
     async def verify_token(self, token: str) -> Optional[dict]:
         """
         Verify a JWT token using Keycloak's token introspection endpoint
         """
         try:
-            import time
+            token_digest = hashlib.sha256(token.encode("utf-8")).digest()
+            cached = self._get_cached_token(token_digest)
+            if cached is not None:
+                return cached
+
             # First, try to decode token to check expiration (without verification)
             try:
                 decoded = jwt.get_unverified_claims(token)
@@ -133,9 +390,9 @@ class KeycloakAuth:
             try:
                 header = jwt.get_unverified_header(token)
                 kid = header.get('kid')
-                alg = header.get('alg', 'RS256')
-                key = await self._get_signing_key(kid) if kid else None
-                if key:
+                signing_key = await self._get_signing_key(kid) if kid else None
+                if signing_key:
+                    key, alg = signing_key
                     decoded = jwt.decode(
                         token,
                         key,
@@ -144,88 +401,71 @@ class KeycloakAuth:
                     )
                     if not self._validate_issuer_audience(decoded):
                         return None
-                    realm_access = decoded.get('realm_access', {})
-                    realm_roles = realm_access.get('roles', [])
-                    account_type = None
-                    if 'IA' in realm_roles:
-                        account_type = 'IA'
-                    elif 'Senior II' in realm_roles:
-                        account_type = 'Senior II'
-                    elif 'II' in realm_roles:
-                        account_type = 'II'
-                    return {
-                        'sub': decoded.get('sub'),
-                        'preferred_username': decoded.get('preferred_username'),
-                        'email': decoded.get('email'),
-                        'realm_access': realm_access,
-                        'resource_access': decoded.get('resource_access', {}),
-                        'account_type': account_type,
-                        'roles': realm_roles
-                    }
+                    user_info = self._build_user_info(decoded)
+                    self._cache_token(token_digest, user_info, decoded.get('exp'))
+                    return copy.deepcopy(user_info)
             except JWTError as jwks_error:
                 logger.warning("JWKS validation failed; falling back to introspection: %s", jwks_error)
             except Exception as jwks_error:
                 logger.warning("JWKS validation error; falling back to introspection: %s", jwks_error)
 
-            # Use token introspection endpoint (more reliable than JWKS for validation)
-            introspection_url = f"{self.keycloak_url}/realms/{self.realm}/protocol/openid-connect/token/introspect"
-            
-            async with httpx.AsyncClient() as client:
-                # Use client credentials from config
-                data = {
-                    'token': token,
-                    'client_id': self.client_id,
-                    'client_secret': self.client_secret
-                }
-                
-                response = await client.post(
-                    introspection_url,
-                    data=data,
-                    timeout=5.0
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if result.get('active', False):
-                        if not self._validate_issuer_audience(result):
-                            return None
-                        # Extract roles from token
-                        realm_access = result.get('realm_access', {})
-                        realm_roles = realm_access.get('roles', [])
-                        
-                        # Determine account type from roles (priority: IA > Senior II > II)
-                        account_type = None
-                        if 'IA' in realm_roles:
-                            account_type = 'IA'
-                        elif 'Senior II' in realm_roles:
-                            account_type = 'Senior II'
-                        elif 'II' in realm_roles:
-                            account_type = 'II'
-                        
-                        # Token is valid, return the token info
-                        return {
-                            'sub': result.get('sub'),
-                            'preferred_username': result.get('preferred_username'),
-                            'email': result.get('email'),
-                            'realm_access': realm_access,
-                            'resource_access': result.get('resource_access', {}),
-                            'account_type': account_type,  # Add account type for backward compatibility
-                            'roles': realm_roles
-                        }
-                    else:
-                        logger.info("Token introspection returned active=False")
-                        return None
-                else:
-                    logger.warning(
-                        "Keycloak introspection failed status=%s text=%s",
-                        response.status_code,
-                        response.text,
-                    )
-                    logger.debug("Introspection URL: %s", introspection_url)
-                    logger.debug("Client ID: %s", self.client_id)
-                    return None
-                    
+            return await self._introspect(token, token_digest)
+
         except Exception as e:
             logger.exception("Error verifying token: %s", e)
             return None
-    
+
+    async def _introspect(self, token: str, token_digest: bytes) -> Optional[dict]:
+        """
+        Validate a token with Keycloak's introspection endpoint, caching the result by token digest
+        """
+        found, cached = self._get_cached_introspection(token_digest)
+        if found:
+            return cached
+
+        if not self._breaker_allows_request():
+            self.introspection_short_circuits += 1
+            logger.debug("Introspection circuit open; rejecting token without calling Keycloak")
+            return None
+
+        # Use client credentials from config
+        data = {
+            'token': token,
+            'client_id': self.client_id,
+            'client_secret': self.client_secret
+        }
+        self.introspection_requests += 1
+        try:
+            response = await self.http.post(self.introspection_url, data=data)
+        except httpx.HTTPError as e:
+            self._record_introspection_failure()
+            logger.warning("Keycloak introspection request failed: %s", e)
+            return None
+
+        if response.status_code >= 500:
+            self._record_introspection_failure()
+        else:
+            self._record_introspection_success()
+
+        if response.status_code != 200:
+            logger.warning(
+                "Keycloak introspection failed status=%s text=%s",
+                response.status_code,
+                response.text,
+            )
+            logger.debug("Introspection URL: %s", self.introspection_url)
+            logger.debug("Client ID: %s", self.client_id)
+            return None
+
+        result = response.json()
+        if not result.get('active', False):
+            logger.info("Token introspection returned active=False")
+            self._cache_introspection(token_digest, None)
+            return None
+        if not self._validate_issuer_audience(result):
+            self._cache_introspection(token_digest, None)
+            return None
+        # Token is valid, return the token info
+        user_info = self._build_user_info(result)
+        self._cache_introspection(token_digest, user_info, result.get('exp'))
+        return copy.deepcopy(user_info)
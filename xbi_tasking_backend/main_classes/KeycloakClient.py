@@ -1,11 +1,22 @@
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 import requests
 
 from config import get_config
+from main_classes.KeycloakSession import KeycloakSession
+import tracing
+from tracing import traced_class
 
+USER_PAGE_SIZE = 500
+ROLE_PAGE_SIZE = 100
+ROLE_PAGE_WORKERS = 4
+
+
+@traced_class
 class KeycloakClient:
-    def __init__(self, config=None):
+    def __init__(self, config=None, http=None):
         self.config = config or get_config()
+        self.http = http or KeycloakSession.from_config(self.config)
 
     def _base(self):
         keycloak_url = self.config.getKeycloakURL()
@@ -27,7 +38,7 @@ class KeycloakClient:
             "client_id": admin_client_id,
             "client_secret": admin_client_secret,
         }
-        response = requests.post(url, data=data, timeout=5)
+        response = self.http.post(url, data=data)
         try:
             response.raise_for_status()
         except requests.exceptions.HTTPError as e:
@@ -43,7 +54,7 @@ class KeycloakClient:
         keycloak_url, realm = self._base()
         url = f"{keycloak_url}/admin/realms/{realm}/users/{keycloak_user_id}"
         headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(url, headers=headers, timeout=5)
+        response = self.http.get(url, headers=headers)
         response.raise_for_status()
         return response.json()
 
@@ -52,34 +63,81 @@ class KeycloakClient:
         url = f"{keycloak_url}/admin/realms/{realm}/users"
         headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
         params = {"username": username, "exact": "true"}
-        response = requests.get(url, headers=headers, params=params, timeout=5)
+        response = self.http.get(url, headers=headers, params=params)
         response.raise_for_status()
         users = response.json()
         if not users:
             return None
         return users[0]["id"]
 
+    def iter_users(self, token, page_size=USER_PAGE_SIZE):
+        keycloak_url, realm = self._base()
+        url = f"{keycloak_url}/admin/realms/{realm}/users"
+        headers = {"Authorization": f"Bearer {token}"}
+        first = 0
+        while True:
+            params = {"first": first, "max": page_size, "briefRepresentation": "true"}
+            response = self.http.get(url, headers=headers, params=params)
+            response.raise_for_status()
+            users = response.json()
+            yield from users
+            if len(users) < page_size:
+                return
+            first += page_size
+
     def get_role(self, token, role_name):
         keycloak_url, realm = self._base()
         url = f"{keycloak_url}/admin/realms/{realm}/roles/{role_name}"
         headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(url, headers=headers, timeout=5)
+        response = self.http.get(url, headers=headers)
         response.raise_for_status()
         return response.json()
 
-    def get_users_for_role(self, token, role_name):
+    def _get_role_users_page(self, url, headers, first, page_size):
+        params = {"first": first, "max": page_size, "briefRepresentation": "true"}
+        response = self.http.get(url, headers=headers, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def iter_users_for_role(self, token, role_name, page_size=ROLE_PAGE_SIZE, max_workers=ROLE_PAGE_WORKERS):
+        '''
+        Yields every member of a realm role. The first page is fetched alone; if it is full,
+        the following pages are fetched max_workers at a time until a short page is returned.
+        '''
         keycloak_url, realm = self._base()
         url = f"{keycloak_url}/admin/realms/{realm}/roles/{role_name}/users"
         headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(url, headers=headers, timeout=5)
-        response.raise_for_status()
-        return response.json()
+
+        page = self._get_role_users_page(url, headers, 0, page_size)
+        yield from page
+        if len(page) < page_size:
+            return
+
+        first = page_size
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                offsets = [first + i * page_size for i in range(max_workers)]
+                pages = executor.map(
+                    tracing.bind(lambda offset: self._get_role_users_page(url, headers, offset, page_size)),
+                    offsets,
+                )
+                for page in pages:
+                    yield from page
+                    if len(page) < page_size:
+                        return
+                first += page_size * max_workers
+
+    def get_users_for_role(self, token, role_name):
+        return list(self.iter_users_for_role(token, role_name))
+
+    def get_http_stats(self):
+        return self.http.stats()
 
     def assign_realm_role(self, token, user_id, role_representation):
         keycloak_url, realm = self._base()
         url = f"{keycloak_url}/admin/realms/{realm}/users/{user_id}/role-mappings/realm"
         headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-        response = requests.post(url, headers=headers, json=[role_representation], timeout=5)
+        response = self.http.post(url, headers=headers, json=[role_representation])
         response.raise_for_status()
 
     def create_user(self, token, username, password):
@@ -93,7 +151,7 @@ class KeycloakClient:
                 {"type": "password", "value": password, "temporary": False},
             ],
         }
-        response = requests.post(url, headers=headers, json=payload, timeout=5)
+        response = self.http.post(url, headers=headers, json=payload)
         response.raise_for_status()
         location = response.headers.get("Location")
         if not location:
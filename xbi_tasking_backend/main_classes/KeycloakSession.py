@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+import tracing
+
+logger = logging.getLogger("xbi_tasking_backend.keycloak_session")
+
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+
+class KeycloakSession:
+    '''
+    Pooled keep-alive HTTP session shared by every Keycloak admin call.
+    Idempotent requests are retried with jittered exponential backoff on 5xx responses and
+    connection errors; non-idempotent requests (POST) are only retried when the connection
+    could not be established, so a request is never sent twice.
+    '''
+    def __init__(self, pool_size=20, connect_timeout=3.0, read_timeout=5.0, retries=3, backoff_factor=0.2, backoff_jitter=0.2):
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            backoff_jitter=backoff_jitter,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False,
+        )
+        self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        self._session = requests.Session()
+        # The admin API is stateless; never let a cookie leak between threads
+        self._session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self._session.mount("http://", self._adapter)
+        self._session.mount("https://", self._adapter)
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._retries = 0
+        self._errors = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            pool_size=config.getKeycloakHttpPoolSize(),
+            connect_timeout=config.getKeycloakHttpConnectTimeout(),
+            read_timeout=config.getKeycloakHttpReadTimeout(),
+            retries=config.getKeycloakHttpRetries(),
+            backoff_factor=config.getKeycloakHttpRetryBackoff(),
+        )
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        path = urlparse(url).path
+        started_at = time.perf_counter()
+        with tracing.span("keycloak.http", method=method, endpoint=metrics.keycloak_endpoint(path)) as http_span:
+            try:
+                response = self._session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException:
+                metrics.record_keycloak_call("admin", path, "error", time.perf_counter() - started_at)
+                with self._lock:
+                    self._requests += 1
+                    self._errors += 1
+                raise
+            if http_span is not None:
+                http_span.set_attribute("status", response.status_code)
+        metrics.record_keycloak_call("admin", path, response.status_code, time.perf_counter() - started_at)
+        retry_state = getattr(response.raw, "retries", None)
+        retried = len(retry_state.history) if retry_state is not None else 0
+        if retried:
+            logger.debug("%s %s succeeded after %s retries", method, url, retried)
+        with self._lock:
+            self._requests += 1
+            self._retries += retried
+        return response
+
+    def stats(self):
+        '''
+        Function:   Reports request and connection reuse counters for the session
+        Output:     dict with requests, retries, errors, new_connections and reused_connections
+        '''
+        new_connections = 0
+        pool_requests = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            new_connections += pool.num_connections
+            pool_requests += pool.num_requests
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "retries": self._retries,
+                "errors": self._errors,
+                "new_connections": new_connections,
+                "reused_connections": max(pool_requests - new_connections, 0),
+            }
+
+    def close(self):
+        self._session.close()
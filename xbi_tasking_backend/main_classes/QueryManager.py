@@ -4,9 +4,13 @@ from main_classes.query_tasking import TaskingQueries
 from main_classes.query_images import ImageQueries
 from main_classes.query_lookup import LookupQueries
 from main_classes.query_reports import ReportQueries
+from main_classes.query_archive import ArchiveQueries
+from main_classes.query_jobs import INGEST_JOB_STALE_SECONDS, JobQueries
 from services.keycloak_service import KeycloakService
+from tracing import traced_class
 
 
+@traced_class
 class QueryManager():
     '''
     QueryManager handles all the queries to the backend
@@ -20,6 +24,15 @@ class QueryManager():
         self._images = ImageQueries(self.db, self._keycloak)
         self._lookup = LookupQueries(self.db)
         self._reports = ReportQueries(self.db)
+        self._archive = ArchiveQueries(self.db)
+        self._jobs = JobQueries(self.db)
+        self._keycloak_service = keycloak_service
+
+    def close(self):
+        '''
+        Function: Releases the Keycloak async bridge and its connections; call once at shutdown
+        '''
+        self._keycloak_service.close()
 
     def _get_keycloak_username(self, keycloak_user_id):
         return self._keycloak.get_keycloak_username(keycloak_user_id)
@@ -52,8 +65,8 @@ class QueryManager():
     def insertSensor(self, sensor_name):
         return self._images.insertSensor(sensor_name)
     
-    def insertImage(self, image_id, image_file_name, sensor_name, upload_date, image_datetime):
-        return self._images.insertImage(image_id, image_file_name, sensor_name, upload_date, image_datetime)
+    def insertImage(self, image_id, image_file_name, sensor_name, upload_date, image_datetime, ingest_job_id=None):
+        return self._images.insertImage(image_id, image_file_name, sensor_name, upload_date, image_datetime, ingest_job_id)
     
     def insertArea(self, area_name):
         return self._images.insertArea(area_name)
@@ -130,6 +143,9 @@ class QueryManager():
     def getTaskingSummaryImageDataForUser(self, start_date, end_date, assignee_keycloak_id):
         return self._tasking.getTaskingSummaryImageDataForUser(start_date, end_date, assignee_keycloak_id)
 
+    def streamTaskingSummaryImageData(self, start_date, end_date, assignee_keycloak_id=None):
+        return self._tasking.streamTaskingSummaryImageData(start_date, end_date, assignee_keycloak_id)
+
     def getTaskingSummaryAreaData(self, image_id):
         return self._tasking.getTaskingSummaryAreaData(image_id)
 
@@ -160,17 +176,71 @@ class QueryManager():
     def getImageAreaData(self, scvu_image_id):
         return self._images.getImageAreaData(scvu_image_id)
 
-    def getImageAreaDataForImages(self, scvu_image_ids):
-        return self._images.getImageAreaDataForImages(scvu_image_ids)
+    def getImageAreaDataForImages(self, scvu_image_ids, include_archive=False):
+        return self._images.getImageAreaDataForImages(scvu_image_ids, include_archive)
+
+    def getImageData(self, start_date, end_date, include_archive=False):
+        return self._images.getImageData(start_date, end_date, include_archive)
+
+    def getImageDataForUser(self, start_date, end_date, assignee_keycloak_id, include_archive=False):
+        return self._images.getImageDataForUser(start_date, end_date, assignee_keycloak_id, include_archive)
+
+    def streamImageData(self, start_date, end_date, assignee_keycloak_id=None, include_archive=False):
+        return self._images.streamImageData(start_date, end_date, assignee_keycloak_id, include_archive)
+
+    def archiveCompletedImages(self, cutoff, batch_size):
+        return self._archive.archiveCompletedImages(cutoff, batch_size)
+
+    def reachesArchive(self, start_date):
+        return self._archive.reachesArchive(start_date)
+
+    def createIngestJob(self, job_id, source, file_name, created_by, total_images, content_hash=None):
+        return self._jobs.createIngestJob(job_id, source, file_name, created_by, total_images, content_hash)
+
+    def findIngestJobByHash(self, content_hash):
+        return self._jobs.findIngestJobByHash(content_hash)
+
+    def recordDuplicateIngestJob(self, job_id, source, file_name, created_by, duplicate_of):
+        return self._jobs.recordDuplicateIngestJob(job_id, source, file_name, created_by, duplicate_of)
 
-    def getImageData(self, start_date, end_date):
-        return self._images.getImageData(start_date, end_date)
+    def getExistingImageIds(self, image_ids):
+        return self._images.getExistingImageIds(image_ids)
 
-    def getImageDataForUser(self, start_date, end_date, assignee_keycloak_id):
-        return self._images.getImageDataForUser(start_date, end_date, assignee_keycloak_id)
+    def ensureImagePartition(self, month, lock_timeout_ms=5000):
+        return self._images.ensureImagePartition(month, lock_timeout_ms)
 
-    def getXBIReportImage(self, start_date, end_date):
-        return self._reports.getXBIReportImage(start_date, end_date)
+    def getDefaultPartitionMonths(self):
+        return self._images.getDefaultPartitionMonths()
+
+    def startIngestJob(self, job_id):
+        return self._jobs.startIngestJob(job_id)
+
+    def updateIngestJobProgress(self, job_id, processed, inserted, existing, errors, areas):
+        return self._jobs.updateIngestJobProgress(job_id, processed, inserted, existing, errors, areas)
+
+    def finishIngestJob(self, job_id, status, message, total_images=None):
+        return self._jobs.finishIngestJob(job_id, status, message, total_images)
+
+    def touchIngestJobs(self, job_ids):
+        return self._jobs.touchIngestJobs(job_ids)
+
+    def failStaleIngestJobs(self, source, message, stale_seconds=INGEST_JOB_STALE_SECONDS):
+        return self._jobs.failStaleIngestJobs(source, message, stale_seconds)
+
+    def getIngestJob(self, job_id):
+        return self._jobs.getIngestJob(job_id)
+
+    def getIngestJobClock(self):
+        return self._jobs.getIngestJobClock()
+
+    def getFinishedIngestJobs(self, source, finished_after):
+        return self._jobs.getFinishedIngestJobs(source, finished_after)
+
+    def getXBIReportCounts(self, start_date, end_date):
+        return self._reports.getXBIReportCounts(start_date, end_date)
+
+    def rebuildReportDailyRollup(self):
+        return self._reports.rebuildReportDailyRollup()
 
     def getSensors(self):
         return self._lookup.getSensors()
@@ -181,11 +251,8 @@ class QueryManager():
     def getAreas(self):
         return self._lookup.getAreas()
     
-    def setOpsvFalse(self):
-        return self._lookup.setOpsvFalse()
-
-    def setOpsvAreas(self, area_list):
-        return self._lookup.setOpsvAreas(area_list)
+    def syncOpsvAreas(self, area_names):
+        return self._lookup.syncOpsvAreas(area_names)
 
     def resetRecentUsers(self):
         return self._keycloak.resetRecentUsers()
@@ -198,6 +265,9 @@ class QueryManager():
     def updateExistingUsers(self, user_list):
         return self._keycloak.updateExistingUsers(user_list)
 
+    def applyParadeState(self, user_list, present_list):
+        return self._keycloak.applyParadeState(user_list, present_list)
+
     def updateSensorCategory(self, category_sensor_list):
         return self._lookup.updateSensorCategory(category_sensor_list)
     
@@ -0,0 +1,360 @@
+import os
+
+from main_classes.partitions import IMAGE_DEFAULT_PARTITION, create_image_partition, months_between
+from main_classes.query_reports import rebuild_daily_rollup
+
+IMAGE_COLUMNS = "scvu_image_id, image_id, image_file_name, sensor_id, upload_date, image_datetime, completed_date, \
+priority_id, report_id, image_category_id, image_quality, cloud_cover_id, ew_status_id, target_tracing, vetter_keycloak_id"
+
+
+def insert_lookup_data(cursor):
+    '''
+    Function: Inserts the fixed lookup rows; rows that already exist are left alone
+    Input: cursor
+    '''
+    cursor.execute("INSERT INTO cloud_cover(id, name) VALUES (0, null) ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO cloud_cover(id, name) VALUES (1, 'UTC') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO cloud_cover(id, name) VALUES (2, '0C') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO cloud_cover(id, name) VALUES (3, '10-90C') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO cloud_cover(id, name) VALUES (4, '100C') ON CONFLICT DO NOTHING")
+
+    cursor.execute("INSERT INTO ew_status(id, name) VALUES (1, 'ttg done') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO ew_status(id, name) VALUES (2, 'xbi done') ON CONFLICT DO NOTHING")
+
+    cursor.execute("INSERT INTO image_category(id, name) VALUES (0, null) ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO image_category(id, name) VALUES (1, 'Detection') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO image_category(id, name) VALUES (2, 'Classification') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO image_category(id, name) VALUES (3, 'Identification') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO image_category(id, name) VALUES (4, 'Recognition') ON CONFLICT DO NOTHING")
+
+    cursor.execute("INSERT INTO priority(id, name) VALUES (0, null) ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO priority(id, name) VALUES (1, 'Low') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO priority(id, name) VALUES (2, 'Medium') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO priority(id, name) VALUES (3, 'High') ON CONFLICT DO NOTHING")
+
+    cursor.execute("INSERT INTO report(id, name) VALUES (0, null) ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO report(id, name) VALUES (1, 'DS(OF)') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO report(id, name) VALUES (2, 'DS(SF)') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO report(id, name) VALUES (3, 'I-IIRS 0') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO report(id, name) VALUES (4, 'IIR') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO report(id, name) VALUES (5, 'Re-DL') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO report(id, name) VALUES (6, 'Research') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO report(id, name) VALUES (7, 'TOS') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO report(id, name) VALUES (8, 'No Findings') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO report(id, name) VALUES (9, 'Downgrade') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO report(id, name) VALUES (10, 'Failed') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO report(id, name) VALUES (11, 'Img Error') ON CONFLICT DO NOTHING")
+
+    cursor.execute("INSERT INTO task_status(id, name) VALUES (1, 'Incomplete') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO task_status(id, name) VALUES (2, 'In Progress') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO task_status(id, name) VALUES (3, 'Verifying') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO task_status(id, name) VALUES (4, 'Completed') ON CONFLICT DO NOTHING")
+
+    cursor.execute("INSERT INTO sensor_category(id, name) VALUES (1, 'UNCATEGORISED') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO sensor_category(id, name) VALUES (2, 'UAV') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO sensor_category(id, name) VALUES (3, 'AB') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO sensor_category(id, name) VALUES (4, 'HB') ON CONFLICT DO NOTHING")
+    cursor.execute("INSERT INTO sensor_category(id, name) VALUES (5, 'AVIS') ON CONFLICT DO NOTHING")
+
+    cursor.execute("INSERT INTO area(scvu_area_id, area_name, v10) VALUES (0, 'OTHERS', false) ON CONFLICT DO NOTHING")
+
+    allow_legacy_accounts = os.getenv("ALLOW_LEGACY_ACCOUNTS", "").lower() == "true"
+    if allow_legacy_accounts:
+        cursor.execute("INSERT INTO accounts(account, password) VALUES ('II', '6b86b273ff34fce19d6b804eff5a3f5747ada4eaa22f1d49c01e52ddb7875b4b') ON CONFLICT DO NOTHING")
+        cursor.execute("INSERT INTO accounts(account, password) VALUES ('Senior II', 'd4735e3a265e16eee03f59718b9b5d03019c07d8b6c51f90da3a666eec13ab35') ON CONFLICT DO NOTHING")
+        cursor.execute("INSERT INTO accounts(account, password) VALUES ('IA', '4e07408562bedb8b60ce05c1decfe3ad16b72230967de01f640b7e4729b49fce') ON CONFLICT DO NOTHING")
+
+
+def _baseline(cursor):
+    # The schema as it stood before versioned migrations. Every statement is idempotent, so this also
+    # brings databases created by earlier releases (including pre-Keycloak ones) up to the same point.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sensor_category (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(255) UNIQUE NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sensor (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(255) UNIQUE NOT NULL,
+            category_id INTEGER REFERENCES sensor_category(id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS priority (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(255)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cloud_cover (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(255)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS image_category (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(255)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS report (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(255)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ew_status (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(255) UNIQUE NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_cache (
+            keycloak_user_id VARCHAR(255) PRIMARY KEY,
+            is_present BOOLEAN DEFAULT FALSE,
+            last_updated TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS area (
+            scvu_area_id SERIAL PRIMARY KEY,
+            area_name VARCHAR(255) UNIQUE NOT NULL,
+            v10 BOOLEAN DEFAULT FALSE,
+            opsv BOOLEAN DEFAULT FALSE
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS image (
+            scvu_image_id SERIAL PRIMARY KEY,
+            image_id BIGINT UNIQUE,
+            image_file_name VARCHAR(255),
+            sensor_id INTEGER REFERENCES sensor(id),
+            upload_date TIMESTAMP,
+            image_datetime TIMESTAMP,
+            completed_date TIMESTAMP,
+            priority_id INTEGER REFERENCES priority(id),
+            report_id INTEGER REFERENCES report(id),
+            image_category_id INTEGER REFERENCES image_category(id),
+            image_quality VARCHAR(255),
+            cloud_cover_id INTEGER REFERENCES cloud_cover(id),
+            ew_status_id INTEGER REFERENCES ew_status(id),
+            target_tracing BOOLEAN,
+            vetter_keycloak_id VARCHAR(255)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS image_area (
+            scvu_image_area_id SERIAL PRIMARY KEY,
+            scvu_image_id INTEGER REFERENCES image(scvu_image_id),
+            scvu_area_id INTEGER REFERENCES area(scvu_area_id),
+            UNIQUE(scvu_image_id, scvu_area_id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS task_status (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(255) UNIQUE NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS task (
+            scvu_task_id SERIAL PRIMARY KEY,
+            scvu_image_area_id INTEGER UNIQUE REFERENCES image_area(scvu_image_area_id),
+            assignee_keycloak_id VARCHAR(255),
+            task_status_id INTEGER REFERENCES task_status(id),
+            remarks TEXT
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS accounts (
+            account VARCHAR(255) PRIMARY KEY,
+            password VARCHAR(255) NOT NULL
+        )
+    """)
+
+    cursor.execute("ALTER TABLE user_cache ADD COLUMN IF NOT EXISTS last_updated TIMESTAMP")
+    cursor.execute("ALTER TABLE image ADD COLUMN IF NOT EXISTS vetter_keycloak_id VARCHAR(255)")
+    cursor.execute("ALTER TABLE task ADD COLUMN IF NOT EXISTS assignee_keycloak_id VARCHAR(255)")
+    cursor.execute("ALTER TABLE task DROP COLUMN IF EXISTS assignee_id")
+    cursor.execute("ALTER TABLE image DROP COLUMN IF EXISTS vetter_id")
+    cursor.execute("DROP TABLE IF EXISTS users")
+
+    insert_lookup_data(cursor)
+
+
+def _report_daily_rollup(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS report_daily_rollup (
+            day DATE NOT NULL,
+            sensor_category_id INTEGER NOT NULL REFERENCES sensor_category(id),
+            report_id INTEGER NOT NULL REFERENCES report(id),
+            image_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, sensor_category_id, report_id)
+        )
+    """)
+    # The archive tables do not exist yet at this version
+    for statement in rebuild_daily_rollup("image"):
+        cursor.execute(statement)
+
+
+def _partition_image_by_month(cursor):
+    # image becomes range partitioned on upload_date, one partition per month, so date-window queries
+    # only scan the months they cover. A partitioned table cannot enforce uniqueness without the
+    # partition key, so:
+    #   - the primary key becomes (scvu_image_id, upload_date),
+    #   - image_id uniqueness moves to image_key, claimed in the same statement as the insert,
+    #   - image_area carries its image's upload_date and references image by both columns.
+    cursor.execute("SELECT pg_get_serial_sequence('image', 'scvu_image_id')")
+    sequence = cursor.fetchone()[0]
+    cursor.execute("ALTER TABLE image_area DROP CONSTRAINT IF EXISTS image_area_scvu_image_id_fkey")
+    cursor.execute("ALTER TABLE image RENAME TO image_unpartitioned")
+    cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+    cursor.execute(f"""
+        CREATE TABLE image (
+            scvu_image_id INTEGER NOT NULL DEFAULT nextval('{sequence}'),
+            image_id BIGINT,
+            image_file_name VARCHAR(255),
+            sensor_id INTEGER REFERENCES sensor(id),
+            upload_date TIMESTAMP NOT NULL,
+            image_datetime TIMESTAMP,
+            completed_date TIMESTAMP,
+            priority_id INTEGER REFERENCES priority(id),
+            report_id INTEGER REFERENCES report(id),
+            image_category_id INTEGER REFERENCES image_category(id),
+            image_quality VARCHAR(255),
+            cloud_cover_id INTEGER REFERENCES cloud_cover(id),
+            ew_status_id INTEGER REFERENCES ew_status(id),
+            target_tracing BOOLEAN,
+            vetter_keycloak_id VARCHAR(255),
+            PRIMARY KEY (scvu_image_id, upload_date)
+        ) PARTITION BY RANGE (upload_date)
+    """)
+    cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY image.scvu_image_id")
+    cursor.execute(f"CREATE TABLE {IMAGE_DEFAULT_PARTITION} PARTITION OF image DEFAULT")
+    cursor.execute("CREATE INDEX image_image_id_idx ON image (image_id)")
+
+    cursor.execute("SELECT MIN(upload_date), MAX(upload_date) FROM image_unpartitioned")
+    first, last = cursor.fetchone()
+    if first is not None:
+        for month in months_between(first, last):
+            create_image_partition(cursor, month)
+    # upload_date is now part of the key; the rare image without one is filed under its image time
+    source_columns = IMAGE_COLUMNS.replace("upload_date", "COALESCE(upload_date, image_datetime, TIMESTAMP '1970-01-01')")
+    cursor.execute(f"INSERT INTO image ({IMAGE_COLUMNS}) SELECT {source_columns} FROM image_unpartitioned")
+
+    cursor.execute("CREATE TABLE image_key (image_id BIGINT PRIMARY KEY)")
+    cursor.execute("INSERT INTO image_key (image_id) SELECT DISTINCT image_id FROM image WHERE image_id IS NOT NULL")
+
+    cursor.execute("ALTER TABLE image_area ADD COLUMN IF NOT EXISTS upload_date TIMESTAMP")
+    cursor.execute("UPDATE image_area SET upload_date = image.upload_date FROM image WHERE image.scvu_image_id = image_area.scvu_image_id")
+    # Inserts that only name the image get its upload_date filled in, so the foreign key is always checked
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION image_area_fill_upload_date() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.upload_date IS NULL THEN
+                SELECT upload_date INTO NEW.upload_date FROM image WHERE scvu_image_id = NEW.scvu_image_id;
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    cursor.execute("CREATE TRIGGER image_area_upload_date BEFORE INSERT ON image_area FOR EACH ROW EXECUTE FUNCTION image_area_fill_upload_date()")
+    cursor.execute("DELETE FROM image_area WHERE upload_date IS NULL")
+    cursor.execute("ALTER TABLE image_area ALTER COLUMN upload_date SET NOT NULL")
+    cursor.execute("ALTER TABLE image_area ADD FOREIGN KEY (scvu_image_id, upload_date) REFERENCES image (scvu_image_id, upload_date) ON UPDATE CASCADE")
+    cursor.execute("DROP TABLE image_unpartitioned")
+    cursor.execute("ANALYZE image")
+
+
+def _image_archive(cursor):
+    # Completed images past the retention window are moved here with their image areas and tasks
+    # (see query_archive). The archive tables mirror the live ones so the two can be read together.
+    cursor.execute("CREATE TABLE image_archive (LIKE image, PRIMARY KEY (scvu_image_id))")
+    cursor.execute("CREATE INDEX image_archive_completed_date_idx ON image_archive (completed_date)")
+    cursor.execute("CREATE INDEX image_archive_upload_date_idx ON image_archive (upload_date)")
+    cursor.execute("CREATE TABLE image_area_archive (LIKE image_area, PRIMARY KEY (scvu_image_area_id))")
+    cursor.execute("CREATE INDEX image_area_archive_scvu_image_id_idx ON image_area_archive (scvu_image_id)")
+    cursor.execute("CREATE TABLE task_archive (LIKE task, PRIMARY KEY (scvu_task_id))")
+    cursor.execute("CREATE INDEX task_archive_scvu_image_area_id_idx ON task_archive (scvu_image_area_id)")
+    # archived_before bounds every archived row, so windows starting after it skip the archive
+    cursor.execute("""
+        CREATE TABLE archive_state (
+            name VARCHAR(64) PRIMARY KEY,
+            archived_before TIMESTAMP NOT NULL
+        )
+    """)
+
+
+def _ingest_job(cursor):
+    # Progress of uploads ingested in the background (see services.ingest_service)
+    cursor.execute("""
+        CREATE TABLE ingest_job (
+            job_id VARCHAR(32) PRIMARY KEY,
+            source VARCHAR(32) NOT NULL,
+            file_name VARCHAR(255),
+            created_by VARCHAR(255),
+            status VARCHAR(16) NOT NULL,
+            total_images INTEGER NOT NULL DEFAULT 0,
+            images_processed INTEGER NOT NULL DEFAULT 0,
+            images_inserted INTEGER NOT NULL DEFAULT 0,
+            images_existing INTEGER NOT NULL DEFAULT 0,
+            areas_inserted INTEGER NOT NULL DEFAULT 0,
+            error_count INTEGER NOT NULL DEFAULT 0,
+            message TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT now(),
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
+
+
+def _ingest_job_content_hash(cursor):
+    # sha256 of the uploaded file, so that re-uploading a file that was already ingested is skipped
+    cursor.execute("ALTER TABLE ingest_job ADD COLUMN content_hash CHAR(64)")
+    cursor.execute("CREATE INDEX ingest_job_content_hash_idx ON ingest_job (content_hash) WHERE content_hash IS NOT NULL")
+
+
+def _ingest_job_finished_index(cursor):
+    # The web app polls for jobs the ingest worker has finished, to notify users of them
+    cursor.execute("CREATE INDEX ingest_job_finished_idx ON ingest_job (source, finished_at) WHERE finished_at IS NOT NULL")
+
+
+def _ingest_job_heartbeat(cursor):
+    # Refreshed by the process running a job, so jobs left behind by a stopped process can be told apart
+    cursor.execute("ALTER TABLE ingest_job ADD COLUMN heartbeat_at TIMESTAMP NOT NULL DEFAULT now()")
+
+
+def _image_key_ingest_job(cursor):
+    # The upload that inserted each image, so deleting the image only forgets that upload's fingerprint
+    cursor.execute("ALTER TABLE image_key ADD COLUMN ingest_job_id VARCHAR(32)")
+
+
+# Ordered (version, description, apply) steps. Append new steps with the next version; never edit or
+# renumber a step that has shipped, since databases record the versions they have applied.
+MIGRATIONS = [
+    (1, "baseline schema and lookup data", _baseline),
+    (2, "report_daily_rollup", _report_daily_rollup),
+    (3, "partition image by upload month", _partition_image_by_month),
+    (4, "image archive tables", _image_archive),
+    (5, "ingest jobs", _ingest_job),
+    (6, "ingest job content hash", _ingest_job_content_hash),
+    (7, "ingest job finished index", _ingest_job_finished_index),
+    (8, "ingest job heartbeat", _ingest_job_heartbeat),
+    (9, "image key ingest job", _image_key_ingest_job),
+]
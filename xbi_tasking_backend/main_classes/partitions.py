@@ -0,0 +1,81 @@
+import datetime
+
+
+# Rows whose upload month has no partition yet (or a NULL upload_date) land here
+IMAGE_DEFAULT_PARTITION = "image_default"
+
+
+def month_start(value):
+    '''
+    Function: First day of the month a date or datetime falls in
+    Input: date or datetime
+    Output: date
+    '''
+    return datetime.date(value.year, value.month, 1)
+
+
+def next_month(month):
+    return datetime.date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def months_between(first, last):
+    '''
+    Function: Lists the months from first to last inclusive
+    Input: dates or datetimes
+    Output: list of month start dates
+    '''
+    month, months = month_start(first), []
+    while month <= month_start(last):
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def image_partition_name(month):
+    return f"image_p{month.year:04d}_{month.month:02d}"
+
+
+def create_image_partition(cursor, month):
+    '''
+    Function: Creates the monthly partition of image holding upload dates in month, if it does not exist
+    Input: cursor, month start date
+    '''
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {image_partition_name(month)} PARTITION OF image FOR VALUES FROM (%s) TO (%s)",
+        (month.isoformat(), next_month(month).isoformat()),
+    )
+
+
+def attach_image_partition(cursor, month):
+    '''
+    Function: Creates and attaches the monthly partition of image for month, moving in any rows the default partition holds for it
+    Input: cursor in a transaction, month start date
+    Output: number of rows moved out of the default partition, or None if the partition already exists
+    Note: ATTACH only takes SHARE UPDATE EXCLUSIVE on image, so reads and inserts carry on while it runs
+    '''
+    name = image_partition_name(month)
+    bounds = (month.isoformat(), next_month(month).isoformat())
+    cursor.execute("SELECT to_regclass(%s)", (name, ))
+    if cursor.fetchone()[0] is not None:
+        return None
+    cursor.execute(f"CREATE TABLE {name} (LIKE image INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cursor.execute(f"SELECT COUNT(*) FROM {IMAGE_DEFAULT_PARTITION} WHERE upload_date >= %s AND upload_date < %s", bounds)
+    stranded = cursor.fetchone()[0]
+    foreign_keys = []
+    if stranded:
+        # image_area references image by (scvu_image_id, upload_date); its key checks would fail while the
+        # rows are between the default partition and the unattached one, so the key is re-added afterwards
+        cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint \
+            WHERE conrelid = 'image_area'::regclass AND confrelid = 'image'::regclass AND contype = 'f'")
+        foreign_keys = cursor.fetchall()
+        for constraint, _ in foreign_keys:
+            cursor.execute(f"ALTER TABLE image_area DROP CONSTRAINT {constraint}")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {IMAGE_DEFAULT_PARTITION} WHERE upload_date >= %s AND upload_date < %s RETURNING *) \
+            INSERT INTO {name} SELECT * FROM moved",
+            bounds,
+        )
+    cursor.execute(f"ALTER TABLE image ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", bounds)
+    for constraint, definition in foreign_keys:
+        cursor.execute(f"ALTER TABLE image_area ADD CONSTRAINT {constraint} {definition}")
+    return stranded
@@ -0,0 +1,60 @@
+from tracing import traced_class
+
+
+# Tables the completed image queries read from. Windows that reach the archive read the live and
+# archived rows as one table; the archive tables mirror the live ones column for column.
+LIVE_SOURCES = {"image": "image", "image_area": "image_area", "task": "task"}
+ARCHIVE_SOURCES = {
+    "image": "(SELECT * FROM image UNION ALL SELECT * FROM image_archive)",
+    "image_area": "(SELECT * FROM image_area UNION ALL SELECT * FROM image_area_archive)",
+    "task": "(SELECT * FROM task UNION ALL SELECT * FROM task_archive)",
+}
+
+# Moves one batch of completed images, with their image areas and tasks, into the archive tables.
+# Every archived image was uploaded and completed before the cutoff, which is recorded as the
+# archive boundary in the same transaction.
+ARCHIVE_COMPLETED_IMAGES = "WITH batch AS ( \
+    SELECT scvu_image_id, upload_date FROM image \
+    WHERE upload_date < %s AND completed_date < %s \
+    LIMIT %s FOR UPDATE SKIP LOCKED), \
+moved_areas AS (DELETE FROM image_area WHERE scvu_image_id IN (SELECT scvu_image_id FROM batch) RETURNING *), \
+moved_tasks AS (DELETE FROM task WHERE scvu_image_area_id IN (SELECT scvu_image_area_id FROM moved_areas) RETURNING *), \
+archived_tasks AS (INSERT INTO task_archive SELECT * FROM moved_tasks), \
+archived_areas AS (INSERT INTO image_area_archive SELECT * FROM moved_areas), \
+moved_images AS (DELETE FROM image WHERE (scvu_image_id, upload_date) IN (SELECT scvu_image_id, upload_date FROM batch) RETURNING *) \
+INSERT INTO image_archive SELECT * FROM moved_images"
+
+
+def image_sources(include_archive):
+    return ARCHIVE_SOURCES if include_archive else LIVE_SOURCES
+
+
+@traced_class
+class ArchiveQueries:
+    def __init__(self, db):
+        self.db = db
+
+    def archiveCompletedImages(self, cutoff, batch_size):
+        '''
+        Function: Moves up to batch_size images completed and uploaded before cutoff into the archive tables
+        Input: cutoff datetime, batch_size
+        Output: number of images archived
+        Note: images locked by another transaction are skipped and picked up by a later batch
+        '''
+        with self.db.transaction() as cursor:
+            cursor.execute(
+                "INSERT INTO archive_state (name, archived_before) VALUES ('image', %s) \
+                ON CONFLICT (name) DO UPDATE SET archived_before = GREATEST(archive_state.archived_before, EXCLUDED.archived_before)",
+                (cutoff, ),
+            )
+            cursor.execute(ARCHIVE_COMPLETED_IMAGES, (cutoff, cutoff, batch_size))
+            return cursor.rowcount
+
+    def reachesArchive(self, start_date):
+        '''
+        Function: Checks whether a date window starting at start_date can include archived images
+        Input: start_date
+        Output: boolean
+        '''
+        query = f"SELECT EXISTS (SELECT 1 FROM archive_state WHERE name = 'image' AND archived_before > %s)"
+        return self.db.executeSelect(query, (start_date, ))[0][0]
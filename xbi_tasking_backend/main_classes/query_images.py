@@ -1,11 +1,69 @@
 import datetime
+import logging
 
+from main_classes.query_archive import image_sources
+from main_classes.partitions import IMAGE_DEFAULT_PARTITION, attach_image_partition
+from main_classes.query_reports import delete_image_with_rollup, update_image_with_rollup
+from tracing import traced_class
 
+logger = logging.getLogger("xbi_tasking_backend.database.images")
+
+
+# Completed images in a completion or upload date range, shared by getImageData, getImageDataForUser and streamImageData.
+# {image}, {image_area} and {task} are filled in from image_sources().
+COMPLETED_IMAGE_QUERY = "SELECT image.scvu_image_id, COALESCE(sensor.name, NULL) as sensor_name, image.image_file_name, image.image_id, image.upload_date, image.image_datetime, \
+COALESCE(report.name, NULL) as report_name, COALESCE(priority.name, NULL) as priority_name, \
+COALESCE(image_category.name, NULL) as image_category_name, image.image_quality, \
+COALESCE(cloud_cover.name, NULL) as cloud_cover_name, COALESCE(ew_status.name, NULL) as ew_status_name, image.vetter_keycloak_id \
+FROM {image} AS image \
+LEFT JOIN sensor ON sensor.id = image.sensor_id \
+LEFT JOIN ew_status ON ew_status.id = image.ew_status_id \
+LEFT JOIN report ON report.id = image.report_id \
+LEFT JOIN priority ON priority.id = image.priority_id \
+LEFT JOIN image_category ON image_category.id = image.image_category_id \
+LEFT JOIN cloud_cover ON cloud_cover.id = image.cloud_cover_id \
+WHERE image.completed_date IS NOT NULL \
+AND ((image.completed_date >= %s AND image.completed_date < %s) \
+     OR (image.upload_date >= %s AND image.upload_date < %s))"
+
+COMPLETED_IMAGE_ASSIGNEE_FILTER = " AND EXISTS ( \
+SELECT 1 \
+FROM {task} t \
+JOIN {image_area} ia ON ia.scvu_image_area_id = t.scvu_image_area_id \
+WHERE ia.scvu_image_id = image.scvu_image_id \
+AND t.assignee_keycloak_id = %s)"
+
+
+@traced_class
 class ImageQueries:
     def __init__(self, db, keycloak_queries):
         self.db = db
         self.keycloak = keycloak_queries
 
+    def ensureImagePartition(self, month, lock_timeout_ms=5000):
+        '''
+        Function:   Creates the image partition for a month if it is missing, moving in any rows the default partition holds for it
+        Input:      month start date, lock_timeout_ms to wait for locks on image before giving up
+        Output:     number of rows moved out of the default partition, or None if the partition already existed
+        Note:       raises a database error (e.g. a lock timeout behind a long export) and leaves everything as it was
+        '''
+        with self.db.transaction() as cursor:
+            # Waiting in the lock queue would block every later query on image, so give up and retry later instead
+            cursor.execute("SELECT set_config('lock_timeout', %s, true)", (f"{int(lock_timeout_ms)}ms", ))
+            moved = attach_image_partition(cursor, month)
+        if moved:
+            logger.info("Moved %s images from %s into the partition for %s", moved, IMAGE_DEFAULT_PARTITION, month)
+        return moved
+
+    def getDefaultPartitionMonths(self):
+        '''
+        Function:   Lists the months that have images in the default partition, which have no partition of their own
+        Input:      NIL
+        Output:     list of month start dates
+        '''
+        query = f"SELECT DISTINCT date_trunc('month', upload_date)::date FROM {IMAGE_DEFAULT_PARTITION}"
+        return [row[0] for row in self.db.executeSelect(query)]
+
     def insertSensor(self, sensor_name):
         '''
         Function:   Inserts sensor into db if it doesn't already exist
@@ -15,20 +73,34 @@ class ImageQueries:
         query = f"INSERT INTO sensor (name) VALUES (%s) ON CONFLICT (name) DO NOTHING"
         self.db.executeInsert(query, (sensor_name,))
 
-    def insertImage(self, image_id, image_file_name, sensor_name, upload_date, image_datetime):
+    def insertImage(self, image_id, image_file_name, sensor_name, upload_date, image_datetime, ingest_job_id=None):
         '''
         Function:   Inserts image from DSTA into db
         Input:      image_id, image_file_name, sensor_name, upload_date, image_datetime
+        Input:      ingest_job_id of the upload inserting it, so deleting the image can forget that upload's fingerprint
         Output:     NIL
         '''
+        # image is partitioned by upload_date, so image_id uniqueness is claimed in image_key in the same statement
         # Set default values for required foreign keys (0 = null in lookup tables)
-        query = f"INSERT INTO image (image_id, image_file_name, sensor_id, upload_date, image_datetime, ew_status_id, report_id, priority_id, image_category_id, cloud_cover_id) \
-        VALUES (%s, %s, (SELECT id FROM sensor WHERE name=%s), %s, %s, (SELECT id FROM ew_status WHERE name = 'xbi done'), 0, 0, 0, 0) \
-        ON CONFLICT (image_id) DO NOTHING"
-        rows = self.db.executeInsert(query, (image_id, image_file_name, sensor_name, upload_date, image_datetime))
+        query = f"WITH claimed AS (INSERT INTO image_key (image_id, ingest_job_id) VALUES (%s, %s) ON CONFLICT (image_id) DO NOTHING RETURNING image_id) \
+        INSERT INTO image (image_id, image_file_name, sensor_id, upload_date, image_datetime, ew_status_id, report_id, priority_id, image_category_id, cloud_cover_id) \
+        SELECT claimed.image_id, %s, (SELECT id FROM sensor WHERE name=%s), %s, %s, (SELECT id FROM ew_status WHERE name = 'xbi done'), 0, 0, 0, 0 \
+        FROM claimed"
+        rows = self.db.executeInsert(query, (image_id, ingest_job_id, image_file_name, sensor_name, upload_date, image_datetime))
 
         return rows > 0
 
+    def getExistingImageIds(self, image_ids):
+        '''
+        Function:   Finds which of the given image ids are already in the db, live or archived
+        Input:      list of image_id
+        Output:     set of the image_ids that exist
+        '''
+        if not image_ids:
+            return set()
+        query = f"SELECT image_id FROM image_key WHERE image_id = ANY(%s)"
+        return {row[0] for row in self.db.executeSelect(query, (list(image_ids), ))}
+
     def insertArea(self, area_name):
         '''
         Function:   Inserts area from DSTA / TTG into db
@@ -78,8 +150,9 @@ class ImageQueries:
         Function:   Sets completion date for image to current date
         Input:      scvu image id, vetter_keycloak_id (Keycloak user ID/sub), current_datetime
         Output:     NIL
+        Note:       report_daily_rollup is updated in the same statement
         '''
-        query = f"UPDATE image SET completed_date = %s, vetter_keycloak_id = %s WHERE scvu_image_id = %s"
+        query = update_image_with_rollup("completed_date = %s, vetter_keycloak_id = %s", "scvu_image_id = %s")
         self.db.executeUpdate(query, (current_datetime, vetter_keycloak_id, scvu_image_id))
 
     def uncompleteImage(self, scvu_image_id):
@@ -87,8 +160,9 @@ class ImageQueries:
         Function:   Sets the completed date of an image to None
         Input:      scvu image id
         Output:     NIL
+        Note:       report_daily_rollup is updated in the same statement
         '''
-        query = f"UPDATE image SET completed_date = null WHERE scvu_image_id = %s"
+        query = update_image_with_rollup("completed_date = null", "scvu_image_id = %s")
         self.db.executeUpdate(query, (scvu_image_id, ))
 
     def getImageCompleteDate(self, scvu_image_id):
@@ -121,10 +195,10 @@ class ImageQueries:
             formatted.append((task_id, area_name, remarks, assignee))
         return formatted
 
-    def getImageAreaDataForImages(self, scvu_image_ids):
+    def getImageAreaDataForImages(self, scvu_image_ids, include_archive=False):
         '''
         Function: Gets image area data for completed images (batch)
-        Input: scvu_image_ids
+        Input: scvu_image_ids, include_archive to also read archived image areas and tasks
         Output: list of tuples with image_id, task_id, area_name, remarks, assignee
         '''
         if not scvu_image_ids:
@@ -134,13 +208,13 @@ class ImageQueries:
         imageAreaQuery = f"""
         SELECT image.scvu_image_id, task.scvu_task_id, area.area_name,
                COALESCE(task.remarks, '') as remarks, task.assignee_keycloak_id
-        FROM task
-        JOIN image_area ON task.scvu_image_area_id = image_area.scvu_image_area_id
+        FROM {{task}} AS task
+        JOIN {{image_area}} AS image_area ON task.scvu_image_area_id = image_area.scvu_image_area_id
         JOIN area ON image_area.scvu_area_id = area.scvu_area_id
-        JOIN image ON image_area.scvu_image_id = image.scvu_image_id
+        JOIN {{image}} AS image ON image_area.scvu_image_id = image.scvu_image_id
         WHERE image.scvu_image_id IN ({placeholders})
         ORDER BY image.scvu_image_id, area.area_name
-        """
+        """.format(**image_sources(include_archive))
         results = self.db.executeSelect(imageAreaQuery, tuple(scvu_image_ids))
         formatted = []
         for row in results:
@@ -149,73 +223,48 @@ class ImageQueries:
             formatted.append((image_id, task_id, area_name, remarks, assignee))
         return formatted
 
-    def getImageData(self, start_date, end_date):
+    def getImageData(self, start_date, end_date, include_archive=False):
         '''
         Function: Gets image data for completed images
-        Input: start_date, end_date
-        Output: scvu image id, sensor name, image file name, image id, image upload date, image date time, report name, priority name, image category name, image quality, cloud cover, ew status
-        '''
-        imageQuery = f"SELECT image.scvu_image_id, COALESCE(sensor.name, NULL) as sensor_name, image.image_file_name, image.image_id, image.upload_date, image.image_datetime, \
-        COALESCE(report.name, NULL) as report_name, COALESCE(priority.name, NULL) as priority_name, \
-        COALESCE(image_category.name, NULL) as image_category_name, image.image_quality, \
-        COALESCE(cloud_cover.name, NULL) as cloud_cover_name, COALESCE(ew_status.name, NULL) as ew_status_name, image.vetter_keycloak_id \
-        FROM image \
-        LEFT JOIN sensor ON sensor.id = image.sensor_id \
-        LEFT JOIN ew_status ON ew_status.id = image.ew_status_id \
-        LEFT JOIN report ON report.id = image.report_id \
-        LEFT JOIN priority ON priority.id = image.priority_id \
-        LEFT JOIN image_category ON image_category.id = image.image_category_id \
-        LEFT JOIN cloud_cover ON cloud_cover.id = image.cloud_cover_id \
-        WHERE image.completed_date IS NOT NULL \
-        AND ((image.completed_date >= %s AND image.completed_date < %s) \
-             OR (image.upload_date >= %s AND image.upload_date < %s))"
-
+        Input: start_date, end_date, include_archive to also read archived images
+        Output: scvu image id, sensor name, image file name, image id, image upload date, image date time, report name, priority name, image category name, image quality, cloud cover, ew status, vetter name
+        '''
+        imageQuery = COMPLETED_IMAGE_QUERY.format(**image_sources(include_archive))
         results = self.db.executeSelect(imageQuery, (start_date, end_date, start_date, end_date))
-        formatted = []
-        for row in results:
-            row = list(row)
-            vetter_keycloak_id = row[12]
-            row[12] = self.keycloak.get_keycloak_username(vetter_keycloak_id) if vetter_keycloak_id else 'Unassigned'
-            formatted.append(tuple(row))
-        return formatted
+        return [self._withVetterName(row) for row in results]
 
-    def getImageDataForUser(self, start_date, end_date, assignee_keycloak_id):
+    def getImageDataForUser(self, start_date, end_date, assignee_keycloak_id, include_archive=False):
         '''
         Function: Gets completed image data filtered by assignee for completed images
-        Input: start_date, end_date, assignee_keycloak_id (Keycloak user ID/sub)
+        Input: start_date, end_date, assignee_keycloak_id (Keycloak user ID/sub), include_archive to also read archived images
         Output: same shape as getImageData
         '''
-        imageQuery = f"""
-        SELECT image.scvu_image_id, COALESCE(sensor.name, NULL) as sensor_name, image.image_file_name, image.image_id, image.upload_date, image.image_datetime,
-        COALESCE(report.name, NULL) as report_name, COALESCE(priority.name, NULL) as priority_name,
-        COALESCE(image_category.name, NULL) as image_category_name, image.image_quality,
-        COALESCE(cloud_cover.name, NULL) as cloud_cover_name, COALESCE(ew_status.name, NULL) as ew_status_name, image.vetter_keycloak_id
-        FROM image
-        LEFT JOIN sensor ON sensor.id = image.sensor_id
-        LEFT JOIN ew_status ON ew_status.id = image.ew_status_id
-        LEFT JOIN report ON report.id = image.report_id
-        LEFT JOIN priority ON priority.id = image.priority_id
-        LEFT JOIN image_category ON image_category.id = image.image_category_id
-        LEFT JOIN cloud_cover ON cloud_cover.id = image.cloud_cover_id
-        WHERE image.completed_date IS NOT NULL
-        AND ((image.completed_date >= %s AND image.completed_date < %s)
-             OR (image.upload_date >= %s AND image.upload_date < %s))
-        AND EXISTS (
-            SELECT 1
-            FROM task t
-            JOIN image_area ia ON ia.scvu_image_area_id = t.scvu_image_area_id
-            WHERE ia.scvu_image_id = image.scvu_image_id
-            AND t.assignee_keycloak_id = %s
-        )
-        """
+        imageQuery = (COMPLETED_IMAGE_QUERY + COMPLETED_IMAGE_ASSIGNEE_FILTER).format(**image_sources(include_archive))
         results = self.db.executeSelect(imageQuery, (start_date, end_date, start_date, end_date, assignee_keycloak_id))
-        formatted = []
-        for row in results:
-            row = list(row)
-            vetter_keycloak_id = row[12]
-            row[12] = self.keycloak.get_keycloak_username(vetter_keycloak_id) if vetter_keycloak_id else 'Unassigned'
-            formatted.append(tuple(row))
-        return formatted
+        return [self._withVetterName(row) for row in results]
+
+    def streamImageData(self, start_date, end_date, assignee_keycloak_id=None, include_archive=False):
+        '''
+        Function: Streams completed image data from a server-side cursor, ordered by upload date
+        Input: start_date, end_date, assignee_keycloak_id to only include images with a task for that user
+        Input: include_archive to also read archived images
+        Output: generator with the same rows as getImageData
+        '''
+        imageQuery = COMPLETED_IMAGE_QUERY
+        values = (start_date, end_date, start_date, end_date)
+        if assignee_keycloak_id:
+            imageQuery += COMPLETED_IMAGE_ASSIGNEE_FILTER
+            values += (assignee_keycloak_id, )
+        imageQuery = imageQuery.format(**image_sources(include_archive))
+        imageQuery += " ORDER BY image.upload_date, image.scvu_image_id"
+        for row in self.db.executeSelectStream(imageQuery, values):
+            yield self._withVetterName(row)
+
+    def _withVetterName(self, row):
+        row = list(row)
+        vetter_keycloak_id = row[12]
+        row[12] = self.keycloak.get_keycloak_username(vetter_keycloak_id) if vetter_keycloak_id else 'Unassigned'
+        return tuple(row)
 
     def deleteTasksForImage(self, scvu_image_id):
         '''
@@ -240,6 +289,7 @@ class ImageQueries:
         Function: Deletes an image
         Input: scvu_image_id
         Output: NIL
+        Note: a completed image is taken out of report_daily_rollup in the same statement
         '''
-        query = f"DELETE FROM image WHERE scvu_image_id = %s"
+        query = delete_image_with_rollup("scvu_image_id = %s")
         self.db.executeDelete(query, (scvu_image_id, ))
@@ -0,0 +1,141 @@
+from tracing import traced_class
+
+
+# Columns of ingest_job in the order getIngestJob returns them
+INGEST_JOB_COLUMNS = (
+    "job_id", "source", "file_name", "created_by", "status", "total_images", "images_processed",
+    "images_inserted", "images_existing", "areas_inserted", "error_count", "message",
+    "created_at", "started_at", "finished_at", "content_hash", "heartbeat_at",
+)
+
+# Queued and running jobs are refreshed by the process that owns them; one not refreshed for this long
+# belongs to a process that stopped, and no longer counts as in progress
+INGEST_JOB_STALE_SECONDS = 120
+
+
+@traced_class
+class JobQueries:
+    def __init__(self, db):
+        self.db = db
+
+    def createIngestJob(self, job_id, source, file_name, created_by, total_images, content_hash=None):
+        '''
+        Function: Records a queued ingest job
+        Input: job_id, source (e.g. dsta), file_name, created_by (Keycloak user ID/sub), total_images
+        Input: content_hash is the sha256 of the uploaded file, if it came from one
+        Output: NIL
+        '''
+        query = f"INSERT INTO ingest_job (job_id, source, file_name, created_by, status, total_images, content_hash) \
+        VALUES (%s, %s, %s, %s, 'queued', %s, %s)"
+        self.db.executeInsert(query, (job_id, source, file_name, created_by, total_images, content_hash))
+
+    def findIngestJobByHash(self, content_hash):
+        '''
+        Function: Finds an earlier upload of the same file that is still in progress or inserted every image itself
+        Input: content_hash
+        Output: (job_id, status) of the latest such job, or None
+        Note: in-progress jobs whose heartbeat is older than INGEST_JOB_STALE_SECONDS are ignored
+        Note: matches across sources, so a file dropped for the ingest worker and uploaded through the UI is ingested once
+        Note: deleting an image clears the content_hash of the upload that inserted it, since a re-upload then has an image to insert;
+              uploads that found some images already there are not matched, as deleting those would not clear their hash
+        '''
+        query = f"SELECT job_id, status FROM ingest_job \
+        WHERE content_hash = %s \
+        AND ((status IN ('queued', 'running') AND heartbeat_at > LOCALTIMESTAMP - make_interval(secs => %s)) \
+            OR (status = 'succeeded' AND error_count = 0 AND images_existing = 0)) \
+        ORDER BY created_at DESC LIMIT 1"
+        rows = self.db.executeSelect(query, (content_hash, INGEST_JOB_STALE_SECONDS))
+        return rows[0] if rows else None
+
+    def recordDuplicateIngestJob(self, job_id, source, file_name, created_by, duplicate_of):
+        '''
+        Function: Records an upload that was skipped because the same file was already ingested, as a finished job
+        Input: job_id, source, file_name, created_by (Keycloak user ID/sub), duplicate_of is the earlier job
+        Output: NIL
+        '''
+        query = f"INSERT INTO ingest_job (job_id, source, file_name, created_by, status, total_images, images_processed, \
+        images_existing, message, started_at, finished_at) \
+        SELECT %s, %s, %s, %s, 'succeeded', total_images, total_images, total_images, %s, now(), now() \
+        FROM ingest_job WHERE job_id = %s"
+        message = f"Identical to upload {duplicate_of}; all images already exist"
+        self.db.executeInsert(query, (job_id, source, file_name, created_by, message, duplicate_of))
+
+    def startIngestJob(self, job_id):
+        '''
+        Function: Marks an ingest job as running
+        Input: job_id
+        Output: NIL
+        '''
+        query = f"UPDATE ingest_job SET status = 'running', started_at = now(), heartbeat_at = now() WHERE job_id = %s"
+        self.db.executeUpdate(query, (job_id, ))
+
+    def updateIngestJobProgress(self, job_id, processed, inserted, existing, errors, areas):
+        '''
+        Function: Records how far a running ingest job has got
+        Input: job_id, images processed, inserted and already existing, error count, areas inserted
+        Output: NIL
+        '''
+        query = f"UPDATE ingest_job SET images_processed = %s, images_inserted = %s, images_existing = %s, \
+        error_count = %s, areas_inserted = %s, heartbeat_at = now() WHERE job_id = %s"
+        self.db.executeUpdate(query, (processed, inserted, existing, errors, areas, job_id))
+
+    def touchIngestJobs(self, job_ids):
+        '''
+        Function: Records that the calling process is still working on its queued and running jobs
+        Input: list of job_id
+        Output: NIL
+        '''
+        if not job_ids:
+            return
+        query = f"UPDATE ingest_job SET heartbeat_at = now() WHERE job_id = ANY(%s) AND status IN ('queued', 'running')"
+        self.db.executeUpdate(query, (list(job_ids), ))
+
+    def failStaleIngestJobs(self, source, message, stale_seconds=INGEST_JOB_STALE_SECONDS):
+        '''
+        Function: Marks queued and running jobs whose heartbeat stopped as failed, since the process running them is gone
+        Input: source to limit to (None for every source), message, stale_seconds without a heartbeat
+        Output: NIL
+        '''
+        query = f"UPDATE ingest_job SET status = 'failed', message = %s, finished_at = now() \
+        WHERE status IN ('queued', 'running') AND heartbeat_at < LOCALTIMESTAMP - make_interval(secs => %s) \
+        AND (%s IS NULL OR source = %s)"
+        self.db.executeUpdate(query, (message, stale_seconds, source, source))
+
+    def finishIngestJob(self, job_id, status, message, total_images=None):
+        '''
+        Function: Marks an ingest job as finished
+        Input: job_id, status (succeeded or failed), message
+        Input: total_images, for jobs that only knew their size once the file was read (None keeps the recorded total)
+        Output: NIL
+        '''
+        query = f"UPDATE ingest_job SET status = %s, message = %s, total_images = COALESCE(%s, total_images), \
+        finished_at = now() WHERE job_id = %s"
+        self.db.executeUpdate(query, (status, message, total_images, job_id))
+
+    def getIngestJob(self, job_id):
+        '''
+        Function: Gets an ingest job
+        Input: job_id
+        Output: tuple in INGEST_JOB_COLUMNS order, or None if there is no such job
+        '''
+        query = f"SELECT {', '.join(INGEST_JOB_COLUMNS)} FROM ingest_job WHERE job_id = %s"
+        rows = self.db.executeSelect(query, (job_id, ))
+        return rows[0] if rows else None
+
+    def getIngestJobClock(self):
+        '''
+        Function: Gets the database's current time, as it is written to the ingest_job timestamps
+        Input: NIL
+        Output: datetime
+        '''
+        return self.db.executeSelect("SELECT LOCALTIMESTAMP")[0][0]
+
+    def getFinishedIngestJobs(self, source, finished_after):
+        '''
+        Function: Gets the ingest jobs from a source that finished after a point in time, oldest first
+        Input: source (e.g. dsta_drop), finished_after
+        Output: list of tuples in INGEST_JOB_COLUMNS order
+        '''
+        query = f"SELECT {', '.join(INGEST_JOB_COLUMNS)} FROM ingest_job \
+        WHERE source = %s AND finished_at > %s ORDER BY finished_at"
+        return self.db.executeSelect(query, (source, finished_after))
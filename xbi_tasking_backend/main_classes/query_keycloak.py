@@ -1,12 +1,17 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import main_classes.EnumClasses as EnumClasses
+import metrics
 from services.keycloak_service import KeycloakService
+import tracing
+from tracing import traced_class
 
 
 logger = logging.getLogger("xbi_tasking_backend.query_keycloak")
 
 
+@traced_class
 class KeycloakQueries:
     def __init__(self, db, keycloak_user_cache, keycloak_service=None):
         self.db = db
@@ -17,7 +22,9 @@ class KeycloakQueries:
         if not keycloak_user_id:
             return 'Unassigned'
         if keycloak_user_id in self._keycloak_user_cache:
+            metrics.record_cache_lookup("user_directory", hits=1)
             return self._keycloak_user_cache[keycloak_user_id]
+        metrics.record_cache_lookup("user_directory", misses=1)
         try:
             token = self.get_keycloak_admin_token()
             user_data = self.kc.get_user_by_id(token, keycloak_user_id)
@@ -28,6 +35,28 @@ class KeycloakQueries:
             logger.warning("Could not resolve Keycloak user %s: %s", keycloak_user_id, e)
         return keycloak_user_id
 
+    def _tasking_role_names(self):
+        role_enum = EnumClasses.Role
+        return [role_enum.II.value, role_enum.SENIOR_II.value, role_enum.IA.value]
+
+    def _get_users_for_roles(self, token, role_names):
+        '''
+        Fetches the members of several realm roles in parallel
+        Output: dict of role_name -> list of users; roles that fail to load are logged and left out
+        '''
+        users_by_role = {}
+        with ThreadPoolExecutor(max_workers=len(role_names) or 1) as executor:
+            futures = {
+                role_name: executor.submit(tracing.bind(self.kc.get_users_for_role), token, role_name)
+                for role_name in role_names
+            }
+            for role_name, future in futures.items():
+                try:
+                    users_by_role[role_name] = future.result()
+                except requests.exceptions.RequestException as e:
+                    logger.warning("Could not fetch users with role %s from Keycloak: %s", role_name, e)
+        return users_by_role
+
     def get_keycloak_usernames_bulk(self, keycloak_user_ids):
         ids = [user_id for user_id in set(keycloak_user_ids or []) if user_id]
         if not ids:
@@ -39,6 +68,7 @@ class KeycloakQueries:
             if user_id in ids
         }
         missing = [user_id for user_id in ids if user_id not in resolved]
+        metrics.record_cache_lookup("user_directory", hits=len(resolved), misses=len(missing))
         if not missing:
             return resolved
 
@@ -48,20 +78,13 @@ class KeycloakQueries:
             logger.warning("Could not get Keycloak admin token for bulk lookup: %s", e)
             return resolved
 
-        role_enum = EnumClasses.Role
-        role_names = [role_enum.II.value, role_enum.SENIOR_II.value, role_enum.IA.value]
         id_to_username = {}
-        for role_name in role_names:
-            try:
-                users = self.kc.get_users_for_role(token, role_name)
-                for user in users:
-                    user_id = user.get("id")
-                    username = user.get("username")
-                    if user_id and username:
-                        id_to_username[user_id] = username
-            except requests.exceptions.RequestException as e:
-                logger.warning("Could not fetch users for role %s: %s", role_name, e)
-                continue
+        for users in self._get_users_for_roles(token, self._tasking_role_names()).values():
+            for user in users:
+                user_id = user.get("id")
+                username = user.get("username")
+                if user_id and username:
+                    id_to_username[user_id] = username
 
         for user_id in missing:
             username = id_to_username.get(user_id)
@@ -70,14 +93,12 @@ class KeycloakQueries:
                 self._keycloak_user_cache[user_id] = username
 
         still_missing = [user_id for user_id in missing if user_id not in resolved]
-        for user_id in still_missing:
-            try:
-                user_data = self.kc.get_user_by_id(token, user_id)
+        if still_missing:
+            users = self.kc.get_users_by_ids(token, still_missing)
+            for user_id, user_data in users.items():
                 username = user_data.get("username", user_id)
                 resolved[user_id] = username
                 self._keycloak_user_cache[user_id] = username
-            except requests.exceptions.RequestException as e:
-                logger.warning("Could not resolve Keycloak user %s: %s", user_id, e)
 
         return resolved
     
@@ -99,6 +120,28 @@ class KeycloakQueries:
         token = self.get_keycloak_admin_token()
         return self.kc.find_user_id(token, keycloak_username)
 
+    def map_keycloak_usernames_to_keycloak_ids(self, keycloak_usernames):
+        '''
+        Function:   Resolves many Keycloak usernames to Keycloak user IDs with one paged listing of realm users
+        Input:      iterable of Keycloak usernames
+        Output:     dict of username -> Keycloak user ID (usernames not found in Keycloak are left out)
+        '''
+        usernames = {username for username in keycloak_usernames or [] if username}
+        if not usernames:
+            return {}
+        token = self.get_keycloak_admin_token()
+        username_to_id = {}
+        for user in self.kc.get_all_users(token):
+            username = user.get("username")
+            user_id = user.get("id")
+            if username and user_id:
+                username_to_id[username.lower()] = user_id
+        return {
+            username: username_to_id[username.lower()]
+            for username in usernames
+            if username.lower() in username_to_id
+        }
+
     def _get_keycloak_role(self, role_name):
         token = self.get_keycloak_admin_token()
         return self.kc.get_role(token, role_name)
@@ -189,23 +232,15 @@ class KeycloakQueries:
             logger.warning("Could not get Keycloak admin token: %s", e)
             return []
 
-        role_enum = EnumClasses.Role
-        role_names = [role_enum.II.value, role_enum.SENIOR_II.value, role_enum.IA.value]
         user_map = {}
-
-        for role_name in role_names:
-            try:
-                users = self.kc.get_users_for_role(token, role_name)
-                for user in users:
-                    username = user.get("username")
-                    user_id = user.get("id")
-                    if not username or not user_id:
-                        continue
-                    entry = user_map.setdefault(username, {"id": user_id, "roles": set()})
-                    entry["roles"].add(role_name)
-            except requests.exceptions.RequestException as e:
-                logger.warning("Could not fetch users with role %s from Keycloak: %s", role_name, e)
-                continue
+        for role_name, users in self._get_users_for_roles(token, self._tasking_role_names()).items():
+            for user in users:
+                username = user.get("username")
+                user_id = user.get("id")
+                if not username or not user_id:
+                    continue
+                entry = user_map.setdefault(username, {"id": user_id, "roles": set()})
+                entry["roles"].add(role_name)
 
         if not user_map:
             return []
@@ -328,3 +363,30 @@ class KeycloakQueries:
 
         query = "UPDATE user_cache SET is_present = True WHERE keycloak_user_id = %s"
         self.db.executeUpdateMany(query, user_id_tuples)
+
+    def applyParadeState(self, user_list, present_list):
+        '''
+        Function: Replaces the is_present state of all cached users with the given parade state
+        Input: user_list is every Keycloak username in the parade state, present_list is the subset that is present
+        Output: NIL
+        Note: Usernames are resolved in one Keycloak listing and presence is applied with two set-based statements
+        '''
+        id_map = self.map_keycloak_usernames_to_keycloak_ids(user_list)
+        for username in sorted(set(user_list) - set(id_map)):
+            logger.warning("%s not in Keycloak. Ensure account exists in Keycloak", username)
+
+        user_ids = sorted(set(id_map.values()))
+        present_ids = sorted({id_map[username] for username in present_list if username in id_map})
+
+        insert_query = """
+            INSERT INTO user_cache (keycloak_user_id, is_present, last_updated)
+            SELECT user_id, FALSE, NOW() FROM unnest(%s::varchar[]) AS user_id
+            ON CONFLICT (keycloak_user_id) DO NOTHING
+        """
+        update_query = """
+            UPDATE user_cache
+            SET is_present = (keycloak_user_id = ANY(%s::varchar[])), last_updated = NOW()
+        """
+        with self.db.transaction() as cursor:
+            cursor.execute(insert_query, (user_ids,))
+            cursor.execute(update_query, (present_ids,))
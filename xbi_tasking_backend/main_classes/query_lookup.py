@@ -1,3 +1,9 @@
+from main_classes.query_archive import ARCHIVE_SOURCES
+from main_classes.query_reports import upsert_daily_rollup
+from tracing import traced_class
+
+
+@traced_class
 class LookupQueries:
     def __init__(self, db):
         self.db = db
@@ -68,29 +74,39 @@ class LookupQueries:
         cursor = self.db.executeSelect(query)
         return cursor
 
-    def setOpsvFalse(self):
-        '''
-        Function: Sets all the areas opsv to False
-        Input: NIL
-        Outpu: NIL
-        '''
-        query = f"UPDATE area SET opsv = False"
-        self.db.executeUpdate(query)
-
-    def setOpsvAreas(self, area_list):
-        '''
-        Function: Sets specified areas opsv to True
-        Input: List of areas
-        Output: NIL
-        '''
-        query = f"UPDATE area SET opsv = True WHERE area_name = %s"
-        self.db.executeUpdateMany(query, area_list)
+    def syncOpsvAreas(self, area_names):
+        '''
+        Function: Sets opsv to True for the given areas and False for all others, only touching rows whose value changes
+        Input: List of area names that should be OpsV
+        Output: number of area rows changed
+        '''
+        query = f"UPDATE area SET opsv = (area_name = ANY(%s)) \
+        WHERE opsv IS DISTINCT FROM (area_name = ANY(%s))"
+        area_names = list(area_names)
+        with self.db.transaction() as cursor:
+            cursor.execute(query, (area_names, area_names))
+            return cursor.rowcount
 
     def updateSensorCategory(self, category_sensor_list):
         '''
         Function: Updates sensor to the new category given
         Input: category_sensor_list is a nested list with category sensor
         Output: NIL
-        '''
-        query = f"UPDATE sensor SET category_id = (SELECT id FROM sensor_category WHERE name = %s) WHERE name = %s"
+        Note: the sensor's completed images, live and archived, are moved to the new category in report_daily_rollup in the same statement
+        '''
+        query = f"WITH changed AS ( \
+            UPDATE sensor SET category_id = (SELECT id FROM sensor_category WHERE name = %s) \
+            FROM (SELECT id, category_id FROM sensor WHERE name = %s FOR UPDATE) AS old \
+            WHERE sensor.id = old.id \
+            RETURNING sensor.id, old.category_id AS old_category_id, sensor.category_id), \
+        moved AS ( \
+            SELECT image.upload_date::date AS day, image.report_id, COUNT(*) AS n \
+            FROM " + ARCHIVE_SOURCES["image"] + " AS image JOIN changed ON image.sensor_id = changed.id \
+            WHERE image.completed_date IS NOT NULL \
+            GROUP BY 1, 2) \
+        " + upsert_daily_rollup(
+            "SELECT moved.day, changed.old_category_id AS category_id, moved.report_id, -moved.n AS n FROM moved, changed \
+            UNION ALL \
+            SELECT moved.day, changed.category_id, moved.report_id, moved.n FROM moved, changed"
+        )
         self.db.executeUpdateMany(query, category_sensor_list)
@@ -1,19 +1,121 @@
+from main_classes.query_archive import ARCHIVE_SOURCES
+from tracing import traced_class
+
+
+# Report names counted as unexploitable, in the order get_xbi_report bins them
+UNEXPLOITABLE_REPORTS = ("Img Error", "Failed", "I-IIRS 0", "TOS")
+
+def rebuild_daily_rollup(images="image"):
+    '''
+    Function: Builds the statements that recompute report_daily_rollup from scratch
+    Input: images is the table (or subquery) of images to count
+    Output: list of query strings
+    '''
+    return [
+        "DELETE FROM report_daily_rollup",
+        f"INSERT INTO report_daily_rollup (day, sensor_category_id, report_id, image_count) \
+        SELECT image.upload_date::date, sensor.category_id, image.report_id, COUNT(*) \
+        FROM {images} AS image JOIN sensor ON sensor.id = image.sensor_id \
+        WHERE image.completed_date IS NOT NULL \
+        AND image.upload_date IS NOT NULL AND sensor.category_id IS NOT NULL AND image.report_id IS NOT NULL \
+        GROUP BY 1, 2, 3",
+    ]
+
+
+# Completed images per (upload day, sensor category, report); archived images still count
+REBUILD_DAILY_ROLLUP = rebuild_daily_rollup(ARCHIVE_SOURCES["image"])
+
+
+def upsert_daily_rollup(delta):
+    '''
+    Function: Builds the statement that adds signed image counts to report_daily_rollup
+    Input: delta is a SELECT of (day, category_id, report_id, n) rows, usually over a data-modifying CTE
+    Output: query string
+    '''
+    return f"INSERT INTO report_daily_rollup (day, sensor_category_id, report_id, image_count) \
+    SELECT day, category_id, report_id, SUM(n) FROM ({delta}) AS delta \
+    WHERE day IS NOT NULL AND category_id IS NOT NULL AND report_id IS NOT NULL \
+    GROUP BY day, category_id, report_id HAVING SUM(n) <> 0 \
+    ON CONFLICT (day, sensor_category_id, report_id) \
+    DO UPDATE SET image_count = report_daily_rollup.image_count + EXCLUDED.image_count"
+
+
+def update_image_with_rollup(set_clause, where_clause):
+    '''
+    Function: Builds an UPDATE of image that moves the affected completed images between rollup rows in the same statement
+    Input: set_clause and where_clause of the UPDATE; their placeholders are bound in that order
+    Output: query string
+    '''
+    return f"WITH changed AS ( \
+        UPDATE image SET {set_clause} \
+        FROM (SELECT scvu_image_id, upload_date, sensor_id, report_id, completed_date FROM image WHERE {where_clause} FOR UPDATE) AS old \
+        WHERE image.scvu_image_id = old.scvu_image_id AND image.upload_date = old.upload_date \
+        RETURNING old.upload_date AS old_upload_date, old.sensor_id AS old_sensor_id, old.report_id AS old_report_id, \
+        old.completed_date AS old_completed_date, image.upload_date, image.sensor_id, image.report_id, image.completed_date) \
+    " + upsert_daily_rollup(
+        "SELECT changed.old_upload_date::date AS day, sensor.category_id, changed.old_report_id AS report_id, -1 AS n \
+        FROM changed JOIN sensor ON sensor.id = changed.old_sensor_id WHERE changed.old_completed_date IS NOT NULL \
+        UNION ALL \
+        SELECT changed.upload_date::date, sensor.category_id, changed.report_id, 1 \
+        FROM changed JOIN sensor ON sensor.id = changed.sensor_id WHERE changed.completed_date IS NOT NULL"
+    )
+
+
+def delete_image_with_rollup(where_clause):
+    '''
+    Function: Builds a DELETE of image that takes the deleted completed images out of the rollup,
+              releases their image_key claims and forgets the fingerprints of the finished uploads that inserted them,
+              in the same statement
+    Input: where_clause of the DELETE
+    Output: query string
+    '''
+    return f"WITH changed AS ( \
+        DELETE FROM image WHERE {where_clause} \
+        RETURNING image_id, upload_date, sensor_id, report_id, completed_date), \
+    released AS (DELETE FROM image_key WHERE image_id IN (SELECT image_id FROM changed) RETURNING ingest_job_id), \
+    forgotten AS (UPDATE ingest_job SET content_hash = NULL \
+        WHERE job_id IN (SELECT ingest_job_id FROM released) AND status = 'succeeded' AND content_hash IS NOT NULL) \
+    " + upsert_daily_rollup(
+        "SELECT changed.upload_date::date AS day, sensor.category_id, changed.report_id, -1 AS n \
+        FROM changed JOIN sensor ON sensor.id = changed.sensor_id WHERE changed.completed_date IS NOT NULL"
+    )
+
+
+@traced_class
 class ReportQueries:
     def __init__(self, db):
         self.db = db
 
-    def getXBIReportImage(self, start_date, end_date):
+    def getXBIReportCounts(self, start_date, end_date):
+        '''
+        Function: Counts completed images per sensor category, split into exploitable and each unexploitable report
+        Input: start_date, end_date as whole days (YYYY-MM-DD), end exclusive
+        Output: list of tuple (category name, exploitable, img error, failed, i-iirs 0, tos) for every category, in id order
+        Note: summed from report_daily_rollup; images whose report has no name are not counted
+        '''
+        unexploitable_placeholders = ", ".join(["%s"] * len(UNEXPLOITABLE_REPORTS))
+        query = f"SELECT sensor_category.name, \
+        COALESCE(SUM(rollup.image_count) FILTER (WHERE report.name NOT IN ({unexploitable_placeholders})), 0), \
+        COALESCE(SUM(rollup.image_count) FILTER (WHERE report.name = %s), 0), \
+        COALESCE(SUM(rollup.image_count) FILTER (WHERE report.name = %s), 0), \
+        COALESCE(SUM(rollup.image_count) FILTER (WHERE report.name = %s), 0), \
+        COALESCE(SUM(rollup.image_count) FILTER (WHERE report.name = %s), 0) \
+        FROM sensor_category \
+        LEFT JOIN report_daily_rollup AS rollup ON rollup.sensor_category_id = sensor_category.id \
+            AND rollup.day >= %s AND rollup.day < %s \
+        LEFT JOIN report ON report.id = rollup.report_id \
+        GROUP BY sensor_category.id, sensor_category.name \
+        ORDER BY sensor_category.id"
+        values = UNEXPLOITABLE_REPORTS + UNEXPLOITABLE_REPORTS + (start_date, end_date)
+        return self.db.executeSelect(query, values)
+
+    def rebuildReportDailyRollup(self):
         '''
-        Function: Gets image data for xbi
-        Input: start_date, end_date
-        Output: sensor name, category name, report name
+        Function: Recomputes report_daily_rollup from the completed images, e.g. after a bulk load that bypassed the queries
+        Input: NIL
+        Output: number of rollup rows
         '''
-        query = f"SELECT sensor.name, sensor_category.name, report.name \
-        FROM image, sensor, sensor_category, report \
-        WHERE (image.upload_date >= %s AND image.upload_date < %s) \
-        AND sensor.id = image.sensor_id \
-        AND sensor.category_id = sensor_category.id \
-        AND report.id = image.report_id \
-        AND completed_date IS NOT NULL"
-        cursor = self.db.executeSelect(query, (start_date, end_date))
-        return cursor
+        with self.db.transaction() as cursor:
+            for statement in REBUILD_DAILY_ROLLUP:
+                cursor.execute(statement)
+            return cursor.rowcount
@@ -1,9 +1,32 @@
 import logging
+from main_classes.query_reports import update_image_with_rollup
+from tracing import traced_class
 
 
 logger = logging.getLogger("xbi_tasking_backend.query_tasking")
 
 
+# Incomplete images with tasks in an upload date range, shared by the tasking summary queries
+TASKING_SUMMARY_IMAGE_QUERY = f"SELECT DISTINCT image.scvu_image_id, COALESCE(sensor.name, NULL) as sensor_name, image.image_file_name, image.image_id, image.upload_date, image.image_datetime, \
+COALESCE(report.name, NULL) as report_name, COALESCE(priority.name, NULL) as priority_name, \
+COALESCE(image_category.name, NULL) as image_category_name, image.image_quality, COALESCE(cloud_cover.name, NULL) as cloud_cover_name, \
+COALESCE(ew_status.name, NULL) as ew_status_name, image.target_tracing \
+FROM image \
+LEFT JOIN sensor ON sensor.id = image.sensor_id \
+LEFT JOIN ew_status ON ew_status.id = image.ew_status_id \
+LEFT JOIN report ON report.id = image.report_id \
+LEFT JOIN priority ON priority.id = image.priority_id \
+LEFT JOIN image_category ON image_category.id = image.image_category_id \
+LEFT JOIN cloud_cover ON cloud_cover.id = image.cloud_cover_id \
+JOIN image_area ON image_area.scvu_image_id = image.scvu_image_id \
+JOIN task ON image_area.scvu_image_area_id = task.scvu_image_area_id \
+WHERE image.completed_date IS NULL \
+AND (image.upload_date >= %s AND image.upload_date < %s)"
+
+TASKING_SUMMARY_ASSIGNEE_FILTER = " AND task.assignee_keycloak_id = %s"
+
+
+@traced_class
 class TaskingQueries:
     def __init__(self, db, keycloak_queries):
         self.db = db
@@ -210,22 +233,7 @@ class TaskingQueries:
         Input:      NIL
         Output:     nested list with id, sensor_name, image_file_name, image_id, upload_date, image_datetime, report, priority, image_category, quality, cloud_cover, ew_status, target_tracing
         '''
-        query = f"SELECT DISTINCT image.scvu_image_id, COALESCE(sensor.name, NULL) as sensor_name, image.image_file_name, image.image_id, image.upload_date, image.image_datetime, \
-        COALESCE(report.name, NULL) as report_name, COALESCE(priority.name, NULL) as priority_name, \
-        COALESCE(image_category.name, NULL) as image_category_name, image.image_quality, COALESCE(cloud_cover.name, NULL) as cloud_cover_name, \
-        COALESCE(ew_status.name, NULL) as ew_status_name, image.target_tracing \
-        FROM image \
-        LEFT JOIN sensor ON sensor.id = image.sensor_id \
-        LEFT JOIN ew_status ON ew_status.id = image.ew_status_id \
-        LEFT JOIN report ON report.id = image.report_id \
-        LEFT JOIN priority ON priority.id = image.priority_id \
-        LEFT JOIN image_category ON image_category.id = image.image_category_id \
-        LEFT JOIN cloud_cover ON cloud_cover.id = image.cloud_cover_id \
-        JOIN image_area ON image_area.scvu_image_id = image.scvu_image_id \
-        JOIN task ON image_area.scvu_image_area_id = task.scvu_image_area_id \
-        WHERE image.completed_date IS NULL \
-        AND (image.upload_date >= %s AND image.upload_date < %s)"
-        return self.db.executeSelect(query, (start_date, end_date))
+        return self.db.executeSelect(TASKING_SUMMARY_IMAGE_QUERY, (start_date, end_date))
 
     def getTaskingSummaryImageDataForUser(self, start_date, end_date, assignee_keycloak_id):
         '''
@@ -233,24 +241,23 @@ class TaskingQueries:
         Input:      start_date, end_date, assignee_keycloak_id
         Output:     nested list with id, sensor_name, image_file_name, image_id, upload_date, image_datetime, report, priority, image_category, quality, cloud_cover, ew_status, target_tracing
         '''
-        query = f"SELECT DISTINCT image.scvu_image_id, COALESCE(sensor.name, NULL) as sensor_name, image.image_file_name, image.image_id, image.upload_date, image.image_datetime, \
-        COALESCE(report.name, NULL) as report_name, COALESCE(priority.name, NULL) as priority_name, \
-        COALESCE(image_category.name, NULL) as image_category_name, image.image_quality, COALESCE(cloud_cover.name, NULL) as cloud_cover_name, \
-        COALESCE(ew_status.name, NULL) as ew_status_name, image.target_tracing \
-        FROM image \
-        LEFT JOIN sensor ON sensor.id = image.sensor_id \
-        LEFT JOIN ew_status ON ew_status.id = image.ew_status_id \
-        LEFT JOIN report ON report.id = image.report_id \
-        LEFT JOIN priority ON priority.id = image.priority_id \
-        LEFT JOIN image_category ON image_category.id = image.image_category_id \
-        LEFT JOIN cloud_cover ON cloud_cover.id = image.cloud_cover_id \
-        JOIN image_area ON image_area.scvu_image_id = image.scvu_image_id \
-        JOIN task ON image_area.scvu_image_area_id = task.scvu_image_area_id \
-        WHERE image.completed_date IS NULL \
-        AND (image.upload_date >= %s AND image.upload_date < %s) \
-        AND task.assignee_keycloak_id = %s"
+        query = TASKING_SUMMARY_IMAGE_QUERY + TASKING_SUMMARY_ASSIGNEE_FILTER
         return self.db.executeSelect(query, (start_date, end_date, assignee_keycloak_id))
 
+    def streamTaskingSummaryImageData(self, start_date, end_date, assignee_keycloak_id=None):
+        '''
+        Function:   Streams tasking summary image data from a server-side cursor, ordered by upload date
+        Input:      start_date, end_date, assignee_keycloak_id to only include images with a task for that user
+        Output:     generator with the same rows as getTaskingSummaryImageData
+        '''
+        query = TASKING_SUMMARY_IMAGE_QUERY
+        values = (start_date, end_date)
+        if assignee_keycloak_id:
+            query += TASKING_SUMMARY_ASSIGNEE_FILTER
+            values += (assignee_keycloak_id, )
+        query += " ORDER BY image.upload_date, image.scvu_image_id"
+        yield from self.db.executeSelectStream(query, values)
+
     def getTaskingSummaryAreaData(self, image_id):
         '''
         Function:   Gets data for tasking summary area
@@ -395,13 +402,13 @@ class TaskingQueries:
         Function:   Updates scvu_image_id, report_id, image_category_id, image_quality, cloud_cover_id, target_tracing of image
         Input:      scvu_image_id, report_name, image_category_name, image_quality_name, cloud_cover_name, target_tracing
         Output:     NIL
+        Note:       a changed report on a completed image is moved in report_daily_rollup in the same statement
         '''
-        query = f"UPDATE image SET report_id = (SELECT id FROM report WHERE name = %s OR (COALESCE(%s,'') = '' AND name is null)), \
+        query = update_image_with_rollup("report_id = (SELECT id FROM report WHERE name = %s OR (COALESCE(%s,'') = '' AND name is null)), \
         image_category_id = (SELECT id FROM image_category WHERE name = %s OR (COALESCE(%s,'') = '' AND name is null)), \
         image_quality = %s, \
         cloud_cover_id = (SELECT id FROM cloud_cover WHERE name = %s OR (COALESCE(%s,'') = '' AND name is null)), \
-        target_tracing = %s \
-        WHERE scvu_image_id = %s"
+        target_tracing = %s", "scvu_image_id = %s")
         self.db.executeUpdate(query, (report_name, report_name, image_category_name, image_category_name, image_quality_name, cloud_cover_name, cloud_cover_name, target_tracing, scvu_image_id))
 
     def updateTaskingSummaryTask(self, scvu_task_id, remarks):
@@ -0,0 +1,304 @@
+'''
+In-process metrics rendered in the Prometheus text exposition format (version 0.0.4).
+
+Metrics are module-level singletons so any layer (middleware, Database, Keycloak clients,
+services) can record into them without threading a registry through constructors.
+'''
+import bisect
+import contextvars
+import math
+import threading
+import time
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(_Metric):
+    '''
+    Gauge whose value is either set directly or read from a callback at scrape time.
+    '''
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        self._functions = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, fn, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                values[key] = fn()
+            except Exception:
+                continue
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+            if value is not None
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        '''
+        Function:   Renders every registered metric in the Prometheus text format
+        Output:     str
+        '''
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            samples = metric.render()
+            if samples:
+                lines.extend(metric.header())
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "xbi_http_requests_total", "HTTP requests by route template and status code", ("method", "route", "status")
+)
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "xbi_http_request_duration_seconds", "HTTP request latency by route template", ("method", "route")
+)
+HTTP_REQUEST_DB_TIME = REGISTRY.histogram(
+    "xbi_http_request_db_seconds", "Time each HTTP request spent holding database connections", ("method", "route")
+)
+DB_QUERIES = REGISTRY.counter("xbi_db_queries_total", "Database connection checkouts")
+DB_POOL_IN_USE = REGISTRY.gauge("xbi_db_pool_connections_in_use", "Database pool connections checked out")
+DB_POOL_MAX = REGISTRY.gauge("xbi_db_pool_connections_max", "Database pool size limit")
+DB_POOL_EXHAUSTED = REGISTRY.counter("xbi_db_pool_exhausted_total", "Connection checkouts rejected because the pool was full")
+KEYCLOAK_REQUESTS = REGISTRY.counter(
+    "xbi_keycloak_requests_total", "Keycloak HTTP calls by client and endpoint", ("client", "endpoint", "status")
+)
+KEYCLOAK_REQUEST_DURATION = REGISTRY.histogram(
+    "xbi_keycloak_request_duration_seconds", "Keycloak HTTP call latency by client and endpoint", ("client", "endpoint")
+)
+CACHE_LOOKUPS = REGISTRY.counter("xbi_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result"))
+CACHE_HIT_RATIO = REGISTRY.gauge("xbi_cache_hit_ratio", "Lifetime hit ratio per cache", ("cache",))
+INGEST_IMAGES = REGISTRY.counter("xbi_ingest_images_total", "Ingested images by source and result", ("source", "result"))
+INGEST_AREAS = REGISTRY.counter("xbi_ingest_areas_total", "Ingested image areas by source", ("source",))
+INGEST_DURATION = REGISTRY.histogram(
+    "xbi_ingest_duration_seconds", "Wall time per ingest batch", ("source",),
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+
+CACHE_NAMES = ("token", "introspection", "user_directory")
+
+
+def record_cache_lookup(cache, hits=0, misses=0):
+    if hits:
+        CACHE_LOOKUPS.inc(hits, cache=cache, result="hit")
+    if misses:
+        CACHE_LOOKUPS.inc(misses, cache=cache, result="miss")
+
+
+def _cache_hit_ratio(cache):
+    hits = CACHE_LOOKUPS.get(cache=cache, result="hit")
+    total = hits + CACHE_LOOKUPS.get(cache=cache, result="miss")
+    return hits / total if total else None
+
+
+for _cache in CACHE_NAMES:
+    CACHE_HIT_RATIO.set_function(lambda cache=_cache: _cache_hit_ratio(cache), cache=_cache)
+
+
+# Per-request database time. The middleware installs a mutable accumulator; threadpool
+# hops copy the context, so Database adds to the same accumulator from worker threads.
+_request_db_time = contextvars.ContextVar("xbi_request_db_time", default=None)
+
+
+def start_request_db_timer():
+    accumulator = [0.0]
+    return _request_db_time.set(accumulator), accumulator
+
+
+def reset_request_db_timer(token):
+    _request_db_time.reset(token)
+
+
+def record_db_time(seconds):
+    DB_QUERIES.inc()
+    accumulator = _request_db_time.get()
+    if accumulator is not None:
+        accumulator[0] += seconds
+
+
+def keycloak_endpoint(path):
+    '''
+    Function:   Collapses a Keycloak URL path into a low-cardinality endpoint template
+    Input:      URL path, e.g. /admin/realms/xbi-tasking/users/<uuid>
+    Output:     template, e.g. admin/users/{id}
+    '''
+    parts = [part for part in path.split("/") if part]
+    prefix = ""
+    if "realms" in parts:
+        index = parts.index("realms")
+        prefix = "admin/" if index > 0 and parts[index - 1] == "admin" else ""
+        parts = parts[index + 2:]
+    if parts[:2] == ["protocol", "openid-connect"]:
+        parts = parts[2:]
+    templated = []
+    for index, part in enumerate(parts):
+        previous = parts[index - 1] if index else None
+        if previous in ("users", "clients", "groups"):
+            part = "{id}"
+        elif previous == "roles":
+            part = "{role}"
+        templated.append(part)
+    return prefix + "/".join(templated)
+
+
+def record_keycloak_call(client, path, status, seconds):
+    endpoint = keycloak_endpoint(path)
+    KEYCLOAK_REQUESTS.inc(client=client, endpoint=endpoint, status=status)
+    KEYCLOAK_REQUEST_DURATION.observe(seconds, client=client, endpoint=endpoint)
+
+
+def httpx_event_hooks(client):
+    '''
+    Function:   Builds httpx.AsyncClient event hooks that record Keycloak call metrics
+    Input:      client label, e.g. "auth" or "admin_async"
+    Output:     dict suitable for httpx.AsyncClient(event_hooks=...)
+    '''
+    async def on_request(request):
+        request.extensions["xbi_started_at"] = time.perf_counter()
+
+    async def on_response(response):
+        started_at = response.request.extensions.get("xbi_started_at")
+        if started_at is not None:
+            record_keycloak_call(client, response.request.url.path, response.status_code, time.perf_counter() - started_at)
+
+    return {"request": [on_request], "response": [on_response]}
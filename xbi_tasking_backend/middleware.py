@@ -0,0 +1,241 @@
+import logging
+import time
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+import tracing
+from profiling import PROFILE_HEADER, PROFILE_ID_HEADER, ProfileStore, RequestProfiler
+from security import KEYCLOAK_ENABLED, is_admin_user
+
+
+logger = logging.getLogger("xbi_tasking_backend.middleware")
+
+# Paths that don't require authentication: exact matches, plus anything under a prefix
+AUTH_EXEMPT_PATHS = frozenset([
+    "/docs",
+    "/redoc",
+    "/openapi.json",
+    "/",
+    "/auth/login",
+    "/auth/callback",
+    "/auth/logout",
+    "/auth/refresh",
+    "/metrics",
+])
+AUTH_EXEMPT_PREFIXES = ("/static",)
+
+ANONYMOUS_USER = {"sub": "anonymous", "preferred_username": "anonymous"}
+
+
+def _unauthorized(detail):
+    return JSONResponse(
+        status_code=401,
+        content={"detail": detail},
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _get_header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class KeycloakAuthMiddleware:
+    '''
+    ASGI middleware that validates Keycloak tokens for every HTTP request except OPTIONS
+    (CORS preflight) and the exempt paths, and stores the user info in request.state.user.
+    '''
+    def __init__(self, app, exempt_paths=AUTH_EXEMPT_PATHS, exempt_prefixes=AUTH_EXEMPT_PREFIXES):
+        self.app = app
+        self.exempt_paths = frozenset(exempt_paths)
+        self.exempt_prefixes = tuple(exempt_prefixes)
+
+    def is_exempt(self, path):
+        return path in self.exempt_paths or path.startswith(self.exempt_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or self.is_exempt(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        if not KEYCLOAK_ENABLED:
+            state["user"] = dict(ANONYMOUS_USER)
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        auth_header = _get_header(scope, b"authorization")
+        if not auth_header or not auth_header.startswith("Bearer "):
+            logger.warning("Missing or invalid Authorization header for %s", path)
+            response = _unauthorized("Not authenticated. Missing or invalid Authorization header.")
+            await response(scope, receive, send)
+            return
+
+        token = auth_header.split(" ")[1]
+        if not token:
+            logger.warning("Empty token in Authorization header for %s", path)
+            await _unauthorized("Not authenticated. Empty token.")(scope, receive, send)
+            return
+
+        try:
+            token_info = await scope["app"].state.keycloak_auth.verify_token(token)
+        except HTTPException as e:
+            logger.warning("HTTPException in middleware for %s: %s", path, e.detail)
+            response = JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers=e.headers)
+            await response(scope, receive, send)
+            return
+
+        if not token_info:
+            logger.warning("Token validation failed for %s", path)
+            await _unauthorized("Invalid or expired token")(scope, receive, send)
+            return
+
+        # Attach user info to request state for use in route handlers
+        state["user"] = token_info
+        await self.app(scope, receive, send)
+
+
+class RequestTimingMiddleware:
+    '''
+    ASGI middleware that records request count, latency and database time per route template,
+    and logs request durations when debug logging is enabled.
+    '''
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        db_timer, db_time = metrics.start_request_db_timer()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            metrics.reset_request_db_timer(db_timer)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            metrics.HTTP_REQUESTS.inc(method=method, route=route_path, status=status_code)
+            metrics.HTTP_REQUEST_DURATION.observe(duration, method=method, route=route_path)
+            metrics.HTTP_REQUEST_DB_TIME.observe(db_time[0], method=method, route=route_path)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("%s %s completed in %.2fms", method, scope["path"], duration * 1000)
+
+
+class ProfilingMiddleware:
+    '''
+    ASGI middleware that profiles requests from admin users carrying an X-Profile header.
+    Must sit inside KeycloakAuthMiddleware so request.state.user is populated. The profile is
+    stored before the last body chunk is sent, and its id is returned in X-Profile-Id.
+    '''
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requested = (_get_header(scope, PROFILE_HEADER.encode("latin-1")) or "").strip().lower()
+        user = scope.get("state", {}).get("user")
+        if requested in ("", "0", "false") or not user or not is_admin_user(user):
+            await self.app(scope, receive, send)
+            return
+
+        profiler = RequestProfiler()
+        if not profiler.start():
+            logger.info("Profiling skipped for %s: another request is being profiled", scope["path"])
+            await self.app(scope, receive, send)
+            return
+
+        store = scope["app"].state.profile_store
+        profile_id = ProfileStore.new_id()
+        created_at = time.time()
+        status_code = 500
+        finished = False
+
+        async def finish():
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            profiler.stop()
+            meta = {
+                "created_at": created_at,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": status_code,
+                "user": user.get("preferred_username"),
+                "duration_ms": round(profiler.duration * 1000, 3),
+            }
+            try:
+                await run_in_threadpool(store.save, profile_id, profiler.stats(), meta)
+            except Exception:
+                logger.exception("Could not store profile %s", profile_id)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_ID_HEADER.lower().encode("latin-1"), profile_id.encode("latin-1")))
+                message = dict(message, headers=headers)
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                await finish()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            await finish()
+
+
+class TracingMiddleware:
+    '''
+    ASGI middleware that opens the root tracing span for each sampled request, returns its id
+    in X-Trace-Id and hands the finished trace to app.state.trace_recorder.
+    '''
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        recorder = scope["app"].state.trace_recorder if scope["type"] == "http" else None
+        if recorder is None or not recorder.should_sample():
+            await self.app(scope, receive, send)
+            return
+
+        with tracing.start_trace(f"{scope['method']} {scope['path']}", method=scope["method"], path=scope["path"]) as root:
+            trace_id = root.trace.trace_id.encode("latin-1")
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    root.set_attribute("status", message["status"])
+                    headers = list(message.get("headers", []))
+                    headers.append((tracing.TRACE_ID_HEADER.lower().encode("latin-1"), trace_id))
+                    message = dict(message, headers=headers)
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if getattr(route, "path", None):
+                    root.name = root.trace.name = f"{scope['method']} {route.path}"
+        recorder.record(root.trace)
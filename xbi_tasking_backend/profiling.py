@@ -0,0 +1,186 @@
+'''
+On-demand request profiling for admins.
+
+A request carrying the PROFILE_HEADER from an admin user runs under cProfile. Work
+offloaded with run_blocking is profiled in its worker thread and merged into the same
+profile. Profiles are kept in a bounded on-disk ring and served by routers/profiles.py.
+'''
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+
+
+logger = logging.getLogger("xbi_tasking_backend.profiling")
+
+PROFILE_HEADER = "x-profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+DEFAULT_RING_SIZE = 50
+
+_PROFILE_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+# Worker-thread profiles collected for the request currently being profiled
+_worker_profiles = contextvars.ContextVar("xbi_worker_profiles", default=None)
+
+
+class ProfileStore:
+    '''
+    Bounded on-disk ring of request profiles: <id>.prof (pstats dump) plus <id>.json metadata.
+    Once more than max_profiles are stored, the oldest are deleted.
+    '''
+    def __init__(self, directory, max_profiles=DEFAULT_RING_SIZE):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv("PROFILE_DIR", os.path.join(os.getcwd(), "profiles")),
+            int(os.getenv("PROFILE_RING_SIZE", str(DEFAULT_RING_SIZE))),
+        )
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def is_valid_id(profile_id):
+        return bool(profile_id and _PROFILE_ID_RE.match(profile_id))
+
+    def _path(self, profile_id, extension):
+        if not self.is_valid_id(profile_id):
+            raise ValueError(f"Invalid profile id: {profile_id}")
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+    def profile_path(self, profile_id):
+        path = self._path(profile_id, "prof")
+        return path if os.path.exists(path) else None
+
+    def save(self, profile_id, stats, meta):
+        '''
+        Function:   Writes a profile and its metadata, then trims the ring
+        Input:      profile id, pstats.Stats, dict of request metadata
+        Output:     metadata dict as stored
+        '''
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            stats.dump_stats(self._path(profile_id, "prof"))
+            meta = dict(meta, id=profile_id, total_calls=stats.total_calls, total_time=stats.total_tt)
+            with open(self._path(profile_id, "json"), "w") as f:
+                json.dump(meta, f)
+            self._trim()
+        return meta
+
+    def _trim(self):
+        metas = self._list_unlocked()
+        for meta in metas[self.max_profiles:]:
+            for extension in ("prof", "json"):
+                try:
+                    os.remove(self._path(meta["id"], extension))
+                except FileNotFoundError:
+                    pass
+
+    def _list_unlocked(self):
+        if not os.path.isdir(self.directory):
+            return []
+        metas = []
+        for name in os.listdir(self.directory):
+            profile_id, extension = os.path.splitext(name)
+            if extension != ".json" or not self.is_valid_id(profile_id):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    metas.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        metas.sort(key=lambda meta: meta.get("created_at", 0), reverse=True)
+        return metas
+
+    def list(self):
+        '''
+        Function:   Lists stored profiles, newest first
+        Output:     list of metadata dicts
+        '''
+        with self._lock:
+            return self._list_unlocked()
+
+    def render_text(self, profile_id, sort="cumulative", limit=50):
+        path = self.profile_path(profile_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+class RequestProfiler:
+    '''
+    Profiles one request on the event loop thread. Only one request is profiled at a
+    time, since cProfile on the loop thread also sees every coroutine running alongside it.
+    '''
+    _busy = threading.Lock()
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.worker_profiles = []
+        self.started_at = None
+        self.duration = None
+
+    def start(self):
+        if not RequestProfiler._busy.acquire(blocking=False):
+            return False
+        try:
+            self.profile.enable()
+        except ValueError:
+            RequestProfiler._busy.release()
+            return False
+        # The contextvar lives in this request's context, so it needs no reset afterwards
+        _worker_profiles.set(self.worker_profiles)
+        self.started_at = time.perf_counter()
+        return True
+
+    def stop(self):
+        self.profile.disable()
+        self.duration = time.perf_counter() - self.started_at
+        RequestProfiler._busy.release()
+
+    def stats(self):
+        stats = pstats.Stats(self.profile)
+        for worker_profile in self.worker_profiles:
+            stats.add(worker_profile)
+        return stats
+
+
+def profile_blocking(func):
+    '''
+    Function:   Wraps a function about to run in the threadpool so it is profiled when the
+                calling request is being profiled
+    Input:      callable
+    Output:     callable (func itself when no profile is active)
+    '''
+    collected = _worker_profiles.get()
+    if collected is None:
+        return func
+
+    def run_profiled(*args, **kwargs):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler owns this interpreter/thread; run unprofiled
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            collected.append(profile)
+
+    return run_profiled
@@ -3,12 +3,11 @@ import os
 import secrets
 import urllib.parse
 
-import httpx
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, Request
 from fastapi.responses import RedirectResponse
 
 from api_utils import error_response
-from security import KEYCLOAK_ENABLED
+from security import KEYCLOAK_ENABLED, get_current_user, is_admin_user
 
 
 logger = logging.getLogger("xbi_tasking_backend.auth")
@@ -128,112 +127,112 @@ async def auth_callback(request: Request, code: str = None, state: str = None, e
                 },
             )
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                token_url,
-                data={
-                    "grant_type": "authorization_code",
-                    "code": code,
-                    "redirect_uri": str(redirect_uri),
-                    "client_id": client_id,
-                    "client_secret": client_secret,
-                },
-                timeout=10.0,
-            )
-            
-            logger.debug("auth_callback response status: %s", response.status_code)
+        client = request.app.state.keycloak_auth.http
+        response = await client.post(
+            token_url,
+            data={
+                "grant_type": "authorization_code",
+                "code": code,
+                "redirect_uri": str(redirect_uri),
+                "client_id": client_id,
+                "client_secret": client_secret,
+            },
+            timeout=10.0,
+        )
+        
+        logger.debug("auth_callback response status: %s", response.status_code)
+        
+        if response.status_code != 200:
+            error_detail = response.text
+            logger.warning("auth_callback token exchange failed: %s", response.status_code)
+            logger.warning("auth_callback error response: %s", error_detail)
             
-            if response.status_code != 200:
-                error_detail = response.text
-                logger.warning("auth_callback token exchange failed: %s", response.status_code)
-                logger.warning("auth_callback error response: %s", error_detail)
+            # Parse error to provide helpful message
+            try:
+                error_json = response.json()
+                error_type = error_json.get("error", "unknown")
+                error_desc = error_json.get("error_description", error_detail)
                 
-                # Parse error to provide helpful message
-                try:
-                    error_json = response.json()
-                    error_type = error_json.get("error", "unknown")
-                    error_desc = error_json.get("error_description", error_detail)
-                    
-                    if error_type == "unauthorized_client":
-                        help_msg = (
-                            "The client secret in dev_server.config doesn't match Keycloak.\n"
-                            "To fix:\n"
-                            "1. Go to Keycloak Admin Console: http://localhost:8080/admin\n"
-                            "2. Navigate to: Clients → xbi-tasking-backend → Credentials tab\n"
-                            "3. Copy the 'Client secret' value\n"
-                            "4. Update 'client_secret' in xbi_tasking_backend/dev_server.config\n"
-                            "5. Restart the backend server"
-                        )
-                    else:
-                        help_msg = f"Error: {error_desc}"
-                    
-                    return error_response(
-                        500,
-                        error_desc,
-                        "token_exchange_failed",
-                        {
-                            "error_type": error_type,
-                            "status_code": response.status_code,
-                            "help": help_msg,
-                        },
-                    )
-                except Exception:
-                    return error_response(
-                        500,
-                        error_detail,
-                        "token_exchange_failed",
-                        {
-                            "status_code": response.status_code,
-                            "help": "Check that the client_secret in dev_server.config matches the Client secret in Keycloak (Clients → xbi-tasking-backend → Credentials tab)",
-                        },
+                if error_type == "unauthorized_client":
+                    help_msg = (
+                        "The client secret in dev_server.config doesn't match Keycloak.\n"
+                        "To fix:\n"
+                        "1. Go to Keycloak Admin Console: http://localhost:8080/admin\n"
+                        "2. Navigate to: Clients → xbi-tasking-backend → Credentials tab\n"
+                        "3. Copy the 'Client secret' value\n"
+                        "4. Update 'client_secret' in xbi_tasking_backend/dev_server.config\n"
+                        "5. Restart the backend server"
                     )
-            
-            token_data = response.json()
-            access_token = token_data.get("access_token")
-            refresh_token = token_data.get("refresh_token")
-            id_token = token_data.get("id_token")
-            
-            if not access_token:
-                logger.error("auth_callback: no access token in response")
+                else:
+                    help_msg = f"Error: {error_desc}"
+                
                 return error_response(
                     500,
-                    "Token exchange succeeded but no access token received",
-                    "no_access_token",
+                    error_desc,
+                    "token_exchange_failed",
+                    {
+                        "error_type": error_type,
+                        "status_code": response.status_code,
+                        "help": help_msg,
+                    },
                 )
+            except Exception:
+                return error_response(
+                    500,
+                    error_detail,
+                    "token_exchange_failed",
+                    {
+                        "status_code": response.status_code,
+                        "help": "Check that the client_secret in dev_server.config matches the Client secret in Keycloak (Clients → xbi-tasking-backend → Credentials tab)",
+                    },
+                )
+        
+        token_data = response.json()
+        access_token = token_data.get("access_token")
+        refresh_token = token_data.get("refresh_token")
+        id_token = token_data.get("id_token")
+        
+        if not access_token:
+            logger.error("auth_callback: no access token in response")
+            return error_response(
+                500,
+                "Token exchange succeeded but no access token received",
+                "no_access_token",
+            )
+        
+        logger.info("auth_callback token exchange successful")
+        
+        # Decode token to get user info
+        from jose import jwt
+        try:
+            token_for_claims = id_token or access_token
+            if not token_for_claims:
+                raise ValueError("No token available for user info")
+            token_info = jwt.get_unverified_claims(token_for_claims)
+            username = token_info.get("preferred_username") or token_info.get("sub", "user")
             
-            logger.info("auth_callback token exchange successful")
+            logger.debug("auth_callback username: %s", username)
+            
+            # Redirect to frontend with tokens in URL fragment (more secure than query params)
+            # Frontend will extract tokens from fragment
+            fragment_params = {
+                "access_token": access_token,
+                "refresh_token": refresh_token,
+                "id_token": id_token,
+                "username": username,
+            }
+            
+            # Build redirect URL with fragment
+            redirect_url = f"{frontend_url}#{urllib.parse.urlencode(fragment_params)}"
+            logger.debug("auth_callback redirecting to frontend")
+            response = RedirectResponse(url=redirect_url)
+            response.delete_cookie("kc_state")
+            return response
+            
+        except Exception as e:
+            logger.exception("auth_callback token decode failed: %s", e)
+            return error_response(500, str(e), "token_decode_failed")
             
-            # Decode token to get user info
-            from jose import jwt
-            try:
-                token_for_claims = id_token or access_token
-                if not token_for_claims:
-                    raise ValueError("No token available for user info")
-                token_info = jwt.get_unverified_claims(token_for_claims)
-                username = token_info.get("preferred_username") or token_info.get("sub", "user")
-                
-                logger.debug("auth_callback username: %s", username)
-                
-                # Redirect to frontend with tokens in URL fragment (more secure than query params)
-                # Frontend will extract tokens from fragment
-                fragment_params = {
-                    "access_token": access_token,
-                    "refresh_token": refresh_token,
-                    "id_token": id_token,
-                    "username": username,
-                }
-                
-                # Build redirect URL with fragment
-                redirect_url = f"{frontend_url}#{urllib.parse.urlencode(fragment_params)}"
-                logger.debug("auth_callback redirecting to frontend")
-                response = RedirectResponse(url=redirect_url)
-                response.delete_cookie("kc_state")
-                return response
-                
-            except Exception as e:
-                logger.exception("auth_callback token decode failed: %s", e)
-                return error_response(500, str(e), "token_decode_failed")
-                
     except Exception as e:
         logger.exception("auth_callback token exchange error: %s", e)
         return error_response(500, str(e), "token_exchange_error")
@@ -263,20 +262,20 @@ async def auth_refresh(request: Request):
 
     token_url = f"{keycloak_url}/realms/{realm}/protocol/openid-connect/token"
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            token_url,
-            data={
-                "grant_type": "refresh_token",
-                "refresh_token": refresh_token,
-                "client_id": client_id,
-                "client_secret": client_secret,
-            },
-            timeout=10.0,
-        )
-        if response.status_code != 200:
-            return error_response(401, response.text, "refresh_failed")
-        return response.json()
+    client = request.app.state.keycloak_auth.http
+    response = await client.post(
+        token_url,
+        data={
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+            "client_id": client_id,
+            "client_secret": client_secret,
+        },
+        timeout=10.0,
+    )
+    if response.status_code != 200:
+        return error_response(401, response.text, "refresh_failed")
+    return response.json()
 
 
 @router.get("/auth/logout")
@@ -304,3 +303,13 @@ async def auth_logout(request: Request):
     logout_url_with_params = f"{logout_url}?{urllib.parse.urlencode(params)}"
     
     return RedirectResponse(url=logout_url_with_params)
+
+
+@router.get("/auth/stats")
+async def auth_stats(request: Request, user: dict = Depends(get_current_user)):
+    """
+    Token verification cache and introspection circuit breaker counters for ops.
+    """
+    if not is_admin_user(user):
+        return error_response(403, "Insufficient permissions", "insufficient_permissions")
+    return request.app.state.keycloak_auth.stats()
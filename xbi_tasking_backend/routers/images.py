@@ -15,7 +15,10 @@ router = APIRouter(prefix="/images", tags=["images"])
 @router.post("/insertDSTAData")
 async def insert_dsta_data(request: Request, file: UploadFile, user: dict = Depends(get_current_user)):
     '''
-    Function: Imports data from DSTA (in a json file) and inserts it into db
+    Function: Imports data from DSTA (in a json file) and inserts it into db in the background
+    Output: {'success': True, 'job_id': <str>, 'status': <str>}; poll /images/ingestJobs/<job_id> for progress
+            Re-uploading a file that is still being ingested returns that job; re-uploading one that was
+            fully ingested returns a job that has already succeeded without reading the file
     
     Input: (as a file)
 
@@ -78,23 +81,45 @@ async def insert_dsta_data(request: Request, file: UploadFile, user: dict = Depe
         return error_response(400, "File must be JSON format", "invalid_file_type")
     try:
         try:
-            json_data = json.loads(contents.decode("utf-8"))
+            # The ingest service notifies the user when the job finishes
+            job_id, status = await run_blocking(request.app.state.ingest_service.submit_dsta_file, contents, file.filename, user)
         except UnicodeDecodeError:
             return error_response(400, "JSON file must be UTF-8 encoded", "invalid_encoding")
         except json.JSONDecodeError as e:
             return error_response(400, "Invalid JSON file", "invalid_json", {"error": str(e)})
-        result = await run_blocking(request.app.state.image_service.insert_dsta_data, json_data)
-        if result.get("success"):
-            images = result.get("images_inserted")
-            areas = result.get("areas_inserted")
-            meta = f"Just now · {images} images, {areas} areas"
-            request.app.state.notification_service.push("Upload completed", meta, user)
-        return result
+        if job_id is None:
+            return error_response(503, "Too many uploads in progress, please try again shortly", "ingest_busy")
+        return {"success": True, "job_id": job_id, "status": status}
     except Exception as e:
         request.app.state.notification_service.push("Upload failed", "Just now · Upload error", user)
         return error_response(500, "Failed to insert data", "insert_failed", {"error": str(e)})
 
 
+@router.get("/ingestJobs/{job_id}")
+async def get_ingest_job(request: Request, job_id: str, user: dict = Depends(get_current_user)):
+    '''
+    Function: Gets the status and progress of a DSTA upload
+    Output:
+
+        {
+            'job_id': <str>,
+            'status': 'queued' | 'running' | 'succeeded' | 'failed',
+            'total_images': <int>,
+            'images_processed': <int>,
+            'images_inserted': <int>,
+            'images_existing': <int>,
+            'areas_inserted': <int>,
+            'error_count': <int>,
+            'message': <str>,
+            ...
+        }
+    '''
+    job = await run_blocking(request.app.state.ingest_service.get_job, job_id)
+    if job is None:
+        return error_response(404, "Ingest job not found", "ingest_job_not_found")
+    return job
+
+
 @router.post("/insertTTGData")
 async def insert_ttg_data(request: Request, payload: InsertTTGPayload, user: dict = Depends(get_current_user)) -> StatusResponse:
     '''
@@ -209,7 +209,5 @@ async def set_opsv_areas(request: Request, payload: OpsvAreasPayload) -> StatusR
         }
         
     '''
-    result = await run_blocking(request.app.state.lookup_service.set_opsv_areas, model_to_dict(payload))
-    if result is None:
-        return StatusResponse(status="success", message="OpsV areas updated")
-    return result
+    changed = await run_blocking(request.app.state.lookup_service.set_opsv_areas, model_to_dict(payload))
+    return StatusResponse(status="success", message=f"OpsV areas updated ({changed} changed)")
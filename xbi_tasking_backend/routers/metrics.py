@@ -0,0 +1,28 @@
+import hmac
+import os
+
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+
+import metrics
+from api_utils import error_response
+
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    '''
+    Function: Prometheus scrape endpoint (text exposition format)
+
+    Not behind Keycloak so scrapers can reach it; it requires "Authorization: Bearer <METRICS_TOKEN>"
+    and is not served at all unless METRICS_TOKEN is set.
+    '''
+    expected_token = os.getenv("METRICS_TOKEN")
+    if not expected_token:
+        return error_response(404, "Not Found")
+    auth_header = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(auth_header, f"Bearer {expected_token}"):
+        return error_response(401, "Invalid metrics token", "invalid_metrics_token")
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
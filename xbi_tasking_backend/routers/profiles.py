@@ -0,0 +1,56 @@
+import logging
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import FileResponse, PlainTextResponse
+
+from api_utils import error_response, run_blocking
+from security import get_current_user, is_admin_user
+
+
+logger = logging.getLogger("xbi_tasking_backend.profiles")
+router = APIRouter(prefix="/profiles", tags=["profiles"])
+
+
+@router.get("")
+async def list_profiles(request: Request, user: dict = Depends(get_current_user)):
+    '''
+    Function: Lists stored request profiles, newest first (admin only)
+
+    Send any request with the header "X-Profile: 1" as an admin to record a profile;
+    its id is returned in the X-Profile-Id response header.
+
+    Output:
+
+        {
+            'profiles': [{'id', 'created_at', 'method', 'path', 'query', 'status', 'user', 'duration_ms', 'total_calls', 'total_time'}]
+        }
+    '''
+    if not is_admin_user(user):
+        return error_response(403, "Insufficient permissions", "insufficient_permissions")
+    return {"profiles": await run_blocking(request.app.state.profile_store.list)}
+
+
+@router.get("/{profile_id}")
+async def get_profile(request: Request, profile_id: str, format: str = "prof", user: dict = Depends(get_current_user)):
+    '''
+    Function: Downloads a stored profile (admin only)
+
+    Input: format "prof" (default) returns the pstats dump for snakeviz/pstats;
+           format "text" returns the top functions by cumulative time
+    '''
+    if not is_admin_user(user):
+        return error_response(403, "Insufficient permissions", "insufficient_permissions")
+    store = request.app.state.profile_store
+    if not store.is_valid_id(profile_id):
+        return error_response(400, "Invalid profile id", "invalid_profile_id")
+
+    if format == "text":
+        text = await run_blocking(store.render_text, profile_id)
+        if text is None:
+            return error_response(404, "Profile not found", "profile_not_found")
+        return PlainTextResponse(text)
+
+    path = store.profile_path(profile_id)
+    if path is None:
+        return error_response(404, "Profile not found", "profile_not_found")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
@@ -1,10 +1,13 @@
 import os
 
-from fastapi import APIRouter, Request
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 
 from api_utils import model_to_dict, run_blocking
-from schemas import DateRangePayload, KeyValueMapResponse
+from main_classes.ExcelGenerator import XLSX_MEDIA_TYPE
+from schemas import DateRangePayload, ExportPayload, KeyValueMapResponse
+from security import get_current_user
 
 
 router = APIRouter(prefix="/reports", tags=["reports"])
@@ -70,5 +73,70 @@ async def get_xbi_report_data_for_excel(request: Request, payload: DateRangePayl
             'End Date': '2024-04-05T16:00:00.000Z'
         }
     '''
-    excel_file_path = await run_blocking(request.app.state.report_service.get_xbi_report_data_for_excel, model_to_dict(payload))
-    return FileResponse(path=excel_file_path, filename=os.path.basename(excel_file_path))
+    workbook = await run_blocking(request.app.state.report_service.get_xbi_report_data_for_excel, model_to_dict(payload))
+    return Response(
+        content=workbook,
+        media_type=XLSX_MEDIA_TYPE,
+        headers={"Content-Disposition": 'attachment; filename="report.xlsx"'},
+    )
+
+
+async def _export_response(report_service, filename, headers, rows, file_format):
+    disposition = {"Content-Disposition": f'attachment; filename="{filename}.{file_format}"'}
+    if file_format == "csv":
+        # The rows are read from the database while the response is sent
+        return StreamingResponse(report_service.write_csv(headers, rows), media_type="text/csv", headers=disposition)
+    path = await run_blocking(report_service.write_xlsx, headers, rows)
+    return FileResponse(path, media_type=XLSX_MEDIA_TYPE, headers=disposition, background=BackgroundTask(os.remove, path))
+
+
+@router.post("/exportCompleteImageData")
+async def export_complete_image_data(request: Request, payload: ExportPayload, user: dict = Depends(get_current_user)):
+    '''
+    Function: exports the completed images grid as a CSV or xlsx file, read from the database row by row
+
+    Input:
+    
+        {
+            'Start Date': <datetime yyyy-mm-ddT16:00:00.000Z>,
+            'End Date': <datetime yyyy-mm-ddT16:00:00.000Z>,
+            'Format': 'csv' | 'xlsx' (default 'csv')
+        }
+    
+    Sample:
+    
+        {
+            'Start Date': '2024-04-04T16:00:00.000Z',
+            'End Date': '2024-04-05T16:00:00.000Z',
+            'Format': 'xlsx'
+        }
+    '''
+    report_service = request.app.state.report_service
+    headers, rows = report_service.export_complete_images(model_to_dict(payload), user)
+    return await _export_response(report_service, "complete_images", headers, rows, payload.file_format)
+
+
+@router.post("/exportTaskingSummaryData")
+async def export_tasking_summary_data(request: Request, payload: ExportPayload, user: dict = Depends(get_current_user)):
+    '''
+    Function: exports the tasking summary grid as a CSV or xlsx file, read from the database row by row
+
+    Input:
+    
+        {
+            'Start Date': <datetime yyyy-mm-ddT16:00:00.000Z>,
+            'End Date': <datetime yyyy-mm-ddT16:00:00.000Z>,
+            'Format': 'csv' | 'xlsx' (default 'csv')
+        }
+    
+    Sample:
+    
+        {
+            'Start Date': '2024-04-04T16:00:00.000Z',
+            'End Date': '2024-04-05T16:00:00.000Z',
+            'Format': 'csv'
+        }
+    '''
+    report_service = request.app.state.report_service
+    headers, rows = report_service.export_tasking_summary(model_to_dict(payload), user)
+    return await _export_response(report_service, "tasking_summary", headers, rows, payload.file_format)
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends, Request
+
+from api_utils import error_response
+from security import get_current_user, is_admin_user
+
+
+router = APIRouter(prefix="/traces", tags=["traces"])
+
+
+@router.get("")
+async def list_traces(request: Request, limit: int = 50, user: dict = Depends(get_current_user)):
+    '''
+    Function: Lists the most recent request traces, newest first (admin only)
+
+    Output:
+
+        {
+            'traces': [{'trace_id', 'name', 'start', 'duration_ms', 'status', 'span_count', 'dropped_spans'}]
+        }
+    '''
+    if not is_admin_user(user):
+        return error_response(403, "Insufficient permissions", "insufficient_permissions")
+    return {"traces": request.app.state.trace_recorder.list(limit=max(1, min(limit, 1000)))}
+
+
+@router.get("/{trace_id}")
+async def get_trace(request: Request, trace_id: str, user: dict = Depends(get_current_user)):
+    '''
+    Function: Returns one trace with all of its spans (admin only)
+
+    The trace id of any request is returned in its X-Trace-Id response header.
+    '''
+    if not is_admin_user(user):
+        return error_response(403, "Insufficient permissions", "insufficient_permissions")
+    trace = request.app.state.trace_recorder.get(trace_id)
+    if trace is None:
+        return error_response(404, "Trace not found", "trace_not_found")
+    return trace
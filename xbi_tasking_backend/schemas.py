@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel, Field, RootModel
 
 
@@ -8,6 +10,10 @@ class DateRangePayload(BaseModel):
     model_config = {"populate_by_name": True}
 
 
+class ExportPayload(DateRangePayload):
+    file_format: Literal["csv", "xlsx"] = Field("csv", alias="Format")
+
+
 class TaskIdsPayload(BaseModel):
     task_ids: list[int] = Field(..., alias="SCVU Task ID")
 
@@ -0,0 +1,73 @@
+import asyncio
+import datetime
+import logging
+
+from tracing import traced_class
+
+
+logger = logging.getLogger("xbi_tasking_backend.archive_service")
+
+
+@traced_class
+class ArchiveService:
+    '''
+    Background job that moves completed images older than the retention window, with their image
+    areas and tasks, into the archive tables. Each batch is its own short transaction, so the job
+    never holds locks on more than batch_size images at a time.
+    '''
+    def __init__(self, query_manager, retention_days=180, batch_size=500, interval_seconds=3600.0, enabled=False):
+        self.qm = query_manager
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.interval_seconds = interval_seconds
+        self.enabled = enabled
+        self._task = None
+
+    @classmethod
+    def from_config(cls, query_manager, config):
+        return cls(
+            query_manager,
+            retention_days=config.getArchiveRetentionDays(),
+            batch_size=config.getArchiveBatchSize(),
+            interval_seconds=config.getArchiveIntervalSeconds(),
+            enabled=config.getArchiveEnabled(),
+        )
+
+    def archive_completed_images(self, now=None, max_batches=None):
+        '''
+        Function: Archives completed images older than the retention window, one batch per transaction
+        Input: now to measure the window from, max_batches to stop after (None runs until nothing is left)
+        Output: number of images archived
+        '''
+        cutoff = (now or datetime.datetime.now()) - datetime.timedelta(days=self.retention_days)
+        total = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            archived = self.qm.archiveCompletedImages(cutoff, self.batch_size)
+            total += archived
+            batches += 1
+            if archived < self.batch_size:
+                break
+        if total:
+            logger.info("Archived %s completed images from before %s", total, cutoff)
+        return total
+
+    def start(self):
+        '''
+        Function: Schedules the job on the running event loop, every interval_seconds
+        '''
+        if self.enabled and self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.archive_completed_images)
+            except Exception as e:
+                logger.warning("Image archival failed: %s", e)
+            await asyncio.sleep(self.interval_seconds)
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import threading
+import time
+
+import httpx
+from jose import jwt
+
+from main_classes.AsyncKeycloakClient import AsyncKeycloakClient
+from tracing import traced_class
+
+
+logger = logging.getLogger("xbi_tasking_backend.async_keycloak_service")
+
+USER_LOOKUP_CONCURRENCY = 20
+
+
+@traced_class
+class AsyncKeycloakService:
+    '''
+    Async counterpart of KeycloakService on one pooled httpx.AsyncClient. The app currently reaches it
+    only through KeycloakAsyncBridge, from KeycloakService.get_users_by_ids.
+    '''
+    def __init__(self, client=None, config=None):
+        self.client = client or AsyncKeycloakClient(config=config)
+        self._admin_token = None
+        self._admin_token_exp = 0
+        self._admin_token_lock = None
+
+    async def get_admin_token(self):
+        if self._admin_token_lock is None:
+            self._admin_token_lock = asyncio.Lock()
+        async with self._admin_token_lock:
+            now = time.time()
+            if self._admin_token and now < (self._admin_token_exp - 10):
+                return self._admin_token
+
+            token = await self.client.get_admin_token()
+            token_exp = None
+            try:
+                claims = jwt.get_unverified_claims(token)
+                token_exp = claims.get("exp")
+            except Exception:
+                token_exp = None
+
+            self._admin_token = token
+            self._admin_token_exp = token_exp if token_exp else (now + 60)
+            return token
+
+    async def get_user_by_id(self, token, keycloak_user_id):
+        return await self.client.get_user_by_id(token, keycloak_user_id)
+
+    async def get_users_by_ids(self, token, keycloak_user_ids, concurrency=USER_LOOKUP_CONCURRENCY):
+        '''
+        Function:   Fetches many Keycloak users by ID with at most `concurrency` requests in flight
+        Input:      admin token, iterable of Keycloak user IDs
+        Output:     dict of Keycloak user ID -> user representation; IDs that fail to load are logged and left out
+        '''
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(user_id):
+            async with semaphore:
+                try:
+                    return user_id, await self.client.get_user_by_id(token, user_id)
+                except httpx.HTTPError as e:
+                    logger.warning("Could not resolve Keycloak user %s: %s", user_id, e)
+                    return user_id, None
+
+        user_ids = [user_id for user_id in dict.fromkeys(keycloak_user_ids or []) if user_id]
+        results = await asyncio.gather(*(fetch(user_id) for user_id in user_ids))
+        return {user_id: user for user_id, user in results if user is not None}
+
+    async def find_user_id(self, token, username):
+        return await self.client.find_user_id(token, username)
+
+    async def get_role(self, token, role_name):
+        return await self.client.get_role(token, role_name)
+
+    async def get_users_for_role(self, token, role_name):
+        return await self.client.get_users_for_role(token, role_name)
+
+    async def assign_realm_role(self, token, user_id, role_representation):
+        return await self.client.assign_realm_role(token, user_id, role_representation)
+
+    async def create_user(self, token, username, password):
+        return await self.client.create_user(token, username, password)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class KeycloakAsyncBridge:
+    '''
+    Runs an AsyncKeycloakService on a private event loop thread so synchronous code
+    (threadpool workers, KeycloakQueries) can use its concurrent fan-out.
+    '''
+    def __init__(self, config=None):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="keycloak-async-bridge", daemon=True)
+        self._thread.start()
+        self.service = self.run(self._create_service(config))
+
+    async def _create_service(self, config):
+        return AsyncKeycloakService(config=config)
+
+    def run(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def close(self):
+        if not self._loop.is_running():
+            return
+        self.run(self.service.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
@@ -1,21 +1,42 @@
 import datetime
 import logging
+import time
 import dateutil.parser
 from datetime import timedelta
+
+import metrics
 from formatters.image_formatter import (
     format_complete_image_area,
     format_complete_image_image,
 )
+from tracing import traced_class
 
 
 logger = logging.getLogger("xbi_tasking_backend.image_service")
 
+# insert_dsta_data reports its progress every this many images
+INGEST_PROGRESS_EVERY = 100
+
+
+def _int_img_id(image):
+    # imgIds are looked up in image_key (BIGINT); anything else goes through the per-image inserts
+    img_id = image.get('imgId') if isinstance(image, dict) else None
+    return img_id if type(img_id) is int else None
 
+
+@traced_class
 class ImageService:
     def __init__(self, query_manager):
         self.qm = query_manager
 
-    def insert_dsta_data(self, payload, auto_assign = True):
+    def insert_dsta_data(self, payload, auto_assign = True, progress=None, job_id=None):
+        '''
+        Function: Inserts the images of a DSTA upload with their areas, one transaction per image
+        Input: payload is the parsed DSTA file
+        Input: progress is called as progress(processed, inserted, existing, errors, areas) every INGEST_PROGRESS_EVERY images
+        Input: job_id of the ingest job, recorded against the images it inserts
+        Output: result dict with the counts and a summary message
+        '''
         image_count = 0
         area_count = 0
         errors = []
@@ -27,9 +48,22 @@ class ImageService:
                 "images_inserted": image_count,
                 "areas_inserted": area_count,
             }
+        started_at = time.perf_counter()
         try:
-            for image in payload['images']:
+            # Resolve every imgId in one query, so images that already exist cost nothing below
+            image_ids = {_int_img_id(image) for image in payload['images']}
+            image_ids.discard(None)
+            known_ids = self.qm.getExistingImageIds(image_ids)
+            for processed, image in enumerate(payload['images']):
+                if progress and processed and processed % INGEST_PROGRESS_EVERY == 0:
+                    progress(processed, image_count, len(existing_images), len(errors), area_count)
                 error_msg = None
+                if _int_img_id(image) in known_ids:
+                    existing_images.append({
+                        'image_id': image['imgId'],
+                        'image_file_name': image.get('imageFileName')
+                        })
+                    continue
                 try:
                     with self.qm.db.transaction():
                         self.qm.insertSensor(image['sensorName'])
@@ -38,7 +72,8 @@ class ImageService:
                             image['imageFileName'],
                             image['sensorName'],
                             dateutil.parser.isoparse(image['uploadDate']),
-                            dateutil.parser.isoparse(image['imageDateTime'])
+                            dateutil.parser.isoparse(image['imageDateTime']),
+                            job_id,
                         )
                         if image_inserted:
                             image_count += 1
@@ -70,9 +105,11 @@ class ImageService:
                         errors.append(error_msg)
                     logger.warning(error_msg)
             
+            self._record_ingest("dsta", started_at, image_count, len(existing_images), len(errors), area_count)
             result = {
                 "success": True,
                 "images_inserted": image_count,
+                "images_existing": len(existing_images),
                 "areas_inserted": area_count
             }
 
@@ -95,11 +132,19 @@ class ImageService:
                 "areas_inserted": area_count
             }
 
+    def _record_ingest(self, source, started_at, inserted, existing, errors, areas):
+        metrics.INGEST_IMAGES.inc(inserted, source=source, result="inserted")
+        metrics.INGEST_IMAGES.inc(existing, source=source, result="existing")
+        metrics.INGEST_IMAGES.inc(errors, source=source, result="error")
+        metrics.INGEST_AREAS.inc(areas, source=source)
+        metrics.INGEST_DURATION.observe(time.perf_counter() - started_at, source=source)
+
     def insert_ttg_data(self, payload):
         required_fields = ['imageFileName', 'sensorName', 'uploadDate', 'imageDateTime', 'areas']
         missing = [field for field in required_fields if field not in payload]
         if missing:
             raise ValueError(f"Missing required fields: {', '.join(missing)}")
+        started_at = time.perf_counter()
         with self.qm.db.transaction():
             self.qm.insertSensor(payload['sensorName'])
             scvu_image_id = self.qm.insertTTGImageReturnsId(
@@ -111,6 +156,7 @@ class ImageService:
             for area_name in payload['areas']:
                 self.qm.insertArea(area_name)
                 self.qm.insertImageAreaTTG(scvu_image_id, area_name)
+        self._record_ingest("ttg", started_at, 1, 0, 0, len(payload['areas']))
 
     def complete_images(self, payload, vetter_keycloak_id):
         current_datetime = datetime.datetime.today()
@@ -156,16 +202,18 @@ class ImageService:
             roles = user.get('roles', [])
 
         is_ii_user = account_type == 'II' or ('II' in roles and account_type != 'Senior II' and account_type != 'IA')
+        # Archived images are only read when the window starts before the archive boundary
+        include_archive = self.qm.reachesArchive(start_date)
         if is_ii_user and user:
-            imageData = self.qm.getImageDataForUser(start_date, end_date, user.get('sub'))
+            imageData = self.qm.getImageDataForUser(start_date, end_date, user.get('sub'), include_archive)
         else:
-            imageData = self.qm.getImageData(start_date, end_date)
+            imageData = self.qm.getImageData(start_date, end_date, include_archive)
         output = {}
         if not imageData:
             return output
 
         image_ids = [image[0] for image in imageData]
-        area_rows = self.qm.getImageAreaDataForImages(image_ids)
+        area_rows = self.qm.getImageAreaDataForImages(image_ids, include_archive)
         area_map = {}
         for row in area_rows:
             image_id, task_id, area_name, remarks, assignee = row
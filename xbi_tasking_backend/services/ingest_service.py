@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from main_classes.query_jobs import INGEST_JOB_COLUMNS
+from tracing import traced_class
+
+
+logger = logging.getLogger("xbi_tasking_backend.ingest_service")
+
+# Source recorded for jobs run by the standalone ingest worker (see ingest_worker.py)
+DROP_SOURCE = "dsta_drop"
+
+
+@traced_class
+class IngestService:
+    '''
+    Runs uploads in a bounded pool of background workers so the upload request returns at once.
+    Progress is kept in the ingest_job table, where any worker can answer a poll for it.
+    Jobs the standalone ingest worker finishes are picked up from the same table and notified.
+    '''
+    def __init__(self, query_manager, image_service, notification_service, workers=2, max_pending=8, notify_interval_seconds=10.0):
+        self.qm = query_manager
+        self.image_service = image_service
+        self.notification_service = notification_service
+        self.notify_interval_seconds = notify_interval_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        # Jobs queued or running in this process; further uploads are turned away until one finishes
+        self._slots = threading.BoundedSemaphore(max_pending)
+        # Jobs queued or running in this process, kept alive in ingest_job by heartbeat()
+        self._active = set()
+        self._active_lock = threading.Lock()
+        # Read from the database clock on the first poll, so drop jobs that finished before the app started are not notified
+        self._notified_until = None
+        self._task = None
+
+    @classmethod
+    def from_config(cls, query_manager, image_service, notification_service, config):
+        return cls(
+            query_manager,
+            image_service,
+            notification_service,
+            workers=config.getIngestWorkers(),
+            max_pending=config.getIngestMaxPending(),
+            notify_interval_seconds=config.getIngestNotifyIntervalSeconds(),
+        )
+
+    def submit_dsta_file(self, contents, file_name=None, user=None):
+        '''
+        Function: Queues an uploaded DSTA file for ingest, unless the same file is already in progress or ingested
+        Input: contents is the raw file, file_name and user are recorded with the job
+        Output: (job id, status); the job id is None if too many uploads are already queued or running
+        Note: raises UnicodeDecodeError or json.JSONDecodeError if the file is not UTF-8 JSON
+        '''
+        # Files are fingerprinted before parsing, so a repeated upload costs a hash and one lookup
+        content_hash = hashlib.sha256(contents).hexdigest()
+        duplicate = self.qm.findIngestJobByHash(content_hash)
+        if duplicate:
+            duplicate_of, status = duplicate
+            if status != "succeeded":
+                return duplicate_of, status
+            job_id = uuid.uuid4().hex
+            self.qm.recordDuplicateIngestJob(job_id, "dsta", file_name, user.get('sub') if user else None, duplicate_of)
+            self.notification_service.push("Upload skipped", "Just now · Already uploaded", user)
+            return job_id, "succeeded"
+        payload = json.loads(contents.decode("utf-8"))
+        return self.submit_dsta(payload, file_name, user, content_hash), "queued"
+
+    def submit_dsta(self, payload, file_name=None, user=None, content_hash=None):
+        '''
+        Function: Queues a parsed DSTA upload for ingest
+        Input: payload is the parsed DSTA file, file_name and user are recorded with the job
+        Input: content_hash is the sha256 of the file the payload was parsed from
+        Output: job id, or None if too many uploads are already queued or running
+        '''
+        if not self._slots.acquire(blocking=False):
+            return None
+        try:
+            job_id = uuid.uuid4().hex
+            images = payload.get('images') if isinstance(payload, dict) else None
+            total_images = len(images) if isinstance(images, list) else 0
+            self.qm.createIngestJob(job_id, "dsta", file_name, user.get('sub') if user else None, total_images, content_hash)
+            with self._active_lock:
+                self._active.add(job_id)
+            self._executor.submit(self._run_dsta, job_id, payload, total_images, user)
+        except Exception:
+            with self._active_lock:
+                self._active.discard(job_id)
+            self._slots.release()
+            raise
+        return job_id
+
+    def _run_dsta(self, job_id, payload, total_images, user):
+        try:
+            self.qm.startIngestJob(job_id)
+            result = self.image_service.insert_dsta_data(
+                payload,
+                progress=lambda *counts: self.qm.updateIngestJobProgress(job_id, *counts),
+                job_id=job_id,
+            )
+            if result.get("success"):
+                self.qm.updateIngestJobProgress(
+                    job_id, total_images, result["images_inserted"], result["images_existing"],
+                    len(result.get("errors", [])), result["areas_inserted"],
+                )
+                self.qm.finishIngestJob(job_id, "succeeded", result.get("message"))
+                meta = f"Just now · {result['images_inserted']} images, {result['areas_inserted']} areas"
+                self.notification_service.push("Upload completed", meta, user)
+            else:
+                self.qm.finishIngestJob(job_id, "failed", result.get("error"))
+                self.notification_service.push("Upload failed", "Just now · Upload error", user)
+        except Exception as e:
+            logger.exception("Ingest job %s failed", job_id)
+            try:
+                self.qm.finishIngestJob(job_id, "failed", str(e))
+            except Exception:
+                logger.exception("Could not record the failure of ingest job %s", job_id)
+            self.notification_service.push("Upload failed", "Just now · Upload error", user)
+        finally:
+            with self._active_lock:
+                self._active.discard(job_id)
+            self._slots.release()
+
+    def get_job(self, job_id):
+        '''
+        Function: Gets the status and progress of an ingest job
+        Input: job_id
+        Output: dict of the job's columns, or None if there is no such job
+        '''
+        row = self.qm.getIngestJob(job_id)
+        if row is None:
+            return None
+        job = dict(zip(INGEST_JOB_COLUMNS, row))
+        for column in ("created_at", "started_at", "finished_at", "heartbeat_at"):
+            if job[column] is not None:
+                job[column] = job[column].isoformat()
+        return job
+
+    def heartbeat(self):
+        '''
+        Function: Refreshes the jobs queued or running in this process, and fails jobs whose process stopped refreshing them
+        Output: NIL
+        '''
+        with self._active_lock:
+            active = list(self._active)
+        self.qm.touchIngestJobs(active)
+        self.qm.failStaleIngestJobs(None, "Interrupted; the server stopped while the upload was in progress")
+
+    def notify_finished_drop_jobs(self):
+        '''
+        Function: Notifies the jobs the ingest worker has finished since the last call
+        Output: number of notifications pushed
+        '''
+        if self._notified_until is None:
+            # finished_at is the database's local time, which the app's clock may not match
+            self._notified_until = self.qm.getIngestJobClock()
+            return 0
+        rows = self.qm.getFinishedIngestJobs(DROP_SOURCE, self._notified_until)
+        for row in rows:
+            job = dict(zip(INGEST_JOB_COLUMNS, row))
+            if job["status"] == "succeeded":
+                meta = f"Just now · {job['file_name']}: {job['images_inserted']} images, {job['areas_inserted']} areas"
+                self.notification_service.push("Upload completed", meta)
+            else:
+                self.notification_service.push("Upload failed", f"Just now · {job['file_name']}: Upload error")
+            self._notified_until = job["finished_at"]
+        return len(rows)
+
+    def start(self):
+        '''
+        Function: Schedules heartbeat and notify_finished_drop_jobs on the running event loop, every notify_interval_seconds
+        '''
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.heartbeat)
+            except Exception as e:
+                logger.warning("Could not refresh ingest jobs: %s", e)
+            try:
+                await asyncio.to_thread(self.notify_finished_drop_jobs)
+            except Exception as e:
+                logger.warning("Could not check for finished ingest worker jobs: %s", e)
+            await asyncio.sleep(self.notify_interval_seconds)
+
+    def shutdown(self):
+        # Queued jobs that have not started stay 'queued' in ingest_job
+        self.stop()
+        self._executor.shutdown(wait=False, cancel_futures=True)
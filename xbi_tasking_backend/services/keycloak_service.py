@@ -1,13 +1,35 @@
+import threading
 import time
 from jose import jwt
 from main_classes.KeycloakClient import KeycloakClient
+from tracing import traced_class
 
 
+@traced_class
 class KeycloakService:
     def __init__(self, client=None, config=None):
         self.client = client or KeycloakClient(config=config)
         self._admin_token = None
         self._admin_token_exp = 0
+        self._async_bridge = None
+        self._async_bridge_lock = threading.Lock()
+
+    def _get_async_bridge(self):
+        if self._async_bridge is None:
+            with self._async_bridge_lock:
+                if self._async_bridge is None:
+                    from services.async_keycloak_service import KeycloakAsyncBridge
+                    self._async_bridge = KeycloakAsyncBridge(config=self.client.config)
+        return self._async_bridge
+
+    def close(self):
+        '''
+        Function: Stops the async bridge, if one was started, and closes its connection pool
+        '''
+        with self._async_bridge_lock:
+            bridge, self._async_bridge = self._async_bridge, None
+        if bridge is not None:
+            bridge.close()
 
     def get_admin_token(self):
         now = time.time()
@@ -29,9 +51,16 @@ class KeycloakService:
     def get_user_by_id(self, token, keycloak_user_id):
         return self.client.get_user_by_id(token, keycloak_user_id)
 
+    def get_users_by_ids(self, token, keycloak_user_ids):
+        bridge = self._get_async_bridge()
+        return bridge.run(bridge.service.get_users_by_ids(token, keycloak_user_ids))
+
     def find_user_id(self, token, username):
         return self.client.find_user_id(token, username)
 
+    def get_all_users(self, token):
+        return list(self.client.iter_users(token))
+
     def get_role(self, token, role_name):
         return self.client.get_role(token, role_name)
 
@@ -43,3 +72,6 @@ class KeycloakService:
 
     def create_user(self, token, username, password):
         return self.client.create_user(token, username, password)
+
+    def get_http_stats(self):
+        return self.client.get_http_stats()
@@ -1,3 +1,7 @@
+from tracing import traced_class
+
+
+@traced_class
 class LookupService:
     def __init__(self, query_manager):
         self.qm = query_manager
@@ -56,11 +60,9 @@ class LookupService:
         return output
 
     def set_opsv_areas(self, payload):
-        self.qm.setOpsvFalse()
-
         opsvAreas = []
         for area in payload["Areas"]:
             if area['OPS V'] == True:
-                opsvAreas.append((area['Area Name'],))
-        
-        self.qm.setOpsvAreas(opsvAreas)
+                opsvAreas.append(area['Area Name'])
+
+        return self.qm.syncOpsvAreas(opsvAreas)
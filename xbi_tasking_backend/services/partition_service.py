@@ -0,0 +1,75 @@
+import asyncio
+import datetime
+import logging
+
+from main_classes.partitions import month_start, next_month
+from tracing import traced_class
+
+
+logger = logging.getLogger("xbi_tasking_backend.partition_service")
+
+
+@traced_class
+class PartitionService:
+    '''
+    Background job that keeps a partition of image ready for the current month and the next
+    months_ahead, so ingest never runs partition DDL. Months that only have rows in the default
+    partition (e.g. historic uploads) get their own partition on the next run too.
+    '''
+    def __init__(self, query_manager, months_ahead=3, interval_seconds=86400.0, lock_timeout_ms=5000):
+        self.qm = query_manager
+        self.months_ahead = months_ahead
+        self.interval_seconds = interval_seconds
+        self.lock_timeout_ms = lock_timeout_ms
+        self._task = None
+
+    @classmethod
+    def from_config(cls, query_manager, config):
+        return cls(
+            query_manager,
+            months_ahead=config.getPartitionMonthsAhead(),
+            interval_seconds=config.getPartitionIntervalSeconds(),
+            lock_timeout_ms=config.getPartitionLockTimeoutMs(),
+        )
+
+    def ensure_partitions(self, now=None):
+        '''
+        Function: Creates the missing image partitions for the coming months and for months stranded in the default partition
+        Input: now to count the coming months from
+        Output: list of the months whose partition was created
+        Note: a month that cannot be created (e.g. a lock timeout) is logged and retried on the next run
+        '''
+        months = [month_start(now or datetime.datetime.now())]
+        for _ in range(self.months_ahead):
+            months.append(next_month(months[-1]))
+        months = sorted(set(months) | set(self.qm.getDefaultPartitionMonths()))
+        created = []
+        for month in months:
+            try:
+                if self.qm.ensureImagePartition(month, self.lock_timeout_ms) is not None:
+                    created.append(month)
+            except Exception as e:
+                logger.warning("Could not create the image partition for %s: %s", month, e)
+        if created:
+            logger.info("Created image partitions for %s", ", ".join(month.isoformat() for month in created))
+        return created
+
+    def start(self):
+        '''
+        Function: Schedules the job on the running event loop, now and then every interval_seconds
+        '''
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.ensure_partitions)
+            except Exception as e:
+                logger.warning("Image partition upkeep failed: %s", e)
+            await asyncio.sleep(self.interval_seconds)
@@ -1,38 +1,127 @@
+import csv
+import io
+import os
+import tempfile
 import dateutil.parser
 from datetime import timedelta
 
+from GlobalUtils import datetime_format
+from security import is_basic_ii_user
+from tracing import traced_class
 
+
+# A streamed CSV export is sent in chunks of this many rows
+CSV_CHUNK_ROWS = 500
+
+COMPLETE_IMAGE_EXPORT_HEADERS = [
+    "Sensor Name", "Image File Name", "Image ID", "Upload Date", "Image Datetime", "Report", "Priority",
+    "Image Category", "Image Quality", "Cloud Cover", "EW Status", "Vetter",
+]
+TASKING_SUMMARY_EXPORT_HEADERS = [
+    "Sensor Name", "Image File Name", "Image ID", "Upload Date", "Image Datetime", "Report", "Priority",
+    "Image Category", "Image Quality", "Cloud Cover", "EW Status", "Target Tracing",
+]
+
+
+def _export_date_range(payload):
+    return (
+        dateutil.parser.isoparse(payload['Start Date']).strftime(f"%Y-%m-%d"),
+        (dateutil.parser.isoparse(payload['End Date']) + timedelta(days=1)).strftime(f"%Y-%m-%d"),
+    )
+
+
+def _own_tasks_only(user):
+    # Basic II users only see images they have a task on, as in the tasking summary and completed images pages
+    if user and is_basic_ii_user(user):
+        return user.get('sub')
+    return None
+
+
+def _export_row(image_data):
+    # Drops the scvu image id and formats the dates like the grids do
+    row = list(image_data[1:])
+    for i in (3, 4):
+        if row[i] is not None:
+            row[i] = row[i].strftime(datetime_format)
+    return row
+
+
+@traced_class
 class ReportService:
     def __init__(self, query_manager, excel_generator):
         self.qm = query_manager
         self.eg = excel_generator
 
     def get_xbi_report(self, start_date, end_date):
-        image_datas = self.qm.getXBIReportImage(
+        # The daily rollup keeps counting images after they are archived
+        counts = self.qm.getXBIReportCounts(
             dateutil.parser.isoparse(start_date).strftime(f"%Y-%m-%d"), 
             (dateutil.parser.isoparse(end_date) + timedelta(days=1)).strftime(f"%Y-%m-%d")
         )
         exploitable_images = {}
         unexploitable_images = {}
-        for cat in self.qm.getCategories():
-            exploitable_images[cat[0]] = 0
-            unexploitable_images[cat[0]] = [0,0,0,0]
-
-        for image in image_datas:
-            if image[2] == None:
-                continue
-            elif image[2] == "Img Error":
-                unexploitable_images[image[1]][0] += 1
-            elif image[2] == "Failed":
-                unexploitable_images[image[1]][1] += 1
-            elif image[2] == "I-IIRS 0":
-                unexploitable_images[image[1]][2] += 1
-            elif image[2] == "TOS":
-                unexploitable_images[image[1]][3] += 1
-            else:
-                exploitable_images[image[1]] += 1
+        for category, exploitable, *unexploitable in counts:
+            exploitable_images[category] = exploitable
+            unexploitable_images[category] = list(unexploitable)
         return exploitable_images, unexploitable_images
 
+    def export_complete_images(self, payload, user=None):
+        '''
+        Function: Lazily reads the completed images grid for an export
+        Input: date range payload, user whose role decides which images are included
+        Output: headers, generator of rows read from a server-side cursor
+        '''
+        start_date, end_date = _export_date_range(payload)
+        return COMPLETE_IMAGE_EXPORT_HEADERS, self._complete_image_rows(start_date, end_date, _own_tasks_only(user))
+
+    def _complete_image_rows(self, start_date, end_date, assignee_keycloak_id):
+        # The archive check is a query too, so it waits with the rows until the export is read off the event loop
+        rows = self.qm.streamImageData(start_date, end_date, assignee_keycloak_id, self.qm.reachesArchive(start_date))
+        for row in rows:
+            yield _export_row(row)
+
+    def export_tasking_summary(self, payload, user=None):
+        '''
+        Function: Lazily reads the tasking summary grid for an export
+        Input: date range payload, user whose role decides which images are included
+        Output: headers, generator of rows read from a server-side cursor
+        '''
+        start_date, end_date = _export_date_range(payload)
+        rows = self.qm.streamTaskingSummaryImageData(start_date, end_date, _own_tasks_only(user))
+        return TASKING_SUMMARY_EXPORT_HEADERS, (_export_row(row) for row in rows)
+
+    def write_csv(self, headers, rows):
+        '''
+        Function: Encodes rows as CSV as they are read
+        Input: headers, iterable of rows
+        Output: generator of CSV text chunks
+        '''
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(headers)
+        for count, row in enumerate(rows, start=1):
+            writer.writerow(row)
+            if count % CSV_CHUNK_ROWS == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def write_xlsx(self, headers, rows):
+        '''
+        Function: Writes rows to a temporary xlsx file with the constant memory writer
+        Input: headers, iterable of rows
+        Output: path of the file; the caller removes it
+        '''
+        fd, path = tempfile.mkstemp(suffix=".xlsx")
+        try:
+            with os.fdopen(fd, "wb") as output:
+                self.eg.write_workbook(output, headers, rows, constant_memory=True)
+        except Exception:
+            os.remove(path)
+            raise
+        return path
+
     def get_xbi_report_data(self, payload):
         exploitable, unexploitable = self.get_xbi_report(payload['Start Date'], payload['End Date'])
         exploitable.pop("UNCATEGORISED", None)
@@ -7,11 +7,13 @@ from formatters.tasking_formatter import (
     format_tasking_manager_image,
     format_tasking_manager_area,
 )
+from tracing import traced_class
 
 
 logger = logging.getLogger("xbi_tasking_backend.tasking_service")
 
 
+@traced_class
 class TaskingService:
     def __init__(self, query_manager, image_service=None):
         self.qm = query_manager
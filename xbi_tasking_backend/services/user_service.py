@@ -2,11 +2,13 @@ import logging
 from io import StringIO
 import csv
 from main_classes.EnumClasses import Role, ParadeStateStatus
+from tracing import traced_class
 
 
 logger = logging.getLogger("xbi_tasking_backend.user_service")
 
 
+@traced_class
 class UserService:
     def __init__(self, query_manager):
         self.qm = query_manager
@@ -51,17 +53,12 @@ class UserService:
             name = (row.get('Name') or "").strip()
             if not name:
                 continue
-            userList.append((name, ))
+            userList.append(name)
             status_value = row.get('Status')
             status_enum = ps_status.from_value(status_value) if status_value else None
             if status_enum == ps_status.PRESENT:
-                presentList.append((name,))
+                presentList.append(name)
             elif status_value:
                 logger.warning("Unknown parade state status: %s", status_value)
-        
-        userList = tuple(userList)
-        presentList = tuple(presentList)
-        with self.qm.db.transaction():
-            self.qm.resetRecentUsers()
-            self.qm.addUsers(userList)
-            self.qm.updateExistingUsers(presentList)
+
+        self.qm.applyParadeState(userList, presentList)
@@ -0,0 +1,77 @@
+import datetime
+import unittest
+
+from services.archive_service import ArchiveService
+from services.image_service import ImageService
+from services.report_service import ReportService
+
+
+class _FakeQueryManager:
+    def __init__(self, pending=0, archived_before=None):
+        self.pending = pending
+        self.archived_before = archived_before
+        self.batches = []
+        self.reads = []
+
+    def archiveCompletedImages(self, cutoff, batch_size):
+        archived = min(self.pending, batch_size)
+        self.pending -= archived
+        self.batches.append((cutoff, archived))
+        return archived
+
+    def reachesArchive(self, start_date):
+        self.reads.append(("reachesArchive", start_date))
+        return self.archived_before is not None and start_date < self.archived_before
+
+    def streamImageData(self, start_date, end_date, assignee_keycloak_id=None, include_archive=False):
+        self.reads.append(("streamImageData", include_archive))
+        return iter([])
+
+    def getImageData(self, start_date, end_date, include_archive=False):
+        self.reads.append(("getImageData", include_archive))
+        return []
+
+    def getImageDataForUser(self, start_date, end_date, assignee_keycloak_id, include_archive=False):
+        self.reads.append(("getImageDataForUser", include_archive))
+        return []
+
+
+class ArchiveService_unittest(unittest.TestCase):
+    def test_archive_completed_images_batches(self):
+        qm = _FakeQueryManager(pending=1050)
+        service = ArchiveService(qm, retention_days=30, batch_size=500)
+        res = service.archive_completed_images(now=datetime.datetime(2025, 3, 31))
+        self.assertEqual(res, 1050, "archive_completed_images failed - wrong number archived")
+        self.assertEqual([archived for _, archived in qm.batches], [500, 500, 50], "archive_completed_images failed - not archived in batches")
+        self.assertEqual({cutoff for cutoff, _ in qm.batches}, {datetime.datetime(2025, 3, 1)}, "archive_completed_images failed - wrong retention cutoff")
+
+    def test_archive_completed_images_maxBatches(self):
+        qm = _FakeQueryManager(pending=1050)
+        res = ArchiveService(qm, batch_size=500).archive_completed_images(max_batches=1)
+        self.assertEqual((res, qm.pending), (500, 550), "archive_completed_images failed - ran past max_batches")
+
+    def test_archive_completed_images_nothingPending(self):
+        qm = _FakeQueryManager()
+        self.assertEqual(ArchiveService(qm).archive_completed_images(), 0, "archive_completed_images failed - archived with nothing pending")
+        self.assertEqual(len(qm.batches), 1, "archive_completed_images failed - kept polling an empty table")
+
+    def test_get_complete_image_data_readsArchiveOnlyWhenReached(self):
+        qm = _FakeQueryManager(archived_before="2025-01-01")
+        service = ImageService(qm)
+        service.get_complete_image_data({"Start Date": "2025-02-01T00:00:00", "End Date": "2025-02-28T00:00:00"})
+        service.get_complete_image_data({"Start Date": "2024-12-01T00:00:00", "End Date": "2025-02-28T00:00:00"})
+        service.get_complete_image_data({"Start Date": "2024-12-01T00:00:00", "End Date": "2025-02-28T00:00:00"}, user={"account_type": "II", "sub": "kc-hello"})
+        exp = [("getImageData", False), ("getImageData", True), ("getImageDataForUser", True)]
+        qm.reads = [read for read in qm.reads if read[0] != "reachesArchive"]
+        self.assertEqual(qm.reads, exp, "get_complete_image_data failed - archive read for the wrong windows")
+
+    def test_export_complete_images_queriesLazily(self):
+        qm = _FakeQueryManager(archived_before="2025-01-01")
+        _, rows = ReportService(qm, None).export_complete_images({"Start Date": "2024-12-01T00:00:00", "End Date": "2025-02-28T00:00:00"})
+        self.assertEqual(qm.reads, [], "export_complete_images failed - queried before the rows were read")
+        self.assertEqual(list(rows), [], "export_complete_images failed - rows returned")
+        self.assertEqual(qm.reads, [("reachesArchive", "2024-12-01"), ("streamImageData", True)], "export_complete_images failed - archive not read")
+
+    def startUnitTest(self):
+        suite = unittest.TestLoader().loadTestsFromTestCase(ArchiveService_unittest)
+        unittest.TextTestRunner(verbosity=2).run(suite)
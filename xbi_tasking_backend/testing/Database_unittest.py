@@ -37,6 +37,11 @@ class Database_unittest(unittest.TestCase):
             res = self.db.executeSelect("sadsadisadu9w0uasuod")
         self.assertRaises(psycopg2.errors.SyntaxError, fail_case)
     
+    def test_executeSelectStream_baseCase(self):
+        res = list(self.db.executeSelectStream("SELECT name FROM task_status WHERE name <> %s ORDER BY name", ('Verifying',), itersize=1))
+        exp = [('Completed',), ('In Progress',), ('Incomplete',)]
+        self.assertEqual(res, exp, "server-side cursor failed to stream all rows")
+
     def test_executeInsert_baseCase(self):
         self.db.executeInsert("INSERT INTO sensor(id, name) VALUES (1, 'SB')")
         res = self.db.executeSelect("SELECT id, name FROM sensor")
@@ -0,0 +1,66 @@
+import io
+import os
+import re
+import tempfile
+import unittest
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from main_classes.ExcelGenerator import CONSTANT_MEMORY_ROWS, ExcelGenerator
+
+
+class ExcelGenerator_unittest(unittest.TestCase):
+    def setUp(self):
+        self.eg = ExcelGenerator()
+
+    def _read(self, workbook):
+        with zipfile.ZipFile(io.BytesIO(workbook)) as archive:
+            sheet = archive.read("xl/worksheets/sheet1.xml").decode("utf-8")
+            names = archive.namelist()
+            strings = archive.read("xl/sharedStrings.xml").decode("utf-8") if "xl/sharedStrings.xml" in names else ""
+        # xlsxwriter merges adjacent columns with the same settings into one <col min max>
+        widths = []
+        for first, last, width in re.findall(r'<col min="(\d+)" max="(\d+)" width="([0-9.]+)"', sheet):
+            widths += [int(float(width))] * (int(last) - int(first) + 1)
+        return sheet, strings, widths
+
+    def test_create_excel_baseCase(self):
+        res = self.eg.create_excel({
+            "Tasking": ["Coverage", "Total"],
+            "Exploitable UAV": [1, 1],
+            "Remarks": ["UAV\nFailed - 1\n", ""],
+        })
+        sheet, strings, widths = self._read(res)
+        for text in ("Tasking", "Coverage", "Exploitable UAV", "Failed - 1"):
+            self.assertIn(text, sheet + strings, "create_excel failed - cell missing")
+        # widths are the longest value (or header) + 8
+        self.assertEqual(widths, [16, 23, 23], "create_excel failed - wrong column widths")
+
+    def test_create_excel_emptyColumns(self):
+        _, _, widths = self._read(self.eg.create_excel({"Tasking": [], "Remarks": []}))
+        self.assertEqual(widths, [11, 11], "create_excel failed - empty sheet widths")
+
+    def test_create_excel_largeSheetConstantMemory(self):
+        rows = CONSTANT_MEMORY_ROWS + 500
+        res = self.eg.create_excel({"ID": list(range(rows)), "Name": [f"image_{i}" for i in range(rows)]})
+        sheet, _, widths = self._read(res)
+        self.assertEqual(sheet.count("<row "), rows + 1, "create_excel failed - rows missing in constant memory mode")
+        self.assertEqual(widths[1], len(f"image_{rows - 1}") + 8, "create_excel failed - width not tracked while streaming")
+
+    def test_create_excel_noSharedFile(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                with ThreadPoolExecutor(max_workers=4) as pool:
+                    workbooks = list(pool.map(lambda i: self.eg.create_excel({"ID": [i]}), range(8)))
+                leftovers = os.listdir(directory)
+            finally:
+                os.chdir(cwd)
+        self.assertEqual(leftovers, [], "create_excel failed - wrote a file to the working directory")
+        values = [re.search(r'<c r="A2"[^>]*><v>(\d+)</v>', self._read(workbook)[0]).group(1) for workbook in workbooks]
+        self.assertEqual(values, [str(i) for i in range(8)], "create_excel failed - concurrent reports mixed up")
+
+    def startUnitTest(self):
+        suite = unittest.TestLoader().loadTestsFromTestCase(ExcelGenerator_unittest)
+        unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,195 @@
+import datetime
+import hashlib
+import json
+import threading
+import unittest
+from contextlib import contextmanager
+
+from services.image_service import INGEST_PROGRESS_EVERY, ImageService
+from main_classes.query_jobs import INGEST_JOB_COLUMNS
+from services.ingest_service import DROP_SOURCE, IngestService
+from services.notification_service import NotificationService
+
+
+class _FakeDatabase:
+    @contextmanager
+    def transaction(self):
+        yield None
+
+
+class _FakeQueryManager:
+    def __init__(self):
+        self.db = _FakeDatabase()
+        self.jobs = {}
+        self.progress = []
+        self.images = set()
+        self.inserted = []
+        self.finished = []
+        self.touched = []
+        self.stale_sweeps = []
+
+    def createIngestJob(self, job_id, source, file_name, created_by, total_images, content_hash=None):
+        self.jobs[job_id] = {"status": "queued", "file_name": file_name, "created_by": created_by, "total_images": total_images, "content_hash": content_hash}
+
+    def findIngestJobByHash(self, content_hash):
+        for job_id, job in reversed(list(self.jobs.items())):
+            if job.get("content_hash") == content_hash and job["status"] in ("queued", "running", "succeeded"):
+                return job_id, job["status"]
+        return None
+
+    def recordDuplicateIngestJob(self, job_id, source, file_name, created_by, duplicate_of):
+        self.jobs[job_id] = {"status": "succeeded", "source": source, "file_name": file_name, "created_by": created_by, "duplicate_of": duplicate_of}
+
+    def getExistingImageIds(self, image_ids):
+        return self.images & set(image_ids)
+
+    def startIngestJob(self, job_id):
+        self.jobs[job_id]["status"] = "running"
+
+    def updateIngestJobProgress(self, job_id, processed, inserted, existing, errors, areas):
+        self.progress.append((processed, inserted, existing, errors, areas))
+
+    def finishIngestJob(self, job_id, status, message):
+        self.jobs[job_id].update(status=status, message=message)
+
+    def touchIngestJobs(self, job_ids):
+        self.touched.append(sorted(job_ids))
+
+    def failStaleIngestJobs(self, source, message, stale_seconds=120):
+        self.stale_sweeps.append(source)
+
+    def getIngestJobClock(self):
+        return datetime.datetime(2025, 1, 1, 8)
+
+    def getFinishedIngestJobs(self, source, finished_after):
+        return [row for row in self.finished if row[1] == source and row[INGEST_JOB_COLUMNS.index("finished_at")] > finished_after]
+
+    def insertSensor(self, sensor_name):
+        pass
+
+    def insertImage(self, image_id, image_file_name, sensor_name, upload_date, image_datetime, ingest_job_id=None):
+        self.inserted.append(image_id)
+        if image_id in self.images:
+            return False
+        self.images.add(image_id)
+        return True
+
+
+class _BlockingImageService:
+    '''
+    Stands in for ImageService; each ingest waits until the test releases it
+    '''
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Semaphore(0)
+
+    def insert_dsta_data(self, payload, progress=None, job_id=None):
+        self.started.release()
+        self.release.wait(5)
+        if payload.get("fail"):
+            raise RuntimeError("database unavailable")
+        return {"success": True, "images_inserted": len(payload["images"]), "images_existing": 0, "areas_inserted": 0, "message": "done"}
+
+
+def _dsta_payload(image_ids):
+    return {"images": [
+        {"imgId": image_id, "imageFileName": f"{image_id}.ntf", "sensorName": "SB",
+         "uploadDate": "2025-01-01T00:00:00", "imageDateTime": "2025-01-01T00:00:00", "areas": []}
+        for image_id in image_ids
+    ]}
+
+
+class IngestService_unittest(unittest.TestCase):
+    def setUp(self):
+        self.qm = _FakeQueryManager()
+        self.images = _BlockingImageService()
+        self.notifications = NotificationService()
+        self.service = IngestService(self.qm, self.images, self.notifications, workers=1, max_pending=2)
+
+    def tearDown(self):
+        self.images.release.set()
+        self.service._executor.shutdown(wait=True)
+
+    def test_submit_dsta_runsInBackground(self):
+        job_id = self.service.submit_dsta(_dsta_payload([1, 2, 3]), "dsta.json", {"sub": "kc-hello", "preferred_username": "hello"})
+        self.assertTrue(self.images.started.acquire(timeout=5), "submit_dsta failed - job not started")
+        self.assertEqual(self.qm.jobs[job_id]["status"], "running", "submit_dsta failed - job not marked running")
+        self.images.release.set()
+        self.service._executor.shutdown(wait=True)
+        self.assertEqual(self.qm.jobs[job_id], {"status": "succeeded", "file_name": "dsta.json", "created_by": "kc-hello", "total_images": 3, "content_hash": None, "message": "done"}, "submit_dsta failed - job not recorded")
+        self.assertEqual(self.qm.progress[-1], (3, 3, 0, 0, 0), "submit_dsta failed - final progress not recorded")
+        self.assertEqual(self.notifications.list_all()[0]["title"], "Upload completed", "submit_dsta failed - no notification")
+
+    def test_submit_dsta_boundedPending(self):
+        first = self.service.submit_dsta(_dsta_payload([1]))
+        second = self.service.submit_dsta(_dsta_payload([2]))
+        self.assertIsNone(self.service.submit_dsta(_dsta_payload([3])), "submit_dsta failed - accepted past max_pending")
+        self.images.release.set()
+        self.service._executor.shutdown(wait=True)
+        self.assertEqual({self.qm.jobs[first]["status"], self.qm.jobs[second]["status"]}, {"succeeded"}, "submit_dsta failed - queued jobs not run")
+        self.service = IngestService(self.qm, self.images, self.notifications, workers=1, max_pending=2)
+        self.assertIsNotNone(self.service.submit_dsta(_dsta_payload([3])), "submit_dsta failed - slots not released")
+
+    def test_submit_dsta_failure(self):
+        job_id = self.service.submit_dsta({"images": [], "fail": True})
+        self.images.release.set()
+        self.service._executor.shutdown(wait=True)
+        self.assertEqual((self.qm.jobs[job_id]["status"], self.qm.jobs[job_id]["message"]), ("failed", "database unavailable"), "submit_dsta failed - failure not recorded")
+        self.assertEqual(self.notifications.list_all()[0]["title"], "Upload failed", "submit_dsta failed - no failure notification")
+
+    def test_submit_dsta_file_duplicates(self):
+        contents = json.dumps(_dsta_payload([1, 2])).encode("utf-8")
+        first, status = self.service.submit_dsta_file(contents, "dsta.json")
+        self.assertEqual(status, "queued", "submit_dsta_file failed - new file not queued")
+        self.assertEqual(self.qm.jobs[first]["content_hash"], hashlib.sha256(contents).hexdigest(), "submit_dsta_file failed - fingerprint not recorded")
+        self.assertTrue(self.images.started.acquire(timeout=5), "submit_dsta_file failed - upload not run")
+        self.assertEqual(self.service.submit_dsta_file(contents, "again.json"), (first, "running"), "submit_dsta_file failed - in-progress duplicate queued again")
+        self.images.release.set()
+        self.service._executor.shutdown(wait=True)
+
+        job_id, status = self.service.submit_dsta_file(contents, "again.json", {"sub": "kc-hello"})
+        self.assertEqual((status, self.qm.jobs[job_id]["duplicate_of"]), ("succeeded", first), "submit_dsta_file failed - ingested duplicate not skipped")
+        self.assertEqual(self.notifications.list_all()[0]["title"], "Upload skipped", "submit_dsta_file failed - no notification for the skipped upload")
+        self.assertFalse(self.images.started.acquire(timeout=0), "submit_dsta_file failed - duplicate upload run")
+
+    def test_insert_dsta_data_skipsKnownImages(self):
+        self.qm.images = {1, 3}
+        result = ImageService(self.qm).insert_dsta_data(_dsta_payload([1, 2, 3, 4]))
+        self.assertEqual(self.qm.inserted, [2, 4], "insert_dsta_data failed - inserted images that already exist")
+        self.assertEqual((result["images_inserted"], result["images_existing"]), (2, 2), "insert_dsta_data failed - wrong counts")
+
+    def test_insert_dsta_data_reportsProgress(self):
+        progress = []
+        total = INGEST_PROGRESS_EVERY * 2 + 5
+        self.qm.images = {0, 1}
+        result = ImageService(self.qm).insert_dsta_data(_dsta_payload(range(total)), progress=lambda *counts: progress.append(counts))
+        exp = [(INGEST_PROGRESS_EVERY, INGEST_PROGRESS_EVERY - 2, 2, 0, 0), (INGEST_PROGRESS_EVERY * 2, INGEST_PROGRESS_EVERY * 2 - 2, 2, 0, 0)]
+        self.assertEqual(progress, exp, "insert_dsta_data failed - wrong progress reports")
+        self.assertEqual((result["images_inserted"], result["images_existing"]), (total - 2, 2), "insert_dsta_data failed - wrong counts")
+
+    def test_heartbeat_refreshesActiveJobs(self):
+        first = self.service.submit_dsta(_dsta_payload([1]))
+        second = self.service.submit_dsta(_dsta_payload([2]))
+        self.service.heartbeat()
+        self.assertEqual(self.qm.touched, [sorted([first, second])], "heartbeat failed - in-progress jobs not refreshed")
+        self.assertEqual(self.qm.stale_sweeps, [None], "heartbeat failed - abandoned jobs not failed")
+        self.images.release.set()
+        self.service._executor.shutdown(wait=True)
+        self.service.heartbeat()
+        self.assertEqual(self.qm.touched[-1], [], "heartbeat failed - finished jobs still refreshed")
+
+    def test_notify_finished_drop_jobs(self):
+        def job(job_id, status, minutes):
+            values = {"job_id": job_id, "source": DROP_SOURCE, "file_name": f"{job_id}.json", "status": status,
+                      "images_inserted": 3, "areas_inserted": 5, "finished_at": self.qm.getIngestJobClock() + datetime.timedelta(minutes=minutes)}
+            return tuple(values.get(column) for column in INGEST_JOB_COLUMNS)
+        self.qm.finished = [job("old", "succeeded", -1), job("a", "succeeded", 1), job("b", "failed", 2)]
+        self.assertEqual(self.service.notify_finished_drop_jobs(), 0, "notify_finished_drop_jobs failed - notified jobs from before the app started")
+        self.assertEqual(self.service.notify_finished_drop_jobs(), 2, "notify_finished_drop_jobs failed - wrong jobs notified")
+        exp = [("Upload failed", "Just now · b.json: Upload error"), ("Upload completed", "Just now · a.json: 3 images, 5 areas")]
+        self.assertEqual([(n["title"], n["meta"]) for n in self.notifications.list_all()], exp, "notify_finished_drop_jobs failed - wrong notifications")
+        self.assertEqual(self.service.notify_finished_drop_jobs(), 0, "notify_finished_drop_jobs failed - jobs notified twice")
+
+    def startUnitTest(self):
+        suite = unittest.TestLoader().loadTestsFromTestCase(IngestService_unittest)
+        unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from ingest_worker import DropDirectoryIngester, iter_dsta_images
+from services.ingest_service import DROP_SOURCE
+
+
+class _FakeQueryManager:
+    def __init__(self):
+        self.jobs = {}
+        self.progress = []
+        self.touched = []
+
+    def findIngestJobByHash(self, content_hash):
+        for job_id, job in reversed(list(self.jobs.items())):
+            if job.get("content_hash") == content_hash and job["status"] in ("queued", "running", "succeeded"):
+                return job_id, job["status"]
+        return None
+
+    def recordDuplicateIngestJob(self, job_id, source, file_name, created_by, duplicate_of):
+        self.jobs[job_id] = {"status": "succeeded", "source": source, "file_name": file_name, "duplicate_of": duplicate_of}
+
+    def createIngestJob(self, job_id, source, file_name, created_by, total_images, content_hash=None):
+        self.jobs[job_id] = {"status": "queued", "source": source, "file_name": file_name, "content_hash": content_hash}
+
+    def startIngestJob(self, job_id):
+        self.jobs[job_id]["status"] = "running"
+
+    def updateIngestJobProgress(self, job_id, processed, inserted, existing, errors, areas):
+        self.progress.append((processed, inserted, existing, errors, areas))
+
+    def finishIngestJob(self, job_id, status, message, total_images=None):
+        self.jobs[job_id].update(status=status, message=message, total_images=total_images)
+
+    def touchIngestJobs(self, job_ids):
+        self.touched.extend(job_ids)
+
+    def failStaleIngestJobs(self, source, message, stale_seconds=120):
+        for job in self.jobs.values():
+            if job["source"] == source and job["status"] in ("queued", "running") and job.get("stale"):
+                job.update(status="failed", message=message)
+
+
+class _FakeImageService:
+    def __init__(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def insert_dsta_data(self, payload, auto_assign=True, progress=None, job_id=None):
+        with self.lock:
+            self.batches.append([image["imgId"] for image in payload["images"]])
+        areas = sum(len(image["areas"]) for image in payload["images"])
+        return {"success": True, "images_inserted": len(payload["images"]), "images_existing": 0, "areas_inserted": areas, "message": "done"}
+
+
+def _dsta_file(image_ids):
+    return json.dumps({"source": "DSTA", "images": [
+        {"imgId": image_id, "imageFileName": f"é_{image_id}.ntf", "sensorName": "SB",
+         "uploadDate": "2025-01-01T00:00:00", "imageDateTime": "2025-01-01T00:00:00", "areas": [{"areaName": "G077"}]}
+        for image_id in image_ids
+    ]}, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+class IngestWorker_unittest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.drop_dir = self.tmp.name
+        self.qm = _FakeQueryManager()
+        self.images = _FakeImageService()
+        self.ingester = DropDirectoryIngester(self.qm, self.images, self.drop_dir, workers=2, batch_size=4)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _drop(self, name, contents):
+        path = os.path.join(self.drop_dir, name)
+        with open(path, "wb") as f:
+            f.write(contents)
+        return path
+
+    def test_iter_dsta_images_acrossChunks(self):
+        contents = _dsta_file(range(5))
+        exp = json.loads(contents)["images"]
+        for chunk_size in (1, 7, 64, len(contents)):
+            self.assertEqual(list(iter_dsta_images(contents, chunk_size)), exp, f"iter_dsta_images failed - wrong images with {chunk_size} byte chunks")
+        self.assertEqual(list(iter_dsta_images(b'{"images": []}')), [], "iter_dsta_images failed - empty list")
+
+    def test_iter_dsta_images_invalid(self):
+        contents = _dsta_file(range(3))
+        for bad in (contents[:-10], b'{"image": []}', b'{"images": [{"imgId": 1}, {"imgId": }]}'):
+            with self.assertRaises(ValueError, msg="iter_dsta_images failed - invalid file accepted"):
+                list(iter_dsta_images(bad, 16))
+
+    def test_ingest_file_batchesAndMoves(self):
+        contents = _dsta_file(range(10))
+        path = self._drop("dsta.json", contents)
+        job_id = self.ingester.ingest_file(path)
+        job = self.qm.jobs[job_id]
+        self.assertEqual((job["status"], job["source"], job["total_images"]), ("succeeded", DROP_SOURCE, 10), "ingest_file failed - job not recorded")
+        self.assertEqual(job["content_hash"], hashlib.sha256(contents).hexdigest(), "ingest_file failed - fingerprint not recorded")
+        self.assertEqual(sorted(len(batch) for batch in self.images.batches), [2, 4, 4], "ingest_file failed - not inserted in batches")
+        self.assertEqual(sorted(image_id for batch in self.images.batches for image_id in batch), list(range(10)), "ingest_file failed - images missed")
+        self.assertEqual(self.qm.progress[-1], (10, 10, 0, 0, 10), "ingest_file failed - final progress not recorded")
+        self.assertFalse(os.path.exists(path), "ingest_file failed - file left in the drop directory")
+        self.assertTrue(os.path.exists(os.path.join(self.drop_dir, "processed", "dsta.json")), "ingest_file failed - file not moved to processed")
+
+    def test_ingest_file_duplicate(self):
+        contents = _dsta_file(range(3))
+        first = self.ingester.ingest_file(self._drop("dsta.json", contents))
+        self.images.batches = []
+        job_id = self.ingester.ingest_file(self._drop("dsta.json", contents))
+        self.assertEqual(self.qm.jobs[job_id]["duplicate_of"], first, "ingest_file failed - duplicate not recorded")
+        self.assertEqual(self.images.batches, [], "ingest_file failed - duplicate file ingested")
+        self.assertTrue(os.path.exists(os.path.join(self.drop_dir, "processed", f"dsta.{job_id}.json")), "ingest_file failed - duplicate not moved aside")
+
+    def test_ingest_file_invalid(self):
+        for name, contents in (("empty.json", b""), ("truncated.json", _dsta_file(range(3))[:-10])):
+            job_id = self.ingester.ingest_file(self._drop(name, contents))
+            self.assertEqual(self.qm.jobs[job_id]["status"], "failed", f"ingest_file failed - {name} not recorded as failed")
+            self.assertTrue(os.path.exists(os.path.join(self.drop_dir, "failed", name)), f"ingest_file failed - {name} not moved to failed")
+
+    def test_ingest_file_heartbeat(self):
+        release = threading.Event()
+        insert = self.images.insert_dsta_data
+
+        def slow_insert(payload, **kwargs):
+            release.wait(5)
+            return insert(payload, **kwargs)
+
+        self.images.insert_dsta_data = slow_insert
+        self.ingester.heartbeat_seconds = 0.01
+        worker = threading.Thread(target=self.ingester.ingest_file, args=(self._drop("dsta.json", _dsta_file(range(3))), ))
+        worker.start()
+        for _ in range(500):
+            if self.qm.touched:
+                break
+            time.sleep(0.01)
+        release.set()
+        worker.join(5)
+        job_id = next(iter(self.qm.jobs))
+        self.assertIn(job_id, self.qm.touched, "ingest_file failed - no heartbeat while a batch was running")
+        self.assertEqual(self.qm.jobs[job_id]["status"], "succeeded", "ingest_file failed - job not finished")
+        touched = len(self.qm.touched)
+        time.sleep(0.05)
+        self.assertEqual(len(self.qm.touched), touched, "ingest_file failed - heartbeat kept running after the job")
+
+    def test_scan_waitsForFilesToSettle(self):
+        path = self._drop("dsta.json", _dsta_file(range(3)))
+        self._drop("notes.txt", b"")
+        self.assertEqual(self.ingester.scan(), [], "scan failed - returned a file that may still be copying")
+        self.assertEqual(self.ingester.scan(), [path], "scan failed - settled file not returned")
+        with open(path, "ab") as f:
+            f.write(b" ")
+        self.assertEqual(self.ingester.scan(), [], "scan failed - returned a file that grew")
+
+    def test_run_once(self):
+        self.qm.jobs["old"] = {"status": "running", "source": DROP_SOURCE, "file_name": "dsta.json", "stale": True}
+        self.qm.jobs["other"] = {"status": "running", "source": DROP_SOURCE, "file_name": "other.json"}
+        self._drop("dsta.json", _dsta_file(range(3)))
+        self.ingester.run(once=True)
+        self.assertEqual(self.qm.jobs["old"]["status"], "failed", "run failed - interrupted job left running")
+        self.assertEqual(self.qm.jobs["other"]["status"], "running", "run failed - another worker's running job failed")
+        self.assertEqual(os.listdir(os.path.join(self.drop_dir, "processed")), ["dsta.json"], "run failed - file not ingested")
+
+    def startUnitTest(self):
+        suite = unittest.TestLoader().loadTestsFromTestCase(IngestWorker_unittest)
+        unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,222 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from main_classes import KeycloakAuth as keycloak_auth_module
+from main_classes.ConfigClass import ConfigClass
+from main_classes.KeycloakAuth import KeycloakAuth
+from testing.keycloak_standin import KeycloakStandIn
+
+
+class KeycloakAuth_unittest(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.standin = KeycloakStandIn().start()
+        self.standin.enable_signing(kid="kid-1")
+
+        config_file = tempfile.NamedTemporaryFile("w", suffix=".config", delete=False)
+        config_file.write(
+            "[Keycloak]\n"
+            f"keycloak_url: {self.standin.url}\n"
+            f"realm: {self.standin.realm}\n"
+            "client_id: xbi-tasking-backend\n"
+            "client_secret: standin-secret\n"
+            "allowed_client_ids: xbi-tasking-frontend\n"
+        )
+        config_file.close()
+        self.config_path = config_file.name
+        self.config = ConfigClass(self.config_path)
+
+    @classmethod
+    def tearDownClass(self):
+        self.standin.stop()
+        os.remove(self.config_path)
+
+    def setUp(self):
+        self.standin.requests.clear()
+        self.auth = KeycloakAuth(config=self.config)
+
+    def _run(self, coro):
+        async def run_and_close():
+            try:
+                return await coro
+            finally:
+                await self.auth.aclose()
+
+        return asyncio.run(run_and_close())
+
+    def _requests_to(self, suffix):
+        return [path for method, path, query in self.standin.requests if path.endswith(suffix)]
+
+    def test_verify_token_baseCase(self):
+        token = self.standin.issue_token("ii00001", roles=["II"])
+        res = self._run(self.auth.verify_token(token))
+        self.assertEqual(res["preferred_username"], "ii00001", "verify_token failed - wrong user")
+        self.assertEqual(res["account_type"], "II", "verify_token failed - wrong account type")
+        self.assertIn("kid-1", self.auth._signing_keys, "verify_token failed - signing key not indexed by kid")
+
+    def test_verify_token_subIsStandInUserId(self):
+        user = self.standin.add_user("ii00009", roles=["II"])
+        res = self._run(self.auth.verify_token(self.standin.issue_token("ii00009", roles=["II"])))
+        self.assertEqual(res["sub"], user["id"], "verify_token failed - sub does not match the user's id")
+
+    def test_verify_token_cacheHit(self):
+        token = self.standin.issue_token("senior00001", roles=["II", "Senior II"])
+
+        async def verify_twice():
+            first = await self.auth.verify_token(token)
+            first["roles"].append("tampered")
+            return first, await self.auth.verify_token(token)
+
+        first, second = self._run(verify_twice())
+        self.assertEqual(second["account_type"], "Senior II", "verify_token failed - cached user info wrong")
+        self.assertEqual(self.auth.token_cache_hits, 1, "verify_token failed - second call did not hit the cache")
+        self.assertEqual(len(self._requests_to("/certs")), 1, "verify_token failed - JWKS fetched more than once")
+        self.assertNotIn("tampered", second["roles"], "verify_token failed - cache entry shared with caller")
+
+    def test_verify_token_cacheBoundedByExp(self):
+        token = self.standin.issue_token("ii00002", roles=["II"], expires_in=300)
+
+        async def verify_after_expiry():
+            await self.auth.verify_token(token)
+            digest = next(iter(self.auth._token_cache))
+            user_info, _ = self.auth._token_cache[digest]
+            self.auth._token_cache[digest] = (user_info, time.time() - 1)
+            return await self.auth.verify_token(token)
+
+        self._run(verify_after_expiry())
+        self.assertEqual(self.auth.token_cache_hits, 0, "verify_token failed - expired cache entry served")
+
+    def test_verify_token_cacheLruEviction(self):
+        self.auth.token_cache_size = 2
+        tokens = [self.standin.issue_token(f"ii1000{i}", roles=["II"]) for i in range(3)]
+
+        async def verify_all():
+            for token in tokens:
+                await self.auth.verify_token(token)
+
+        self._run(verify_all())
+        self.assertEqual(len(self.auth._token_cache), 2, "verify_token failed - token cache not bounded")
+
+    def test_verify_token_rejectsWrongIssuer(self):
+        token = self.standin.issue_token("ii00003", roles=["II"], client_id="other-client")
+        res = self._run(self.auth.verify_token(token))
+        self.assertIsNone(res, "verify_token failed - token for another client accepted")
+        self.assertEqual(len(self.auth._token_cache), 0, "verify_token failed - rejected token cached")
+
+    def test_unknownKid_singleFlightRefresh(self):
+        original_interval = keycloak_auth_module.JWKS_MIN_REFRESH_INTERVAL
+        keycloak_auth_module.JWKS_MIN_REFRESH_INTERVAL = 0
+        try:
+            async def rotate_and_verify():
+                await self.auth._refresh_jwks()
+                self.standin.enable_signing(kid="kid-2")
+                tokens = [self.standin.issue_token(f"ii2000{i}", roles=["II"]) for i in range(20)]
+                self.standin.requests.clear()
+                return await asyncio.gather(*(self.auth.verify_token(token) for token in tokens))
+
+            results = self._run(rotate_and_verify())
+        finally:
+            keycloak_auth_module.JWKS_MIN_REFRESH_INTERVAL = original_interval
+            self.standin.active_kid = "kid-1"
+
+        self.assertTrue(all(results), "verify_token failed - tokens signed with rotated key rejected")
+        self.assertEqual(len(self._requests_to("/certs")), 1, "JWKS refresh failed - concurrent refreshes not coalesced")
+
+    def test_unknownKid_refreshRateLimited(self):
+        async def lookup_unknown():
+            await self.auth._refresh_jwks()
+            self.standin.requests.clear()
+            return [await self.auth._get_signing_key("unknown") for _ in range(5)]
+
+        res = self._run(lookup_unknown())
+        self.assertEqual(res, [None] * 5, "_get_signing_key failed - unknown kid resolved")
+        self.assertEqual(len(self._requests_to("/certs")), 0, "JWKS refresh failed - unknown kid not rate limited")
+
+    def test_start_baseCase(self):
+        async def start_and_verify():
+            await self.auth.start()
+            self.standin.requests.clear()
+            return await self.auth.verify_token(self.standin.issue_token("ii00005", roles=["II"]))
+
+        res = self._run(start_and_verify())
+        self.assertEqual(res["preferred_username"], "ii00005", "start failed - token not verified")
+        self.assertTrue(self.auth.jwks_url.endswith("/certs"), "start failed - JWKS URL not discovered")
+        self.assertEqual(self.standin.requests, [], "start failed - JWKS not loaded during startup")
+        self.assertIsNone(self.auth._http, "aclose failed - shared client not closed")
+
+    def test_start_notEager(self):
+        self.auth = KeycloakAuth(config=self.config, eager=False)
+        self._run(self.auth.start())
+        self.assertEqual(self.standin.requests, [], "start failed - Keycloak contacted when not eager")
+
+    def _without_jwks(self):
+        async def no_signing_key(kid):
+            return None
+
+        self.auth._get_signing_key = no_signing_key
+
+    def test_introspection_cachesActiveToken(self):
+        self._without_jwks()
+        token = self.standin.issue_token("ii00006", roles=["II"])
+
+        async def verify_twice():
+            return [await self.auth.verify_token(token) for _ in range(2)]
+
+        res = self._run(verify_twice())
+        self.assertEqual([info["preferred_username"] for info in res], ["ii00006"] * 2, "introspection failed - wrong user")
+        self.assertEqual(len(self._requests_to("/introspect")), 1, "introspection failed - result not cached")
+        self.assertEqual(self.auth.stats()["introspection_cache_hits"], 1, "stats failed - cache hit not counted")
+
+    def test_introspection_cacheBoundedByExp(self):
+        self._without_jwks()
+        token = self.standin.issue_token("ii00007", roles=["II"], expires_in=5)
+        self._run(self.auth.verify_token(token))
+        _, expires_at = next(iter(self.auth._introspection_cache.values()))
+        self.assertLessEqual(expires_at, time.time() + 5, "introspection failed - cache entry outlives token exp")
+
+    def test_introspection_negativeCache(self):
+        self._without_jwks()
+        token = self.standin.issue_token("ii00008", roles=["II"])
+        self.standin.revoke(token)
+
+        async def verify_twice():
+            return [await self.auth.verify_token(token) for _ in range(2)]
+
+        res = self._run(verify_twice())
+        self.assertEqual(res, [None, None], "introspection failed - revoked token accepted")
+        self.assertEqual(len(self._requests_to("/introspect")), 1, "introspection failed - inactive token not cached")
+        self.assertEqual(self.auth.stats()["introspection_negative_hits"], 1, "stats failed - negative hit not counted")
+
+    def test_introspection_circuitBreaker(self):
+        self._without_jwks()
+        tokens = [self.standin.issue_token(f"ii3000{i}", roles=["II"]) for i in range(8)]
+        self.standin.fail_next(100)
+        try:
+            async def verify_all():
+                return [await self.auth.verify_token(token) for token in tokens]
+
+            res = self._run(verify_all())
+        finally:
+            self.standin.fail_next(0)
+
+        stats = self.auth.stats()
+        threshold = keycloak_auth_module.INTROSPECTION_BREAKER_THRESHOLD
+        self.assertEqual(res, [None] * 8, "circuit breaker failed - token accepted during outage")
+        self.assertEqual(len(self._requests_to("/introspect")), threshold, "circuit breaker failed - Keycloak still called while open")
+        self.assertEqual(stats["introspection_short_circuits"], 8 - threshold, "stats failed - short circuits not counted")
+        self.assertEqual((stats["breaker_state"], stats["breaker_opens"]), ("open", 1), "stats failed - breaker state wrong")
+
+    def test_introspection_circuitBreakerHalfOpen(self):
+        self._without_jwks()
+        self.auth._introspection_consecutive_failures = keycloak_auth_module.INTROSPECTION_BREAKER_THRESHOLD
+        self.auth._breaker_open_until = time.time() - 1
+        res = self._run(self.auth.verify_token(self.standin.issue_token("ii00009", roles=["II"])))
+        self.assertEqual(res["preferred_username"], "ii00009", "circuit breaker failed - probe request not allowed")
+        self.assertEqual(self.auth.stats()["breaker_state"], "closed", "circuit breaker failed - not closed after success")
+
+    def startUnitTest(self):
+        suite = unittest.TestLoader().loadTestsFromTestCase(KeycloakAuth_unittest)
+        unittest.TextTestRunner(verbosity=2).run(suite)
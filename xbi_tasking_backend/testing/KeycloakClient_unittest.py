@@ -0,0 +1,132 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from urllib.parse import unquote
+
+import requests
+
+from main_classes.ConfigClass import ConfigClass
+from main_classes.KeycloakClient import KeycloakClient
+from main_classes.query_keycloak import KeycloakQueries
+from services.async_keycloak_service import AsyncKeycloakService
+from services.keycloak_service import KeycloakService
+from testing.keycloak_standin import KeycloakStandIn
+
+
+class KeycloakClient_unittest(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.standin = KeycloakStandIn().start()
+        self.standin.add_users(2500, "II", prefix="ii")
+        self.standin.add_users(40, "Senior II", prefix="senior")
+        self.standin.add_users(0, "IA")
+        self.roleless_users = [self.standin.add_user(f"roleless{i:03d}") for i in range(300)]
+
+        config_file = tempfile.NamedTemporaryFile("w", suffix=".config", delete=False)
+        config_file.write(
+            "[Keycloak]\n"
+            f"keycloak_url: {self.standin.url}\n"
+            f"realm: {self.standin.realm}\n"
+            "admin_client_id: xbi-tasking-admin\n"
+            "admin_client_secret: standin-secret\n"
+            "http_retry_backoff: 0.01\n"
+        )
+        config_file.close()
+        self.config_path = config_file.name
+        self.client = KeycloakClient(config=ConfigClass(self.config_path))
+
+    @classmethod
+    def tearDownClass(self):
+        self.standin.stop()
+        os.remove(self.config_path)
+
+    def setUp(self):
+        self.standin.requests.clear()
+        self.token = self.client.get_admin_token()
+
+    def _role_requests(self, role_name):
+        path = f"/admin/realms/{self.standin.realm}/roles/{role_name}/users"
+        return [query for method, req_path, query in self.standin.requests if unquote(req_path) == path]
+
+    def test_get_users_for_role_baseCase_allPages(self):
+        users = self.client.get_users_for_role(self.token, "II")
+        res = sorted(user["username"] for user in users)
+        exp = sorted(user["username"] for user in self.standin.role_members["II"])
+        self.assertEqual(res, exp, "get_users_for_role failed - users missing or duplicated across pages")
+
+        offsets = sorted(int(query["first"][0]) for query in self._role_requests("II"))
+        self.assertEqual(offsets[:26], list(range(0, 2600, 100)), "get_users_for_role failed - pages not requested by offset")
+
+    def test_get_users_for_role_edgeCase_singlePage(self):
+        users = self.client.get_users_for_role(self.token, "Senior II")
+        self.assertEqual(len(users), 40, "get_users_for_role failed - short role not fully returned")
+        self.assertEqual(len(self._role_requests("Senior II")), 1, "get_users_for_role failed - extra pages fetched for a short role")
+
+    def test_get_users_for_role_edgeCase_emptyRole(self):
+        self.assertEqual(self.client.get_users_for_role(self.token, "IA"), [], "get_users_for_role failed - empty role")
+
+    def test_iter_users_baseCase(self):
+        res = [user["username"] for user in self.client.iter_users(self.token)]
+        self.assertEqual(len(res), len(self.standin.users), "iter_users failed - realm users missing")
+        self.assertEqual(len(set(res)), len(res), "iter_users failed - duplicated users")
+
+    def test_get_keycloak_usernames_bulk_baseCase_allRoles(self):
+        queries = KeycloakQueries(None, {}, keycloak_service=KeycloakService(client=self.client))
+        expected_users = self.standin.role_members["II"][-3:] + self.standin.role_members["Senior II"][:2]
+        res = queries.get_keycloak_usernames_bulk([user["id"] for user in expected_users])
+        exp = {user["id"]: user["username"] for user in expected_users}
+        self.assertEqual(res, exp, "get_keycloak_usernames_bulk failed - role members not resolved")
+        by_id_requests = [path for method, path, query in self.standin.requests if "/users/" in path and "/roles/" not in path]
+        self.assertEqual(by_id_requests, [], "get_keycloak_usernames_bulk failed - fell back to per-id lookups")
+
+    def test_http_session_baseCase_reusesConnections(self):
+        before = self.client.get_http_stats()
+        for user in self.standin.role_members["Senior II"][:20]:
+            self.client.get_user_by_id(self.token, user["id"])
+        after = self.client.get_http_stats()
+        self.assertEqual(after["requests"] - before["requests"], 20, "http session failed - requests not counted")
+        self.assertLessEqual(after["new_connections"] - before["new_connections"], 1, "http session failed - connections not kept alive")
+        self.assertGreaterEqual(after["reused_connections"] - before["reused_connections"], 19, "http session failed - connections not reused")
+
+    def test_http_session_edgeCase_retriesServerErrors(self):
+        user = self.standin.role_members["II"][0]
+        before = self.client.get_http_stats()
+        self.standin.fail_next(2)
+        res = self.client.get_user_by_id(self.token, user["id"])
+        self.assertEqual(res["username"], user["username"], "http session failed - request not retried after 503")
+        self.assertEqual(self.client.get_http_stats()["retries"] - before["retries"], 2, "http session failed - retries not counted")
+
+    def test_http_session_edgeCase_retriesExhausted(self):
+        self.standin.fail_next(10)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.client.get_user_by_id(self.token, self.standin.role_members["II"][0]["id"])
+        self.standin.fail_next(0)
+
+    def test_async_get_users_by_ids_baseCase(self):
+        async def run():
+            service = AsyncKeycloakService(config=self.client.config)
+            try:
+                token = await service.get_admin_token()
+                user_ids = [user["id"] for user in self.roleless_users] + ["missing-id"]
+                return await service.get_users_by_ids(token, user_ids, concurrency=10)
+            finally:
+                await service.aclose()
+
+        res = asyncio.run(run())
+        exp = {user["id"]: user["username"] for user in self.roleless_users}
+        self.assertEqual({user_id: user["username"] for user_id, user in res.items()}, exp, "get_users_by_ids failed - users missing or unknown id not skipped")
+
+    def test_get_keycloak_usernames_bulk_edgeCase_usersOutsideRoles(self):
+        service = KeycloakService(client=self.client)
+        queries = KeycloakQueries(None, {}, keycloak_service=service)
+        res = queries.get_keycloak_usernames_bulk([user["id"] for user in self.roleless_users])
+        exp = {user["id"]: user["username"] for user in self.roleless_users}
+        bridge = service._get_async_bridge()
+        service.close()
+        self.assertEqual(res, exp, "get_keycloak_usernames_bulk failed - fallback lookups not resolved through async bridge")
+        self.assertFalse(bridge._thread.is_alive(), "close failed - async bridge thread left running")
+        service.close()
+
+    def startUnitTest(self):
+        unittest.main()
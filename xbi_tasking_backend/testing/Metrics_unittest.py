@@ -0,0 +1,142 @@
+import asyncio
+import contextvars
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+from main_classes.ConfigClass import ConfigClass
+from main_classes.KeycloakAuth import KeycloakAuth
+from middleware import RequestTimingMiddleware
+from routers import metrics as metrics_router
+from testing.keycloak_standin import KeycloakStandIn
+
+
+class Metrics_unittest(unittest.TestCase):
+    def test_counter_render(self):
+        registry = metrics.MetricsRegistry()
+        counter = registry.counter("test_requests_total", "Test requests", ("route",))
+        counter.inc(route="/a")
+        counter.inc(2, route='/b"quoted"')
+        res = registry.render()
+        exp = (
+            "# HELP test_requests_total Test requests\n"
+            "# TYPE test_requests_total counter\n"
+            'test_requests_total{route="/a"} 1\n'
+            'test_requests_total{route="/b\\"quoted\\""} 2\n'
+        )
+        self.assertEqual(res, exp, "Counter render failed - wrong exposition format")
+
+    def test_histogram_render(self):
+        registry = metrics.MetricsRegistry()
+        histogram = registry.histogram("test_seconds", "Test latency", buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value)
+        res = registry.render().splitlines()[2:]
+        exp = [
+            'test_seconds_bucket{le="0.1"} 2',
+            'test_seconds_bucket{le="1"} 3',
+            'test_seconds_bucket{le="+Inf"} 4',
+            "test_seconds_sum 3.65",
+            "test_seconds_count 4",
+        ]
+        self.assertEqual(res, exp, "Histogram render failed - buckets not cumulative")
+
+    def test_counter_wrongLabels(self):
+        counter = metrics.Counter("test_total", "Test", ("route",))
+        with self.assertRaises(ValueError):
+            counter.inc(path="/a")
+
+    def test_keycloak_endpoint_templates(self):
+        cases = {
+            "/realms/xbi-tasking/protocol/openid-connect/token": "token",
+            "/realms/xbi-tasking/protocol/openid-connect/token/introspect": "token/introspect",
+            "/admin/realms/xbi-tasking/users": "admin/users",
+            "/admin/realms/xbi-tasking/users/0b6f6c8e-1c1e-4a5b-9f43-1f1d5f0f2a10": "admin/users/{id}",
+            "/admin/realms/xbi-tasking/roles/Senior II/users": "admin/roles/{role}/users",
+            "/admin/realms/xbi-tasking/users/abc/role-mappings/realm": "admin/users/{id}/role-mappings/realm",
+        }
+        res = {path: metrics.keycloak_endpoint(path) for path in cases}
+        self.assertEqual(res, cases, "keycloak_endpoint failed - paths not templated")
+
+    def test_requestTiming_routeTemplateAndDbTime(self):
+        app = FastAPI()
+        app.add_middleware(RequestTimingMiddleware)
+        app.include_router(metrics_router.router)
+
+        @app.get("/images/{image_id}")
+        async def get_image(image_id: int):
+            await run_in_threadpool(metrics.record_db_time, 0.25)
+            return {"id": image_id}
+
+        client = TestClient(app)
+        before = metrics.HTTP_REQUESTS.get(method="GET", route="/images/{image_id}", status=200)
+        for image_id in (1, 2, 3):
+            client.get(f"/images/{image_id}")
+        after = metrics.HTTP_REQUESTS.get(method="GET", route="/images/{image_id}", status=200)
+        self.assertEqual(after - before, 3, "RequestTimingMiddleware failed - requests not counted per route template")
+
+        with mock.patch.dict(os.environ, {"METRICS_TOKEN": "scrape"}):
+            self.assertEqual(client.get("/metrics").status_code, 401, "metrics failed - served without the token")
+            res = client.get("/metrics", headers={"Authorization": "Bearer scrape"})
+        with mock.patch.dict(os.environ):
+            os.environ.pop("METRICS_TOKEN", None)
+            self.assertEqual(client.get("/metrics").status_code, 404, "metrics failed - served with no METRICS_TOKEN set")
+        self.assertTrue(res.headers["content-type"].startswith("text/plain; version=0.0.4"), "metrics failed - wrong content type")
+        self.assertIn(
+            'xbi_http_request_db_seconds_bucket{method="GET",route="/images/{image_id}",le="0.25"} 3',
+            res.text,
+            "RequestTimingMiddleware failed - DB time not carried across the threadpool hop",
+        )
+
+    def test_dbTime_outsideRequest(self):
+        res = contextvars.copy_context().run(metrics.record_db_time, 0.1)
+        self.assertIsNone(res, "record_db_time failed - raised outside a request")
+
+    def test_cacheHitRatio(self):
+        before_hits = metrics.CACHE_LOOKUPS.get(cache="user_directory", result="hit")
+        before_misses = metrics.CACHE_LOOKUPS.get(cache="user_directory", result="miss")
+        metrics.record_cache_lookup("user_directory", hits=3, misses=1)
+        hits = before_hits + 3
+        total = hits + before_misses + 1
+        self.assertIn(
+            f'xbi_cache_hit_ratio{{cache="user_directory"}} {metrics._format_value(hits / total)}',
+            metrics.REGISTRY.render(),
+            "metrics failed - cache hit ratio not exported",
+        )
+
+    def test_keycloakAuth_callsRecorded(self):
+        standin = KeycloakStandIn().start()
+        standin.enable_signing()
+        config_file = tempfile.NamedTemporaryFile("w", suffix=".config", delete=False)
+        config_file.write(
+            "[Keycloak]\n"
+            f"keycloak_url: {standin.url}\n"
+            f"realm: {standin.realm}\n"
+            "client_id: xbi-tasking-backend\n"
+            "client_secret: standin-secret\n"
+        )
+        config_file.close()
+        try:
+            auth = KeycloakAuth(config=ConfigClass(config_file.name))
+            before = metrics.KEYCLOAK_REQUESTS.get(client="auth", endpoint="certs", status=200)
+
+            async def start_and_close():
+                await auth.start()
+                await auth.aclose()
+
+            asyncio.run(start_and_close())
+        finally:
+            standin.stop()
+            os.remove(config_file.name)
+        after = metrics.KEYCLOAK_REQUESTS.get(client="auth", endpoint="certs", status=200)
+        self.assertEqual(after - before, 1, "KeycloakAuth failed - JWKS call not recorded")
+
+    def startUnitTest(self):
+        suite = unittest.TestLoader().loadTestsFromTestCase(Metrics_unittest)
+        unittest.TextTestRunner(verbosity=2).run(suite)
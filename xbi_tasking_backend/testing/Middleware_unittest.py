@@ -0,0 +1,77 @@
+import unittest
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.testclient import TestClient
+
+from middleware import KeycloakAuthMiddleware, RequestTimingMiddleware
+
+
+class StubKeycloakAuth:
+    def __init__(self):
+        self.tokens = {"good-token": {"sub": "1", "preferred_username": "ii00001", "roles": ["II"]}}
+        self.verified = []
+
+    async def verify_token(self, token):
+        self.verified.append(token)
+        return self.tokens.get(token)
+
+
+class Middleware_unittest(unittest.TestCase):
+    def setUp(self):
+        app = FastAPI()
+        app.state.keycloak_auth = StubKeycloakAuth()
+        app.add_middleware(KeycloakAuthMiddleware)
+        app.add_middleware(RequestTimingMiddleware)
+        app.add_middleware(CORSMiddleware, allow_origins=["http://localhost:5173"], allow_methods=["*"], allow_headers=["*"])
+
+        @app.get("/")
+        async def index():
+            return "it works"
+
+        @app.get("/static/app.js")
+        async def static_file():
+            return "static"
+
+        @app.get("/whoami")
+        async def whoami(request: Request):
+            return request.state.user
+
+        self.keycloak_auth = app.state.keycloak_auth
+        self.client = TestClient(app)
+
+    def test_exemptPaths_noAuth(self):
+        res = [self.client.get(path).status_code for path in ("/", "/static/app.js")]
+        self.assertEqual(res, [200, 200], "KeycloakAuthMiddleware failed - exempt path required auth")
+        self.assertEqual(self.keycloak_auth.verified, [], "KeycloakAuthMiddleware failed - token verified for exempt path")
+
+    def test_options_passesThrough(self):
+        res = self.client.options(
+            "/whoami",
+            headers={"Origin": "http://localhost:5173", "Access-Control-Request-Method": "GET"},
+        )
+        self.assertEqual(res.status_code, 200, "KeycloakAuthMiddleware failed - CORS preflight rejected")
+
+    def test_missingHeader_401(self):
+        res = self.client.get("/whoami", headers={"Origin": "http://localhost:5173"})
+        self.assertEqual(res.status_code, 401, "KeycloakAuthMiddleware failed - request without token allowed")
+        self.assertEqual(res.headers.get("www-authenticate"), "Bearer", "KeycloakAuthMiddleware failed - missing WWW-Authenticate")
+        self.assertEqual(
+            res.headers.get("access-control-allow-origin"),
+            "http://localhost:5173",
+            "KeycloakAuthMiddleware failed - 401 not wrapped by CORS",
+        )
+
+    def test_invalidToken_401(self):
+        res = self.client.get("/whoami", headers={"Authorization": "Bearer bad-token"})
+        self.assertEqual(res.status_code, 401, "KeycloakAuthMiddleware failed - invalid token allowed")
+        self.assertEqual(res.json()["detail"], "Invalid or expired token")
+
+    def test_validToken_setsUser(self):
+        res = self.client.get("/whoami", headers={"Authorization": "Bearer good-token"})
+        self.assertEqual(res.status_code, 200, "KeycloakAuthMiddleware failed - valid token rejected")
+        self.assertEqual(res.json()["preferred_username"], "ii00001", "KeycloakAuthMiddleware failed - user not on request.state")
+
+    def startUnitTest(self):
+        suite = unittest.TestLoader().loadTestsFromTestCase(Middleware_unittest)
+        unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,87 @@
+import datetime
+import unittest
+
+from main_classes.partitions import attach_image_partition
+from services.partition_service import PartitionService
+
+
+class _FakeQueryManager:
+    def __init__(self, existing=(), stranded=(), failing=()):
+        self.existing = set(existing)
+        self.stranded = list(stranded)
+        self.failing = set(failing)
+        self.timeouts = []
+
+    def getDefaultPartitionMonths(self):
+        return self.stranded
+
+    def ensureImagePartition(self, month, lock_timeout_ms=5000):
+        self.timeouts.append(lock_timeout_ms)
+        if month in self.failing:
+            raise RuntimeError("canceling statement due to lock timeout")
+        if month in self.existing:
+            return None
+        self.existing.add(month)
+        return 0
+
+
+class _FakeCursor:
+    '''
+    Records statements and answers the catalog and count lookups attach_image_partition makes
+    '''
+    def __init__(self, exists=False, stranded=0):
+        self.exists = exists
+        self.stranded = stranded
+        self.queries = []
+        self._result = None
+
+    def execute(self, query, values=None):
+        self.queries.append(" ".join(query.split()))
+        if query.startswith("SELECT to_regclass"):
+            self._result = [("image_p2025_03" if self.exists else None, )]
+        elif query.startswith("SELECT COUNT(*)"):
+            self._result = [(self.stranded, )]
+        elif query.startswith("SELECT conname"):
+            self._result = [("image_area_fk", "FOREIGN KEY (scvu_image_id, upload_date) REFERENCES image(scvu_image_id, upload_date)")]
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+
+class PartitionService_unittest(unittest.TestCase):
+    def test_ensure_partitions_comingMonths(self):
+        qm = _FakeQueryManager(existing={datetime.date(2025, 11, 1)})
+        res = PartitionService(qm, months_ahead=2, lock_timeout_ms=100).ensure_partitions(now=datetime.datetime(2025, 11, 20))
+        self.assertEqual(res, [datetime.date(2025, 12, 1), datetime.date(2026, 1, 1)], "ensure_partitions failed - wrong months created")
+        self.assertEqual(set(qm.timeouts), {100}, "ensure_partitions failed - lock timeout not passed on")
+
+    def test_ensure_partitions_strandedAndFailing(self):
+        qm = _FakeQueryManager(stranded=[datetime.date(2024, 2, 1)], failing={datetime.date(2025, 12, 1)})
+        res = PartitionService(qm, months_ahead=1).ensure_partitions(now=datetime.datetime(2025, 11, 20))
+        self.assertEqual(res, [datetime.date(2024, 2, 1), datetime.date(2025, 11, 1)], "ensure_partitions failed - stranded month not created or failure stopped the run")
+
+    def test_attach_image_partition_movesStrandedRows(self):
+        cursor = _FakeCursor(stranded=4)
+        self.assertEqual(attach_image_partition(cursor, datetime.date(2025, 3, 1)), 4, "attach_image_partition failed - wrong number moved")
+        order = [
+            "CREATE TABLE image_p2025_03",
+            "ALTER TABLE image_area DROP CONSTRAINT image_area_fk",
+            "WITH moved AS (DELETE FROM image_default",
+            "ALTER TABLE image ATTACH PARTITION image_p2025_03",
+            "ALTER TABLE image_area ADD CONSTRAINT image_area_fk FOREIGN KEY",
+        ]
+        positions = [next(i for i, query in enumerate(cursor.queries) if query.startswith(prefix)) for prefix in order]
+        self.assertEqual(positions, sorted(positions), "attach_image_partition failed - rows not moved before the partition is attached")
+
+    def test_attach_image_partition_noStrandedRows(self):
+        cursor = _FakeCursor()
+        self.assertEqual(attach_image_partition(cursor, datetime.date(2025, 3, 1)), 0, "attach_image_partition failed - wrong number moved")
+        self.assertFalse(any("image_area" in query or "DELETE" in query for query in cursor.queries), "attach_image_partition failed - touched image_area with nothing to move")
+        self.assertIsNone(attach_image_partition(_FakeCursor(exists=True), datetime.date(2025, 3, 1)), "attach_image_partition failed - existing partition recreated")
+
+    def startUnitTest(self):
+        suite = unittest.TestLoader().loadTestsFromTestCase(PartitionService_unittest)
+        unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,101 @@
+import pstats
+import shutil
+import tempfile
+import unittest
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from api_utils import run_blocking
+from middleware import KeycloakAuthMiddleware, ProfilingMiddleware
+from profiling import ProfileStore
+from routers import profiles
+from testing.Middleware_unittest import StubKeycloakAuth
+
+
+def blocking_report_query(n):
+    return sum(i * i for i in range(n))
+
+
+class Profiling_unittest(unittest.TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        app = FastAPI()
+        app.state.keycloak_auth = StubKeycloakAuth()
+        app.state.keycloak_auth.tokens["admin-token"] = {"sub": "2", "preferred_username": "ia00001", "account_type": "IA", "roles": ["IA"]}
+        app.state.profile_store = ProfileStore(self.profile_dir, max_profiles=2)
+        app.add_middleware(ProfilingMiddleware)
+        app.add_middleware(KeycloakAuthMiddleware)
+        app.include_router(profiles.router)
+
+        @app.get("/reports/slow")
+        async def slow(request: Request):
+            return {"total": await run_blocking(blocking_report_query, 20000)}
+
+        self.store = app.state.profile_store
+        self.client = TestClient(app)
+        self.admin = {"Authorization": "Bearer admin-token"}
+        self.ii = {"Authorization": "Bearer good-token"}
+
+    def tearDown(self):
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def test_profile_baseCase(self):
+        res = self.client.get("/reports/slow", headers=dict(self.admin, **{"X-Profile": "1"}))
+        profile_id = res.headers.get("x-profile-id")
+        self.assertTrue(ProfileStore.is_valid_id(profile_id), "ProfilingMiddleware failed - no profile id header")
+        self.assertEqual([meta["id"] for meta in self.store.list()], [profile_id], "ProfilingMiddleware failed - profile not stored")
+
+        functions = pstats.Stats(self.store.profile_path(profile_id)).stats
+        self.assertIn(
+            "blocking_report_query",
+            [name for _, _, name in functions],
+            "ProfilingMiddleware failed - threadpool work missing from profile",
+        )
+
+    def test_profile_nonAdminIgnored(self):
+        res = self.client.get("/reports/slow", headers=dict(self.ii, **{"X-Profile": "1"}))
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn("x-profile-id", res.headers, "ProfilingMiddleware failed - non-admin request profiled")
+        self.assertEqual(self.store.list(), [], "ProfilingMiddleware failed - profile stored for non-admin")
+
+    def test_profile_noHeader(self):
+        res = self.client.get("/reports/slow", headers=self.admin)
+        self.assertNotIn("x-profile-id", res.headers, "ProfilingMiddleware failed - request profiled without header")
+
+    def test_profile_ringBounded(self):
+        ids = [
+            self.client.get("/reports/slow", headers=dict(self.admin, **{"X-Profile": "1"})).headers["x-profile-id"]
+            for _ in range(3)
+        ]
+        res = [meta["id"] for meta in self.store.list()]
+        self.assertEqual(res, ids[:0:-1], "ProfileStore failed - oldest profile not evicted")
+        self.assertIsNone(self.store.profile_path(ids[0]), "ProfileStore failed - evicted profile still on disk")
+
+    def test_endpoints_listAndDownload(self):
+        profile_id = self.client.get("/reports/slow", headers=dict(self.admin, **{"X-Profile": "1"})).headers["x-profile-id"]
+
+        listing = self.client.get("/profiles", headers=self.admin).json()["profiles"]
+        self.assertEqual(listing[0]["path"], "/reports/slow", "list_profiles failed - wrong metadata")
+
+        download = self.client.get(f"/profiles/{profile_id}", headers=self.admin)
+        self.assertEqual(download.status_code, 200, "get_profile failed - download rejected")
+        self.assertGreater(len(download.content), 0, "get_profile failed - empty profile")
+
+        text = self.client.get(f"/profiles/{profile_id}", params={"format": "text"}, headers=self.admin)
+        self.assertIn("blocking_report_query", text.text, "get_profile failed - text report missing functions")
+
+    def test_endpoints_adminOnly(self):
+        res = [
+            self.client.get("/profiles", headers=self.ii).status_code,
+            self.client.get(f"/profiles/{ProfileStore.new_id()}", headers=self.ii).status_code,
+        ]
+        self.assertEqual(res, [403, 403], "profiles endpoints failed - non-admin allowed")
+
+    def test_endpoints_invalidId(self):
+        res = self.client.get("/profiles/..%2F..%2Fetc", headers=self.admin)
+        self.assertIn(res.status_code, (400, 404), "get_profile failed - path traversal id accepted")
+
+    def startUnitTest(self):
+        suite = unittest.TestLoader().loadTestsFromTestCase(Profiling_unittest)
+        unittest.TextTestRunner(verbosity=2).run(suite)
@@ -55,6 +55,46 @@ class QueryManager_unittest(unittest.TestCase):
         exp = 2
         self.assertEqual(res, exp, "insertImage failed - wrong ew status id")
     
+    def test_getExistingImageIds_baseCase(self):
+        curr_time = datetime.datetime.today()
+        self.qm.insertImage(1, 'hello.png', 'SB', curr_time, curr_time)
+        self.qm.insertImage(2, 'hello.png', 'SB', curr_time, curr_time)
+        res = self.qm.getExistingImageIds([1, 3])
+        self.assertEqual(res, {1}, "getExistingImageIds failed - wrong images found")
+
+        self.qm.createIngestJob('job1', 'dsta', 'dsta.json', None, 1, 'a' * 64)
+        self.qm.createIngestJob('job2', 'dsta', 'other.json', None, 1, 'b' * 64)
+        self.qm.insertImage(4, 'hello.png', 'SB', curr_time, curr_time, 'job1')
+        self.qm.finishIngestJob('job1', 'succeeded', 'done')
+        self.qm.finishIngestJob('job2', 'succeeded', 'done')
+        self.assertEqual(self.qm.findIngestJobByHash('a' * 64), ('job1', 'succeeded'), "findIngestJobByHash failed - ingested upload not found")
+        self.qm.deleteImage(self.qm.db.executeSelect("SELECT scvu_image_id FROM image WHERE image_id = 1")[0][0])
+        self.assertEqual(self.qm.findIngestJobByHash('a' * 64), ('job1', 'succeeded'), "deleteImage failed - fingerprint of an unrelated upload forgotten")
+        self.qm.deleteImage(self.qm.db.executeSelect("SELECT scvu_image_id FROM image WHERE image_id = 4")[0][0])
+        self.assertIsNone(self.qm.findIngestJobByHash('a' * 64), "deleteImage failed - fingerprint of the upload that inserted the image kept")
+        self.assertEqual(self.qm.findIngestJobByHash('b' * 64), ('job2', 'succeeded'), "deleteImage failed - other upload fingerprints forgotten")
+        self.assertEqual(self.qm.getExistingImageIds([1, 2]), {2}, "deleteImage failed - image_id still claimed")
+
+    def test_failStaleIngestJobs_baseCase(self):
+        self.qm.createIngestJob('job1', 'dsta', 'dsta.json', None, 2, 'a' * 64)
+        self.qm.createIngestJob('job2', 'dsta', 'other.json', None, 2, 'b' * 64)
+        self.qm.db.executeUpdate("UPDATE ingest_job SET heartbeat_at = now() - interval '1 hour' WHERE job_id = 'job1'")
+        self.assertIsNone(self.qm.findIngestJobByHash('a' * 64), "findIngestJobByHash failed - abandoned job treated as in progress")
+        self.assertEqual(self.qm.findIngestJobByHash('b' * 64), ('job2', 'queued'), "findIngestJobByHash failed - live job not found")
+        self.qm.failStaleIngestJobs(None, 'Interrupted')
+        res = [row[4] for row in (self.qm.getIngestJob('job1'), self.qm.getIngestJob('job2'))]
+        self.assertEqual(res, ['failed', 'queued'], "failStaleIngestJobs failed - wrong jobs failed")
+
+    def test_getFinishedIngestJobs_baseCase(self):
+        before = self.qm.db.executeSelect("SELECT now()")[0][0]
+        self.qm.createIngestJob('job1', 'dsta_drop', 'dsta.json', None, 2)
+        self.qm.createIngestJob('job2', 'dsta_drop', 'running.json', None, 2)
+        self.qm.createIngestJob('job3', 'dsta', 'upload.json', None, 2)
+        self.qm.finishIngestJob('job1', 'succeeded', 'done')
+        self.qm.finishIngestJob('job3', 'succeeded', 'done')
+        res = [row[0] for row in self.qm.getFinishedIngestJobs('dsta_drop', before)]
+        self.assertEqual(res, ['job1'], "getFinishedIngestJobs failed - wrong jobs returned")
+
     def test_insertArea_baseCase(self):
         self.qm.insertArea('area_1')
         self.qm.insertArea('area_1')
@@ -64,6 +104,20 @@ class QueryManager_unittest(unittest.TestCase):
         self.assertEqual(len(res), 1, "insertArea failed - multiple insertions")
         self.assertEqual(res[0][0], exp, "insertArea failed - wrong image_id")
     
+    def test_ensureImagePartition_movesDefaultRows(self):
+        self.qm.db.executeInsert("INSERT INTO sensor(id, name) VALUES (1, 'SB')")
+        upload_time = datetime.datetime(2020, 1, 15)
+        self.qm.insertImage(1, 'hello.png', 'SB', upload_time, upload_time)
+        self.qm.insertArea('areaHello')
+        self.qm.insertImageAreaDSTA(1, 'areaHello')
+        self.assertEqual(self.qm.getDefaultPartitionMonths(), [datetime.date(2020, 1, 1)], "getDefaultPartitionMonths failed - stranded month not found")
+
+        self.assertEqual(self.qm.ensureImagePartition(datetime.date(2020, 1, 1)), 1, "ensureImagePartition failed - default rows not moved")
+        self.assertIsNone(self.qm.ensureImagePartition(datetime.date(2020, 1, 1)), "ensureImagePartition failed - partition created twice")
+        self.assertEqual(self.qm.getDefaultPartitionMonths(), [], "ensureImagePartition failed - rows left in the default partition")
+        res = self.qm.db.executeSelect("SELECT image.image_id FROM image_p2020_01 AS image JOIN image_area ON image_area.scvu_image_id = image.scvu_image_id")
+        self.assertEqual(res, [(1, )], "ensureImagePartition failed - image or its area lost")
+
     def test_insertImageAreaDSTA_baseCase(self):
         self.qm.db.executeInsert("INSERT INTO sensor(id, name) VALUES (1, 'SB')")
         curr_time = datetime.datetime.now()
@@ -418,25 +472,119 @@ class QueryManager_unittest(unittest.TestCase):
         exp = image_id
         self.assertEqual(res, exp, 'getImageData failed')
     
-    def test_getXBIReportImage_baseCase(self):
-        self.qm.db.executeInsert("INSERT INTO sensor_category(id, name) VALUES (1, 'UNCATEGORISED') ON CONFLICT DO NOTHING")
-        self.qm.db.executeInsert("INSERT INTO sensor(id, name, category_id) VALUES (1, 'SB', 1)")
-        self.qm.db.executeInsert("INSERT INTO users(id, name) VALUES (1, 'hello')")
+    def test_streamImageData_baseCase(self):
+        self.qm.db.executeInsert("INSERT INTO sensor(id, name) VALUES (1, 'SB')")
+        for image_id, upload_date in ((1, '2023-02-07 12:00:00'), (2, '2023-02-07 09:00:00'), (3, '2023-02-09 09:00:00')):
+            self.qm.db.executeInsert("INSERT INTO image(sensor_id, image_file_name, image_id, upload_date, image_datetime, report_id, completed_date) VALUES (1, 'hello.png', %s, %s, %s, 1, %s)", (image_id, upload_date, upload_date, upload_date))
         
-        self.qm.db.executeInsert("INSERT INTO image(sensor_id, image_file_name, image_id, upload_date, image_datetime, report_id, priority_id, image_category_id, image_quality, cloud_cover_id, ew_status_id, completed_date) VALUES (1, 'hello.png', 1, '2023-02-07 11:44:10.973005', '2023-02-07 11:44:10.973005', 1, 1, 1, 'really bad', 1, 1, '2023-02-07 11:44:10.973005')")
-        image_id = self.qm.db.executeSelect("SELECT scvu_image_id FROM image")[0][0]
+        res = [row[3] for row in self.qm.streamImageData('2023-02-07', '2023-02-08')]
+        exp = [2, 1]
+        self.assertEqual(res, exp, 'streamImageData failed - wrong images or order')
+        self.assertEqual(sorted(list(self.qm.streamImageData('2023-02-07', '2023-02-08'))), sorted(self.qm.getImageData('2023-02-07', '2023-02-08')), 'streamImageData failed - rows differ from getImageData')
+    
+    def test_archiveCompletedImages_baseCase(self):
+        self.qm.db.executeInsert("INSERT INTO sensor(id, name, category_id) VALUES (1, 'SB', 1)")
+        for image_id, upload_date, completed_date in ((1, '2023-02-07 09:00:00', '2023-02-08 09:00:00'), (2, '2023-02-07 12:00:00', None), (3, '2023-06-07 09:00:00', '2023-06-07 10:00:00')):
+            self.qm.db.executeInsert("INSERT INTO image(sensor_id, image_file_name, image_id, upload_date, image_datetime, report_id, completed_date) VALUES (1, 'hello.png', %s, %s, %s, 1, %s)", (image_id, upload_date, upload_date, completed_date))
+        archived_id = self.qm.db.executeSelect("SELECT scvu_image_id FROM image WHERE image_id = 1")[0][0]
         self.qm.db.executeInsert("INSERT INTO area(area_name) VALUES ('area_51')")
         area_id = self.qm.db.executeSelect("SELECT scvu_area_id FROM area")[0][0]
-        self.qm.db.executeInsert(f"INSERT INTO image_area(scvu_image_id, scvu_area_id) VALUES (%s, %s)", (image_id, area_id))
+        self.qm.db.executeInsert("INSERT INTO image_area(scvu_image_id, scvu_area_id) VALUES (%s, %s)", (archived_id, area_id))
         image_area_id = self.qm.db.executeSelect("SELECT scvu_image_area_id FROM image_area")[0][0]
-        
-        self.qm.db.executeInsert(f"INSERT INTO task(assignee_id, task_status_id, scvu_image_area_id) VALUES (1, 3, %s)", (image_area_id, ))
-        task_id = self.qm.db.executeSelect("SELECT scvu_task_id FROM task")[0][0]
-        
-        res = self.qm.getXBIReportImage('2023-02-07', '2023-02-08')
-        exp = [('SB', 'UNCATEGORISED', 'DS(OF)')]
-        self.assertEqual(res, exp, 'getXBIReportImage failed')
-        
+        self.qm.db.executeInsert("INSERT INTO task(assignee_keycloak_id, task_status_id, scvu_image_area_id) VALUES ('kc-hello', 4, %s)", (image_area_id, ))
+        self.qm.rebuildReportDailyRollup()
+        counts = self.qm.getXBIReportCounts('2023-02-07', '2023-02-08')
+
+        self.assertFalse(self.qm.reachesArchive('2023-01-01'), 'reachesArchive failed - nothing archived yet')
+        self.assertEqual(self.qm.archiveCompletedImages(datetime.datetime(2023, 3, 1), 10), 1, 'archiveCompletedImages failed - wrong images archived')
+        self.assertEqual(self.qm.archiveCompletedImages(datetime.datetime(2023, 3, 1), 10), 0, 'archiveCompletedImages failed - image archived twice')
+        self.assertEqual(self.qm.db.executeSelect("SELECT image_id FROM image ORDER BY image_id"), [(2,), (3,)], 'archiveCompletedImages failed - image not moved')
+        self.assertEqual(self.qm.db.executeSelect("SELECT COUNT(*) FROM task_archive")[0][0], 1, 'archiveCompletedImages failed - task not moved')
+
+        self.assertTrue(self.qm.reachesArchive('2023-02-07'), 'reachesArchive failed - window before the boundary')
+        self.assertFalse(self.qm.reachesArchive('2023-03-01'), 'reachesArchive failed - window after the boundary')
+        self.assertEqual(self.qm.getImageData('2023-02-07', '2023-02-09'), [], 'getImageData failed - archived image read from the live tables')
+        res = self.qm.getImageDataForUser('2023-02-07', '2023-02-09', 'kc-hello', include_archive=True)
+        self.assertEqual([row[0] for row in res], [archived_id], 'getImageDataForUser failed - archived image missing')
+        res = self.qm.getImageAreaDataForImages([archived_id], include_archive=True)
+        self.assertEqual([row[2] for row in res], ['area_51'], 'getImageAreaDataForImages failed - archived area missing')
+
+        self.qm.rebuildReportDailyRollup()
+        self.assertEqual(self.qm.getXBIReportCounts('2023-02-07', '2023-02-08'), counts, 'rebuildReportDailyRollup failed - archived images not counted')
+
+    def test_archiveCompletedImages_updateSensorCategory(self):
+        self.qm.db.executeInsert("INSERT INTO sensor(id, name, category_id) VALUES (1, 'SB', 1)")
+        self.qm.db.executeInsert("INSERT INTO image(sensor_id, image_file_name, image_id, upload_date, image_datetime, report_id) VALUES (1, 'hello.png', 1, '2023-02-07 09:00:00', '2023-02-07 09:00:00', 1)")
+        image_id = self.qm.db.executeSelect("SELECT scvu_image_id FROM image")[0][0]
+        self.qm.completeImage(image_id, 'vetter', datetime.datetime(2023, 2, 8))
+        self.assertEqual(self.qm.archiveCompletedImages(datetime.datetime(2023, 3, 1), 10), 1, 'archiveCompletedImages failed - image not archived')
+
+        self.qm.updateSensorCategory([('UAV', 'SB')])
+        counts = self.qm.getXBIReportCounts('2023-02-07', '2023-02-08')
+        self.qm.rebuildReportDailyRollup()
+        self.assertEqual(counts, self.qm.getXBIReportCounts('2023-02-07', '2023-02-08'), 'updateSensorCategory failed - archived image left under the old category')
+
+    def test_getXBIReportCounts_baseCase(self):
+        self.qm.db.executeInsert("INSERT INTO sensor(id, name, category_id) VALUES (1, 'SB', 1)")
+        self.qm.db.executeInsert("INSERT INTO sensor(id, name, category_id) VALUES (2, 'SR', 2)")
+        
+        self.qm.db.executeInsert("INSERT INTO image(sensor_id, image_file_name, image_id, upload_date, image_datetime, report_id, completed_date) VALUES (1, 'hello.png', 1, '2023-02-07 11:44:10.973005', '2023-02-07 11:44:10.973005', 1, '2023-02-07 11:44:10.973005')")
+        self.qm.db.executeInsert("INSERT INTO image(sensor_id, image_file_name, image_id, upload_date, image_datetime, report_id, completed_date) VALUES (1, 'hello.png', 2, '2023-02-07 11:44:10.973005', '2023-02-07 11:44:10.973005', 11, '2023-02-07 11:44:10.973005')")
+        self.qm.db.executeInsert("INSERT INTO image(sensor_id, image_file_name, image_id, upload_date, image_datetime, report_id, completed_date) VALUES (2, 'hello.png', 3, '2023-02-07 11:44:10.973005', '2023-02-07 11:44:10.973005', 7, '2023-02-07 11:44:10.973005')")
+        self.qm.db.executeInsert("INSERT INTO image(sensor_id, image_file_name, image_id, upload_date, image_datetime, report_id, completed_date) VALUES (2, 'hello.png', 4, '2023-02-07 11:44:10.973005', '2023-02-07 11:44:10.973005', 0, '2023-02-07 11:44:10.973005')")
+        self.qm.db.executeInsert("INSERT INTO image(sensor_id, image_file_name, image_id, upload_date, image_datetime, report_id) VALUES (2, 'hello.png', 5, '2023-02-07 11:44:10.973005', '2023-02-07 11:44:10.973005', 1)")
+        self.qm.db.executeInsert("INSERT INTO image(sensor_id, image_file_name, image_id, upload_date, image_datetime, report_id, completed_date) VALUES (2, 'hello.png', 6, '2023-02-09 11:44:10.973005', '2023-02-09 11:44:10.973005', 1, '2023-02-09 11:44:10.973005')")
+        
+        self.qm.rebuildReportDailyRollup()
+        res = self.qm.getXBIReportCounts('2023-02-07', '2023-02-08')
+        exp = [('UNCATEGORISED', 1, 1, 0, 0, 0), ('UAV', 0, 0, 0, 0, 1), ('AB', 0, 0, 0, 0, 0), ('HB', 0, 0, 0, 0, 0), ('AVIS', 0, 0, 0, 0, 0)]
+        self.assertEqual(res, exp, 'getXBIReportCounts failed')
+
+    def test_reportDailyRollup_incremental(self):
+        self.qm.db.executeInsert("INSERT INTO sensor(id, name, category_id) VALUES (1, 'SB', 1)")
+        self.qm.db.executeInsert("INSERT INTO sensor(id, name, category_id) VALUES (2, 'SR', 2)")
+        self.qm.db.executeInsert("INSERT INTO image(sensor_id, image_file_name, image_id, upload_date, image_datetime, report_id) VALUES (1, 'hello.png', 1, '2023-02-07 11:44:10.973005', '2023-02-07 11:44:10.973005', 1)")
+        self.qm.db.executeInsert("INSERT INTO image(sensor_id, image_file_name, image_id, upload_date, image_datetime, report_id) VALUES (2, 'hello.png', 2, '2023-02-07 11:44:10.973005', '2023-02-07 11:44:10.973005', 11)")
+        first, second = [row[0] for row in self.qm.db.executeSelect("SELECT scvu_image_id FROM image ORDER BY image_id")]
+        completed = datetime.datetime(2023, 2, 8)
+
+        self.qm.completeImage(first, 'vetter', completed)
+        self.qm.completeImage(second, 'vetter', completed)
+        self.qm.completeImage(second, 'vetter', completed)
+        res = self.qm.getXBIReportCounts('2023-02-07', '2023-02-08')[:2]
+        self.assertEqual(res, [('UNCATEGORISED', 1, 0, 0, 0, 0), ('UAV', 0, 1, 0, 0, 0)], 'completeImage failed - rollup not updated')
+
+        self.qm.updateSensorCategory([('UAV', 'SB')])
+        res = self.qm.getXBIReportCounts('2023-02-07', '2023-02-08')[:2]
+        self.assertEqual(res, [('UNCATEGORISED', 0, 0, 0, 0, 0), ('UAV', 1, 1, 0, 0, 0)], 'updateSensorCategory failed - rollup not moved')
+
+        self.qm.uncompleteImage(second)
+        self.qm.updateTaskingSummaryImage(first, 'TOS', None, 'good', None, False)
+        res = self.qm.getXBIReportCounts('2023-02-07', '2023-02-08')[:2]
+        self.assertEqual(res, [('UNCATEGORISED', 0, 0, 0, 0, 0), ('UAV', 0, 0, 0, 0, 1)], 'uncompleteImage/updateTaskingSummaryImage failed - rollup not updated')
+
+        self.qm.deleteImage(second)
+        res = self.qm.getXBIReportCounts('2023-02-07', '2023-02-08')[:2]
+        self.assertEqual(res, [('UNCATEGORISED', 0, 0, 0, 0, 0), ('UAV', 0, 0, 0, 0, 1)], 'deleteImage failed - uncompleted image counted')
+
+        query = "SELECT day, sensor_category_id, report_id, image_count FROM report_daily_rollup WHERE image_count <> 0 ORDER BY 1, 2, 3"
+        incremental = self.qm.db.executeSelect(query)
+        self.qm.rebuildReportDailyRollup()
+        self.assertEqual(incremental, self.qm.db.executeSelect(query), 'report_daily_rollup failed - incremental rows differ from a rebuild')
+
+    def test_reportDailyRollup_updateSensorCategoryArchived(self):
+        self.qm.db.executeInsert("INSERT INTO sensor(id, name, category_id) VALUES (1, 'SB', 1)")
+        self.qm.db.executeInsert("INSERT INTO image(sensor_id, image_file_name, image_id, upload_date, image_datetime, report_id) VALUES (1, 'hello.png', 1, '2023-02-07 11:44:10.973005', '2023-02-07 11:44:10.973005', 1)")
+        self.qm.db.executeInsert("INSERT INTO image(sensor_id, image_file_name, image_id, upload_date, image_datetime, report_id) VALUES (1, 'hello.png', 2, '2023-02-07 11:44:10.973005', '2023-02-07 11:44:10.973005', 1)")
+        first, second = [row[0] for row in self.qm.db.executeSelect("SELECT scvu_image_id FROM image ORDER BY image_id")]
+        self.qm.completeImage(first, 'vetter', datetime.datetime(2023, 2, 8))
+        self.qm.archiveCompletedImages(datetime.datetime(2023, 3, 1), 10)
+        self.qm.completeImage(second, 'vetter', datetime.datetime(2023, 3, 2))
+
+        self.qm.updateSensorCategory([('UAV', 'SB')])
+        res = self.qm.getXBIReportCounts('2023-02-07', '2023-02-08')[:2]
+        self.assertEqual(res, [('UNCATEGORISED', 0, 0, 0, 0, 0), ('UAV', 2, 0, 0, 0, 0)], 'updateSensorCategory failed - archived image not moved')
+
     def test_getImageAreaData_baseCase(self):
         self.qm.db.executeInsert("INSERT INTO sensor(id, name) VALUES (1, 'SB')")
         self.qm.db.executeInsert("INSERT INTO users(id, name) VALUES (1, 'hello')")
@@ -497,19 +645,28 @@ class QueryManager_unittest(unittest.TestCase):
         exp = [('UNCATEGORISED',), ('UAV',), ('AB',), ('HB',), ('AVIS',)]
         self.assertEqual(res, exp, "getCategories failed")
     
-    def test_setOpsvFalse_baseCase(self):
-        self.qm.db.executeUpdate("UPDATE area SET opsv = True WHERE area_name = 'G074'")
-        
-        self.qm.setOpsvFalse()
-        res = self.qm.db.executeSelect(f"SELECT area_name FROM area WHERE opsv = True")
-        exp = []
-        self.assertEqual(res, exp, "setOpsvFalse does not work")
-    
-    def test_setOpsvAreas_baseCase(self):
-        self.qm.setOpsvAreas([('G074', ), ('G080', )])
-        res = [area[0] for area in self.qm.db.executeSelect(f"SELECT area_name FROM area WHERE opsv = True")]
+    def test_syncOpsvAreas_baseCase(self):
+        self.qm.db.executeUpdate("UPDATE area SET opsv = True WHERE area_name IN ('G074', 'G14B')")
+
+        changed = self.qm.syncOpsvAreas(['G074', 'G080'])
+        res = [area[0] for area in self.qm.db.executeSelect(f"SELECT area_name FROM area WHERE opsv = True ORDER BY area_name")]
         exp = ['G074', 'G080']
-        self.assertEqual(res, exp, "setOpsvAreas does not work")
+        self.assertEqual(res, exp, "syncOpsvAreas does not work")
+        self.assertEqual(changed, 2, "syncOpsvAreas should only touch rows whose opsv changes")
+
+        changed = self.qm.syncOpsvAreas(['G074', 'G080'])
+        self.assertEqual(changed, 0, "syncOpsvAreas should be a no-op when nothing changes")
+
+    def test_applyParadeState_baseCase(self):
+        self.kc_adapter.register_user(1, 'alice')
+        self.kc_adapter.register_user(2, 'bob')
+        self.qm.db.executeInsert("INSERT INTO user_cache (keycloak_user_id, is_present) VALUES ('kc-bob', True) ON CONFLICT (keycloak_user_id) DO UPDATE SET is_present = True")
+
+        self.qm.applyParadeState(['alice', 'bob', 'nobody'], ['alice'])
+        res = self.qm.db.executeSelect("SELECT keycloak_user_id, is_present FROM user_cache WHERE keycloak_user_id IN ('kc-alice', 'kc-bob') ORDER BY keycloak_user_id")
+        exp = [('kc-alice', True), ('kc-bob', False)]
+        self.qm.db.executeDelete("DELETE FROM user_cache WHERE keycloak_user_id IN ('kc-alice', 'kc-bob')")
+        self.assertEqual(res, exp, "applyParadeState does not work")
 
     @unittest.skip("Legacy users table removed; Keycloak-backed updateExistingUsers not unit-tested here.")
     def test_updateExistingUsers_baseCase(self):
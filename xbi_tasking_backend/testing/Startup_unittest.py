@@ -0,0 +1,129 @@
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import unittest
+from contextlib import contextmanager
+
+import psycopg2
+
+from main_classes.DatabaseSchemaManager import SCHEMA_VERSION, DatabaseSchemaManager
+from main_classes.migrations import MIGRATIONS
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Everything a worker imports before it can serve, apart from connecting to the database
+APP_MODULES = [
+    "app_state", "middleware", "security", "main_classes.KeycloakAuth",
+    "routers.auth", "routers.images", "routers.lookup", "routers.metrics", "routers.notifications",
+    "routers.profiles", "routers.reports", "routers.tasking", "routers.traces", "routers.users",
+]
+# Only needed by the endpoints that use them, so they must not load at startup
+LAZY_MODULES = ["xlsxwriter"]
+# Upload date range of the existing images when the partitioning migration runs
+IMAGE_UPLOAD_RANGE = (datetime.datetime(2025, 11, 5, 8, 30), datetime.datetime(2026, 1, 2, 23, 0))
+IMPORT_RUNS = 3
+IMPORT_BUDGET_SECONDS = float(os.getenv("STARTUP_IMPORT_BUDGET", "5"))
+
+
+class _RecordingCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 0
+
+    def execute(self, query, values=None):
+        query = " ".join(query.split())
+        self.db.queries.append(query)
+        self.db.values.append(values)
+        if query.startswith("SELECT MAX(version) FROM schema_version") and self.db.stored_version is None:
+            raise psycopg2.errors.UndefinedTable('relation "schema_version" does not exist')
+        if query.startswith("CREATE TABLE IF NOT EXISTS schema_version") and self.db.stored_version is None:
+            self.db.stored_version = 0
+        if query.startswith("INSERT INTO schema_version"):
+            self.db.stored_version = values[0]
+
+    def fetchone(self):
+        query = self.db.queries[-1]
+        if query.startswith("SELECT") and "FROM schema_version" in query:
+            return (self.db.stored_version,)
+        if query.startswith("SELECT pg_get_serial_sequence"):
+            return ("public.image_scvu_image_id_seq",)
+        if query.startswith("SELECT MIN(upload_date), MAX(upload_date)"):
+            return IMAGE_UPLOAD_RANGE
+        return (True,)
+
+
+class _RecordingDatabase:
+    def __init__(self, stored_version):
+        self._config = None
+        self.stored_version = stored_version
+        self.queries = []
+        self.values = []
+
+    @contextmanager
+    def _get_cursor(self, *, autocommit=True):
+        yield _RecordingCursor(self)
+
+    def transaction(self):
+        return self._get_cursor(autocommit=False)
+
+
+class Startup_unittest(unittest.TestCase):
+    def _applied(self, db):
+        return [values for query, values in zip(db.queries, db.values) if query.startswith("INSERT INTO schema_version")]
+
+    def test_initialize_database_skippedAtCurrentVersion(self):
+        db = _RecordingDatabase(SCHEMA_VERSION)
+        DatabaseSchemaManager(db).initialize_database()
+        self.assertEqual(db.queries, ["SELECT MAX(version) FROM schema_version"], "initialize_database failed - no-op boot issued more than one query")
+
+    def test_initialize_database_appliesAllMigrations(self):
+        db = _RecordingDatabase(None)
+        DatabaseSchemaManager(db).initialize_database()
+        self.assertEqual(self._applied(db), [(version, description) for version, description, _ in MIGRATIONS], "initialize_database failed - migrations not applied in order")
+        self.assertEqual(db.stored_version, SCHEMA_VERSION, "initialize_database failed - version not recorded")
+        self.assertEqual(db.queries.count("SELECT pg_advisory_xact_lock(%s)"), len(MIGRATIONS), "initialize_database failed - migration not run under the advisory lock")
+
+    def test_initialize_database_appliesOnlyPending(self):
+        db = _RecordingDatabase(1)
+        DatabaseSchemaManager(db).initialize_database()
+        self.assertEqual([version for version, _ in self._applied(db)], list(range(2, SCHEMA_VERSION + 1)), "initialize_database failed - applied migrations rerun")
+        self.assertFalse(any(query.startswith("CREATE TABLE IF NOT EXISTS sensor_category") for query in db.queries), "initialize_database failed - baseline rerun")
+
+    def test_initialize_database_partitionsImageByMonth(self):
+        db = _RecordingDatabase(2)
+        DatabaseSchemaManager(db).initialize_database()
+        created = [index for index, query in enumerate(db.queries) if "PARTITION OF image FOR VALUES" in query]
+        partitions = [(db.queries[index].split()[5], db.values[index]) for index in created]
+        exp = [
+            ("image_p2025_11", ("2025-11-01", "2025-12-01")),
+            ("image_p2025_12", ("2025-12-01", "2026-01-01")),
+            ("image_p2026_01", ("2026-01-01", "2026-02-01")),
+        ]
+        self.assertEqual(partitions, exp, "initialize_database failed - wrong monthly image partitions")
+        copied = next(index for index, query in enumerate(db.queries) if query.startswith("INSERT INTO image ("))
+        self.assertLess(created[-1], copied, "initialize_database failed - rows copied before their partitions exist")
+
+    def test_import_benchmark(self):
+        script = (
+            "import importlib, json, sys, time\n"
+            "started_at = time.perf_counter()\n"
+            f"for name in {APP_MODULES!r}:\n"
+            "    importlib.import_module(name)\n"
+            f"print(json.dumps({{'seconds': time.perf_counter() - started_at, 'loaded': [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))\n"
+        )
+        runs = []
+        for _ in range(IMPORT_RUNS):
+            result = subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+            runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+        seconds = statistics.median(run["seconds"] for run in runs)
+        print(f"\napp import time: median {seconds * 1000:.0f}ms over {IMPORT_RUNS} runs")
+        self.assertEqual(runs[0]["loaded"], [], "startup failed - lazy modules imported at startup")
+        self.assertLess(seconds, IMPORT_BUDGET_SECONDS, "startup failed - app import slower than budget")
+
+    def startUnitTest(self):
+        suite = unittest.TestLoader().loadTestsFromTestCase(Startup_unittest)
+        unittest.TextTestRunner(verbosity=2).run(suite)
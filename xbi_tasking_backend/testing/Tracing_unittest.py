@@ -0,0 +1,149 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import tracing
+from api_utils import run_blocking
+from main_classes.ConfigClass import ConfigClass
+from main_classes.KeycloakClient import KeycloakClient
+from main_classes.query_keycloak import KeycloakQueries
+from middleware import KeycloakAuthMiddleware, TracingMiddleware
+from routers import traces
+from services.keycloak_service import KeycloakService
+from testing.keycloak_standin import KeycloakStandIn
+from testing.Middleware_unittest import StubKeycloakAuth
+from tracing import TraceRecorder, traced_class
+
+
+@traced_class
+class DirectoryService:
+    def __init__(self, queries):
+        self.queries = queries
+
+    def resolve(self, user_ids):
+        return self.queries.get_keycloak_usernames_bulk(user_ids)
+
+
+class Tracing_unittest(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.standin = KeycloakStandIn().start()
+        self.users = self.standin.add_users(5, "II", prefix="ii")
+        self.standin.add_users(2, "Senior II", prefix="senior")
+        self.standin.add_users(0, "IA")
+        config_file = tempfile.NamedTemporaryFile("w", suffix=".config", delete=False)
+        config_file.write(
+            "[Keycloak]\n"
+            f"keycloak_url: {self.standin.url}\n"
+            f"realm: {self.standin.realm}\n"
+            "admin_client_id: xbi-tasking-admin\n"
+            "admin_client_secret: standin-secret\n"
+        )
+        config_file.close()
+        self.config_path = config_file.name
+        self.config = ConfigClass(self.config_path)
+
+    @classmethod
+    def tearDownClass(self):
+        self.standin.stop()
+        os.remove(self.config_path)
+
+    def setUp(self):
+        trace_file = tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False)
+        trace_file.close()
+        self.trace_path = trace_file.name
+
+        app = FastAPI()
+        app.state.keycloak_auth = StubKeycloakAuth()
+        app.state.keycloak_auth.tokens["admin-token"] = {"sub": "2", "preferred_username": "ia00001", "account_type": "IA", "roles": ["IA"]}
+        app.state.trace_recorder = TraceRecorder(ring_size=2, path=self.trace_path)
+        app.add_middleware(KeycloakAuthMiddleware)
+        app.add_middleware(TracingMiddleware)
+        app.include_router(traces.router)
+
+        queries = KeycloakQueries(None, {}, keycloak_service=KeycloakService(client=KeycloakClient(config=self.config)))
+        service = DirectoryService(queries)
+        user_ids = [user["id"] for user in self.users]
+
+        @app.get("/users/{group}")
+        async def resolve_users(request: Request, group: str):
+            return await run_blocking(service.resolve, user_ids)
+
+        self.recorder = app.state.trace_recorder
+        self.client = TestClient(app)
+        self.admin = {"Authorization": "Bearer admin-token"}
+
+    def tearDown(self):
+        os.remove(self.trace_path)
+
+    def _ancestors(self, spans, span):
+        by_id = {s["span_id"]: s for s in spans}
+        names = []
+        while span["parent_id"] is not None:
+            span = by_id[span["parent_id"]]
+            names.append(span["name"])
+        return names
+
+    def test_trace_propagatesAcrossThreads(self):
+        res = self.client.get("/users/ii", headers=self.admin)
+        self.assertEqual(sorted(res.json().values()), sorted(user["username"] for user in self.users))
+        trace = self.recorder.get(res.headers["x-trace-id"])
+        self.assertEqual(trace["name"], "GET /users/{group}", "TracingMiddleware failed - root not named by route template")
+
+        spans = trace["spans"]
+        http_spans = [span for span in spans if span["name"] == "keycloak.http" and span["attributes"]["endpoint"] == "admin/roles/{role}/users"]
+        self.assertEqual(len(http_spans), 3, "tracing failed - role page calls missing from trace")
+        exp = [
+            "KeycloakClient.get_users_for_role",
+            "KeycloakService.get_users_for_role",
+            "KeycloakQueries.get_keycloak_usernames_bulk",
+            "DirectoryService.resolve",
+            "run_blocking",
+            "GET /users/{group}",
+        ]
+        self.assertEqual(self._ancestors(spans, http_spans[0]), exp, "tracing failed - span chain broken across threadpool hops")
+        self.assertGreater(len({span["thread"] for span in spans}), 2, "tracing failed - worker thread spans not recorded")
+
+    def test_trace_jsonLinesExport(self):
+        trace_id = self.client.get("/users/ii", headers=self.admin).headers["x-trace-id"]
+        with open(self.trace_path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([line["trace_id"] for line in lines], [trace_id], "TraceRecorder failed - trace not written to file")
+
+    def test_endpoints_listAndGet(self):
+        ids = [self.client.get("/users/ii", headers=self.admin).headers["x-trace-id"] for _ in range(3)]
+        listing = self.client.get("/traces", headers=self.admin).json()["traces"]
+        self.assertEqual(
+            [trace["trace_id"] for trace in listing if trace["name"] == "GET /users/{group}"],
+            ids[:0:-1],
+            "list_traces failed - ring not bounded or not newest first",
+        )
+        self.assertNotIn("spans", listing[0], "list_traces failed - listing includes spans")
+        self.assertEqual(self.client.get(f"/traces/{ids[2]}", headers=self.admin).json()["trace_id"], ids[2], "get_trace failed - wrong trace")
+        self.assertEqual(self.client.get(f"/traces/{ids[0]}", headers=self.admin).status_code, 404, "get_trace failed - evicted trace returned")
+
+    def test_endpoints_adminOnly(self):
+        res = self.client.get("/traces", headers={"Authorization": "Bearer good-token"})
+        self.assertEqual(res.status_code, 403, "list_traces failed - non-admin allowed")
+
+    def test_noTrace_noSpans(self):
+        called = []
+        wrapped = tracing.traced("outside")(lambda: called.append(tracing.current_span()))
+        wrapped()
+        self.assertEqual(called, [None], "traced failed - span opened without an active trace")
+        self.assertIs(tracing.bind(len), len, "bind failed - wrapped without an active trace")
+
+    def test_recorder_sampledByDefault(self):
+        env = {key: value for key, value in os.environ.items() if key != "TRACE_SAMPLE_RATE"}
+        with mock.patch.dict(os.environ, env, clear=True):
+            recorder = tracing.TraceRecorder.from_env()
+        self.assertEqual(recorder.sample_rate, tracing.DEFAULT_SAMPLE_RATE, "from_env failed - every request traced by default")
+
+    def startUnitTest(self):
+        suite = unittest.TestLoader().loadTestsFromTestCase(Tracing_unittest)
+        unittest.TextTestRunner(verbosity=2).run(suite)
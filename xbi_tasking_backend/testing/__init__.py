@@ -1,4 +1,16 @@
 from testing.ConfigClass_unittest import ConfigClass_unittest
 from testing.Database_unittest import Database_unittest
 from testing.QueryManager_unittest import QueryManager_unittest
-from testing.MainController_unittest import MainController_unittest
\ No newline at end of file
+from testing.MainController_unittest import MainController_unittest
+from testing.KeycloakClient_unittest import KeycloakClient_unittest
+from testing.KeycloakAuth_unittest import KeycloakAuth_unittest
+from testing.Middleware_unittest import Middleware_unittest
+from testing.Metrics_unittest import Metrics_unittest
+from testing.Profiling_unittest import Profiling_unittest
+from testing.Tracing_unittest import Tracing_unittest
+from testing.ExcelGenerator_unittest import ExcelGenerator_unittest
+from testing.Startup_unittest import Startup_unittest
+from testing.ArchiveService_unittest import ArchiveService_unittest
+from testing.PartitionService_unittest import PartitionService_unittest
+from testing.IngestService_unittest import IngestService_unittest
+from testing.IngestWorker_unittest import IngestWorker_unittest
\ No newline at end of file
@@ -0,0 +1,212 @@
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+class KeycloakStandIn:
+    '''
+    Minimal local stand-in for the Keycloak endpoints used by KeycloakClient and KeycloakAuth.
+    Serves the admin token, user listing and role membership endpoints from in-memory data
+    and records every request path so tests can assert on paging behaviour.
+    Call enable_signing() to also serve discovery/JWKS and issue RS256 access tokens.
+    '''
+    def __init__(self, realm="xbi-tasking", default_page_size=100):
+        self.realm = realm
+        self.default_page_size = default_page_size
+        self.users = []
+        self.users_by_id = {}
+        self.role_members = {}
+        self.requests = []
+        self.failures_remaining = 0
+        self.failure_status = 503
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self.signing_keys = {}
+        self.active_kid = None
+        self.revoked_tokens = set()
+
+    def add_user(self, username, roles=(), user_id=None):
+        user = {"id": user_id or str(uuid.uuid4()), "username": username, "enabled": True}
+        self.users.append(user)
+        self.users_by_id[user["id"]] = user
+        for role_name in roles:
+            self.role_members.setdefault(role_name, []).append(user)
+        return user
+
+    def add_users(self, count, role_name, prefix="user"):
+        self.role_members.setdefault(role_name, [])
+        return [self.add_user(f"{prefix}{i:05d}", roles=(role_name,)) for i in range(count)]
+
+    def enable_signing(self, kid=None):
+        '''
+        Function:   Generates an RSA signing key, publishes it in the JWKS and makes it the active key
+        Input:      optional key id
+        Output:     key id of the new key
+        '''
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from jose import jwk
+
+        kid = kid or uuid.uuid4().hex
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        private_pem = private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        public_jwk = jwk.construct(private_pem, "RS256").public_key().to_dict()
+        public_jwk.update({"kid": kid, "use": "sig", "alg": "RS256"})
+        with self._lock:
+            self.signing_keys[kid] = (private_pem, public_jwk)
+            self.active_kid = kid
+        return kid
+
+    @property
+    def issuer(self):
+        return f"{self.url}/realms/{self.realm}"
+
+    def issue_token(self, username, roles=(), expires_in=300, client_id="xbi-tasking-frontend", kid=None):
+        from jose import jwt
+
+        kid = kid or self.active_kid
+        # Known users get their stand-in id as sub, so admin lookups by sub resolve
+        user = next((user for user in self.users if user["username"] == username), None)
+        private_pem, _ = self.signing_keys[kid]
+        now = int(time.time())
+        claims = {
+            "iss": self.issuer,
+            "sub": user["id"] if user else str(uuid.uuid5(uuid.NAMESPACE_DNS, username)),
+            "aud": client_id,
+            "azp": client_id,
+            "iat": now,
+            "exp": now + expires_in,
+            "preferred_username": username,
+            "realm_access": {"roles": list(roles)},
+        }
+        return jwt.encode(claims, private_pem, algorithm="RS256", headers={"kid": kid})
+
+    def revoke(self, token):
+        self.revoked_tokens.add(token)
+
+    def _introspect(self, token):
+        from jose import JWTError, jwt
+
+        if not token or token in self.revoked_tokens:
+            return {"active": False}
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+            _, public_jwk = self.signing_keys[kid]
+            claims = jwt.decode(token, public_jwk, algorithms=["RS256"], options={"verify_aud": False})
+        except (JWTError, KeyError):
+            return {"active": False}
+        return dict(claims, active=True)
+
+    def fail_next(self, count, status=503):
+        self.failures_remaining = count
+        self.failure_status = status
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self, port=0):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                standin._handle(self, "GET")
+
+            def do_POST(self):
+                standin._handle(self, "POST")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _page(self, items, query):
+        first = int(query.get("first", ["0"])[0])
+        page_size = int(query.get("max", [str(self.default_page_size)])[0])
+        return items[first:first + page_size]
+
+    def _handle(self, handler, method):
+        parsed = urlparse(handler.path)
+        query = parse_qs(parsed.query)
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else b""
+        with self._lock:
+            self.requests.append((method, parsed.path, query))
+            failing = self.failures_remaining > 0
+            if failing:
+                self.failures_remaining -= 1
+        if failing:
+            return self._send(handler, self.failure_status, {"error": "Injected failure"})
+
+        admin_prefix = f"/admin/realms/{self.realm}"
+        token_path = f"/realms/{self.realm}/protocol/openid-connect/token"
+
+        if method == "GET" and parsed.path == f"/realms/{self.realm}/.well-known/openid-configuration":
+            return self._send(handler, 200, {
+                "issuer": self.issuer,
+                "token_endpoint": f"{self.url}{token_path}",
+                "jwks_uri": f"{self.issuer}/protocol/openid-connect/certs",
+            })
+
+        if method == "GET" and parsed.path == f"/realms/{self.realm}/protocol/openid-connect/certs":
+            with self._lock:
+                keys = [public_jwk for _, public_jwk in self.signing_keys.values()]
+            return self._send(handler, 200, {"keys": keys})
+
+        if method == "POST" and parsed.path == f"{token_path}/introspect":
+            form = parse_qs(body.decode("utf-8"))
+            return self._send(handler, 200, self._introspect(form.get("token", [None])[0]))
+
+        if method == "POST" and parsed.path == token_path:
+            return self._send(handler, 200, {"access_token": "standin-admin-token", "expires_in": 300})
+
+        if method == "GET" and parsed.path == f"{admin_prefix}/users":
+            users = self.users
+            if "username" in query:
+                username = query["username"][0].lower()
+                users = [user for user in users if user["username"].lower() == username]
+            return self._send(handler, 200, self._page(users, query))
+
+        if method == "GET" and parsed.path.startswith(f"{admin_prefix}/users/"):
+            user = self.users_by_id.get(parsed.path.rsplit("/", 1)[-1])
+            if user is None:
+                return self._send(handler, 404, {"error": "User not found"})
+            return self._send(handler, 200, user)
+
+        if method == "GET" and parsed.path.startswith(f"{admin_prefix}/roles/") and parsed.path.endswith("/users"):
+            role_name = unquote(parsed.path[len(f"{admin_prefix}/roles/"):-len("/users")])
+            if role_name not in self.role_members:
+                return self._send(handler, 404, {"error": "Could not find role"})
+            return self._send(handler, 200, self._page(self.role_members[role_name], query))
+
+        return self._send(handler, 404, {"error": "Not found"})
+
+    def _send(self, handler, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
@@ -19,6 +19,7 @@ class KeycloakTestAdapter:
         self._orig_kc_get_usernames_bulk = None
         self._orig_kc_get_users = None
         self._orig_kc_get_user_ids = None
+        self._orig_kc_map_usernames = None
 
     def register_user(self, user_id: int, name: str, is_present=None):
         kc_id = f"kc-{name}"
@@ -104,6 +105,7 @@ class KeycloakTestAdapter:
         self._orig_kc_get_usernames_bulk = qm._keycloak.get_keycloak_usernames_bulk
         self._orig_kc_get_users = qm._keycloak.getUsers
         self._orig_kc_get_user_ids = qm._keycloak.getUserIds
+        self._orig_kc_map_usernames = qm._keycloak.map_keycloak_usernames_to_keycloak_ids
 
         def _kc_get_user_id(username):
             return self.name_to_kc.get(username)
@@ -114,6 +116,9 @@ class KeycloakTestAdapter:
         def _kc_get_usernames_bulk(keycloak_user_ids):
             return {user_id: self.kc_to_name.get(user_id, user_id) for user_id in keycloak_user_ids}
 
+        def _kc_map_usernames(usernames):
+            return {name: self.name_to_kc[name] for name in usernames if name in self.name_to_kc}
+
         def _kc_get_users():
             users = []
             for kc_id, name in self.kc_to_name.items():
@@ -133,6 +138,7 @@ class KeycloakTestAdapter:
         qm._keycloak.get_keycloak_usernames_bulk = _kc_get_usernames_bulk
         qm._keycloak.getUsers = _kc_get_users
         qm._keycloak.getUserIds = lambda: set(self.kc_to_name.keys())
+        qm._keycloak.map_keycloak_usernames_to_keycloak_ids = _kc_map_usernames
 
     def restore_db(self, db):
         db.executeInsert = self._orig_executeInsert
@@ -145,3 +151,4 @@ class KeycloakTestAdapter:
         qm._keycloak.get_keycloak_usernames_bulk = self._orig_kc_get_usernames_bulk
         qm._keycloak.getUsers = self._orig_kc_get_users
         qm._keycloak.getUserIds = self._orig_kc_get_user_ids
+        qm._keycloak.map_keycloak_usernames_to_keycloak_ids = self._orig_kc_map_usernames
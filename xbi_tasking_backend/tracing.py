@@ -0,0 +1,249 @@
+'''
+Request-scoped tracing spans.
+
+The current span lives in a contextvar, so it follows a request through awaits,
+run_blocking threadpool hops (which copy the context) and the Keycloak async bridge.
+Plain ThreadPoolExecutor workers do not inherit context; submit bind(fn) instead of fn.
+
+Finished traces go to an in-memory ring (served by routers/traces.py) and, when
+TRACE_FILE is set, are appended to that file as JSON lines.
+'''
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+
+logger = logging.getLogger("xbi_tasking_backend.tracing")
+
+TRACE_ID_HEADER = "X-Trace-Id"
+DEFAULT_RING_SIZE = 200
+# Fraction of requests traced unless TRACE_SAMPLE_RATE says otherwise; set it to 1.0 in development
+DEFAULT_SAMPLE_RATE = 0.01
+MAX_SPANS_PER_TRACE = 1000
+
+_current_span = contextvars.ContextVar("xbi_current_span", default=None)
+_span_ids = itertools.count(1)
+
+
+class Trace:
+    def __init__(self, name):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.spans = []
+        self.dropped_spans = 0
+
+    def add(self, span):
+        if len(self.spans) >= MAX_SPANS_PER_TRACE:
+            self.dropped_spans += 1
+            return False
+        self.spans.append(span)
+        return True
+
+    def to_dict(self):
+        root = self.spans[0] if self.spans else None
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start": root.start if root else None,
+            "duration_ms": root.duration_ms if root else None,
+            "status": root.attributes.get("status") if root else None,
+            "span_count": len(self.spans),
+            "dropped_spans": self.dropped_spans,
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "thread", "start", "duration_ms", "attributes", "error", "_started_at")
+
+    def __init__(self, trace, name, parent_id, attributes):
+        self.trace = trace
+        self.span_id = next(_span_ids)
+        self.parent_id = parent_id
+        self.name = name
+        self.thread = threading.current_thread().name
+        self.start = time.time()
+        self.duration_ms = None
+        self.attributes = attributes
+        self.error = None
+        self._started_at = time.perf_counter()
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def finish(self):
+        self.duration_ms = round((time.perf_counter() - self._started_at) * 1000, 3)
+
+    def to_dict(self):
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "thread": self.thread,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class TraceRecorder:
+    '''
+    Keeps the most recent finished traces in memory and optionally appends them to a JSON-lines file.
+    '''
+    def __init__(self, ring_size=DEFAULT_RING_SIZE, path=None, sample_rate=1.0):
+        self._ring = deque(maxlen=ring_size)
+        self.path = path
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            ring_size=int(os.getenv("TRACE_RING_SIZE", str(DEFAULT_RING_SIZE))),
+            path=os.getenv("TRACE_FILE") or None,
+            sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", str(DEFAULT_SAMPLE_RATE))),
+        )
+
+    def should_sample(self):
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def record(self, trace):
+        data = trace.to_dict()
+        with self._lock:
+            self._ring.append(data)
+            if self.path:
+                try:
+                    with open(self.path, "a") as f:
+                        f.write(json.dumps(data, default=str) + "\n")
+                except OSError as e:
+                    logger.warning("Could not write trace to %s: %s", self.path, e)
+
+    def list(self, limit=50):
+        '''
+        Function:   Summaries of the most recent traces, newest first
+        Output:     list of dicts without the span list
+        '''
+        with self._lock:
+            traces = list(self._ring)[::-1][:limit]
+        return [{key: value for key, value in trace.items() if key != "spans"} for trace in traces]
+
+    def get(self, trace_id):
+        with self._lock:
+            for trace in self._ring:
+                if trace["trace_id"] == trace_id:
+                    return trace
+        return None
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextmanager
+def start_trace(name, **attributes):
+    '''
+    Opens the root span of a new trace; yields the root span
+    '''
+    trace = Trace(name)
+    root = Span(trace, name, None, attributes)
+    trace.add(root)
+    token = _current_span.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.error = repr(e)
+        raise
+    finally:
+        root.finish()
+        _current_span.reset(token)
+
+
+@contextmanager
+def span(name, **attributes):
+    '''
+    Opens a child of the current span; does nothing when no trace is active
+    '''
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent.span_id, attributes)
+    if not parent.trace.add(child):
+        yield None
+        return
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = repr(e)
+        raise
+    finally:
+        child.finish()
+        _current_span.reset(token)
+
+
+def traced(name):
+    '''
+    Function:   Decorator that runs a function (sync or async) inside a span when a trace is active
+    Input:      span name
+    '''
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_class(cls):
+    '''
+    Class decorator that wraps every public method in a "<Class>.<method>" span.
+    Generator methods are left alone, since a span cannot stay open across their yields.
+    '''
+    for attr_name, attr in list(vars(cls).items()):
+        if attr_name.startswith("_") or not inspect.isfunction(attr):
+            continue
+        if inspect.isgeneratorfunction(attr) or inspect.isasyncgenfunction(attr):
+            continue
+        setattr(cls, attr_name, traced(f"{cls.__name__}.{attr_name}")(attr))
+    return cls
+
+
+def bind(func):
+    '''
+    Function:   Binds func to a copy of the current context, for ThreadPoolExecutor.submit/map
+    Input:      callable
+    Output:     callable that runs func with the caller's spans in scope
+    '''
+    if _current_span.get() is None:
+        return func
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def run_in_context(*args, **kwargs):
+        # A context can only be entered by one thread at a time, so each call gets its own copy
+        return context.copy().run(func, *args, **kwargs)
+    return run_in_context
@@ -1,4 +1,4 @@
-from testing import ConfigClass_unittest, MainController_unittest, QueryManager_unittest, Database_unittest
+from testing import ConfigClass_unittest, MainController_unittest, QueryManager_unittest, Database_unittest, KeycloakClient_unittest, KeycloakAuth_unittest, Middleware_unittest, Metrics_unittest, Profiling_unittest, Tracing_unittest, ExcelGenerator_unittest, Startup_unittest, ArchiveService_unittest, PartitionService_unittest, IngestService_unittest, IngestWorker_unittest
 
 config = ConfigClass_unittest()
 config.startUnitTest()
@@ -9,5 +9,41 @@ db.startUnitTest()
 qm = QueryManager_unittest()
 qm.startUnitTest()
 
+kc = KeycloakClient_unittest()
+kc.startUnitTest()
+
+ka = KeycloakAuth_unittest()
+ka.startUnitTest()
+
+mw = Middleware_unittest()
+mw.startUnitTest()
+
+met = Metrics_unittest()
+met.startUnitTest()
+
+pr = Profiling_unittest()
+pr.startUnitTest()
+
+tr = Tracing_unittest()
+tr.startUnitTest()
+
+eg = ExcelGenerator_unittest()
+eg.startUnitTest()
+
+su = Startup_unittest()
+su.startUnitTest()
+
+arc = ArchiveService_unittest()
+arc.startUnitTest()
+
+ps = PartitionService_unittest()
+ps.startUnitTest()
+
+ing = IngestService_unittest()
+ing.startUnitTest()
+
+iw = IngestWorker_unittest()
+iw.startUnitTest()
+
 mc = MainController_unittest()
 mc.startUnitTest()
\ No newline at end of file
@@ -146,6 +146,22 @@ class API {
         return response.data
     }
 
+    async getIngestJob(jobId) {
+        const response = await this.client.get(`/images/ingestJobs/${jobId}`)
+        return response.data
+    }
+
+    // insertDSTAData only queues the upload; this polls its job until it has finished
+    async waitForIngestJob(jobId, intervalMs = 1000) {
+        for (;;) {
+            const job = await this.getIngestJob(jobId)
+            if (job.status === "succeeded" || job.status === "failed") {
+                return job
+            }
+            await new Promise((resolve) => setTimeout(resolve, intervalMs))
+        }
+    }
+
 
     async postGetCompleteImageData(body){
         const response =  await this.client.post("/tasking/getCompleteImageData", body)
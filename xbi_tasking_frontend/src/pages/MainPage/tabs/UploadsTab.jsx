@@ -77,9 +77,13 @@ function UploadsTab({ userRole }) {
           })
           results.push({ file: file.name, type: 'parade' })
         } else {
-          const result = await api.insertDSTAData(formData)
-          if (result?.success === false || result?.error) {
-            throw new Error(result?.error || result?.message || 'Upload failed')
+          const queued = await api.insertDSTAData(formData)
+          if (queued?.success === false || queued?.error) {
+            throw new Error(queued?.error || queued?.message || 'Upload failed')
+          }
+          const result = await api.waitForIngestJob(queued.job_id)
+          if (result.status === 'failed') {
+            throw new Error(result.message || 'Upload failed')
           }
           results.push({ file: file.name, type: 'json', result })
         }